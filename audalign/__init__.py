@@ -24,6 +24,7 @@ from audalign.config.fingerprint import FingerprintConfig
 import audalign.datalign as datalign
 import audalign.filehandler as filehandler
 from audalign.config import BaseConfig
+from audalign.executor import Executor, set_executor
 from audalign.recognizers import BaseRecognizer
 from audalign.recognizers.correcognize import CorrelationRecognizer
 from audalign.recognizers.correcognizeSpectrogram import (
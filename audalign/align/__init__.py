@@ -1,4 +1,3 @@
-import multiprocessing
 import os
 import typing
 from functools import partial
@@ -7,6 +6,7 @@ from posixpath import basename
 import audalign
 import audalign.filehandler as filehandler
 import tqdm
+from audalign.executor import get_pool
 from audalign.recognizers import BaseRecognizer
 
 
@@ -112,8 +112,29 @@ def calc_alignments(
     total_alignment = {}
     file_names_and_paths = {}
     # Get matches and paths
+    file_list = list(file_list)
 
-    if recognizer.check_align_hook(
+    if recognizer.check_align_all_hook(
+        file_list=[x for x, _ in file_list if os.path.basename(x) in file_names_to_align],
+        dir_or_list=dir_or_list,
+        target_aligning=target_aligning,
+        fine_aud_file_dict=fine_aud_file_dict,
+    ):
+        temp_file_list = [
+            x for x, _ in file_list if os.path.basename(x) in file_names_to_align
+        ]
+        alignments = recognizer.align_all_hook(
+            file_list=temp_file_list,
+            dir_or_list=dir_or_list,
+            target_aligning=target_aligning,
+            fine_aud_file_dict=fine_aud_file_dict,
+        )
+        for file_path, alignment in zip(temp_file_list, alignments):
+            name = os.path.basename(file_path)
+            file_names_and_paths[name] = file_path
+            total_alignment[name] = alignment
+
+    elif recognizer.check_align_hook(
         file_list=file_list,
         dir_or_list=dir_or_list,
         target_aligning=target_aligning,
@@ -131,10 +152,8 @@ def calc_alignments(
             if os.path.basename(file_path) in file_names_to_align:
                 temp_file_list += [file_path]
 
-        with multiprocessing.Pool(recognizer.config.num_processors) as pool:
+        with get_pool(recognizer.config.num_processors) as pool:
             results_list = pool.map(_calc_alignments, tqdm.tqdm(list(temp_file_list)))
-            pool.close()
-            pool.join()
 
         for i in results_list:
             if i is not None:
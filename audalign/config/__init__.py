@@ -24,7 +24,7 @@ class BaseConfig(ABC):
     # Filters based on confidence.
     filter_matches: typing.Optional[int] = None
 
-    # Limits number of matches returned. Defaults to 30.
+    # Limits number of matches returned. Defaults to 30, fingerprints default to all.
     match_len_filter: typing.Optional[int] = None
 
     # if set, filters out each result if is within x seconds of a result with a stronger confidence
@@ -40,6 +40,15 @@ class BaseConfig(ABC):
     # if true, normalizes all files when read
     normalize = True
 
+    # Spectrogram engine used for fingerprints and spectrogram based recognitions.
+    # "mlab" uses matplotlib's specgram in float64. "scipy" uses scipy.fft in float32,
+    # several times faster with a fraction of the memory, equal within float32 precision
+    spectrogram_engine = "mlab"
+
+    # Number of threads the "scipy" spectrogram engine runs its FFTs on. -1 uses every cpu.
+    # None uses one, best when files are already spread across processes with multiprocessing
+    fft_workers: typing.Optional[int] = None
+
     # keys in results dictionaries
     CONFIDENCE = "confidence"
     MATCH_TIME = "match_time"
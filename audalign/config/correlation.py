@@ -37,6 +37,38 @@ class CorrelationConfig(BaseConfig):
     # matching, but potentially more fingerprints.
     DEFAULT_OVERLAP_RATIO = 0.5
 
+    ######################################################################
+    # Aligns every file at once without locality. Each file is decoded, filtered
+    # and FFT'd once and every pair of files is correlated once, instead of
+    # decoding and correlating both files of every pair for each direction.
+    # Holds every file's complex128 spectrum in memory, padded for the longest
+    # file, about 16 * the longest file's samples * the number of files bytes.
+    # Pairs are correlated in this process, multiprocessing only decodes files.
+    # Above all_pairs_memory_bytes of spectra, files are aligned one at a time.
+    all_pairs = False
+    all_pairs_memory_bytes = 2**30
+
+    ######################################################################
+    # Correlates without locality a block of lags at a time, with about
+    # stream_memory_bytes of FFT buffers instead of full length ones, for files too
+    # long to correlate in memory. Files are decoded and filtered in blocks to
+    # temporary files that are read back as needed. Finds the same peaks as
+    # correlating all at once. Not used with passthrough_args, which need the
+    # whole correlation. Setting this disables the all_pairs path.
+    stream_correlation = False
+    stream_memory_bytes = 2**28
+
+    ######################################################################
+    # Correlates without locality coarse to fine. Energy envelopes of both files
+    # at coarse_sample_rate are correlated first, then only the lags within
+    # coarse_refine seconds of the coarse_candidates highest envelope peaks are
+    # correlated at sample_rate. Much faster for long files, but peaks far from
+    # the envelope's peaks aren't found. None correlates every lag at sample_rate.
+    # Not used with passthrough_args. Setting this disables the all_pairs path.
+    coarse_sample_rate: typing.Optional[int] = None
+    coarse_candidates = 10
+    coarse_refine = 0.05
+
     SCALING_16_BIT = 65536
     LOCALITY_OVERLAP_RATIO = 0.5
     DEFAULT_LOCALITY_FILTER_PROP = 0.6
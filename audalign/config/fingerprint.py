@@ -20,6 +20,13 @@ class FingerprintConfig(BaseConfig):
 
     'base_three' hash style consists of three peaks. Three frequencies and two time differences.
 
+    hash encoding has two options. All fingerprints must be of the same hash encoding to match.
+
+    'sha1' encoding keys each hash with a truncated sha1 hex digest of its values.
+
+    'packed' encoding bit packs the same values straight into an integer. It is much faster
+    and uses a fraction of the memory of 'sha1'.
+
     multiprocessing is set to True by default
 
     There are four accuracy levels with 1 being the lowest accuracy but the fastest. 3 is the highest recommended.
@@ -28,6 +35,7 @@ class FingerprintConfig(BaseConfig):
     """
 
     hash_style = "panako_mod"
+    hash_encoding = "sha1"
     _accuracy = 2
     filter_matches = 1
     locality: typing.Optional[float] = None
@@ -70,6 +78,25 @@ class FingerprintConfig(BaseConfig):
     # fingerprints and faster matching, but can potentially affect accuracy.
     peak_neighborhood_size = 20
 
+    ######################################################################
+    # How local maxima are found in the peak neighborhoods, all find the same peaks.
+    # "footprint" runs one maximum filter over the whole diamond shaped
+    # neighborhood. "iterated" repeats a small cross shaped maximum filter
+    # peak_neighborhood_size times, which covers the same diamond.
+    # "sparse" only checks the neighborhoods of cells louder than
+    # default_amp_min, by far the fastest for spectrograms with few loud cells.
+    peak_filter = "sparse"
+
+    ######################################################################
+    # Density control, so the number of fingerprints per second doesn't depend on
+    # how loud or dense a recording is. peaks_per_frame keeps at most that many of
+    # the loudest peaks in every spectrogram frame. target_hashes_per_second raises
+    # default_amp_min per file until about that many hashes per second of audio are
+    # left, it never lowers it. target_hashes_per_second isn't used with
+    # stream_fingerprints, which needs the whole file. None turns them off.
+    peaks_per_frame: typing.Optional[int] = None
+    target_hashes_per_second: typing.Optional[float] = None
+
     ######################################################################
     # Thresholds on how close or far fingerprints can be in time in order
     # to be paired as a fingerprint. If your max is too low, higher values of
@@ -87,8 +114,75 @@ class FingerprintConfig(BaseConfig):
     # Number of bits to grab from the front of the SHA1 hash in the
     # fingerprint calculation. The more you grab, the more memory storage,
     # with potentially lesser collisions of matches.
+    # Fingerprints are stored as 64 bit integers, so only up to 16 hex
+    # digits are kept. Values above 16, like the default, are used as 16,
+    # and json and pickle save files have 16 digit keys that versions
+    # up to 1.3.0 can't match against their 20 digit fingerprints.
     FINGERPRINT_REDUCTION = 20
 
+    ######################################################################
+    # Maximum number of candidate peak pairs/triplets the hash generator
+    # evaluates at once. Higher values use more memory per batch, lower
+    # values add a little overhead per batch.
+    HASH_CANDIDATE_BLOCK = 2**21
+
+    ######################################################################
+    # If True, files are decoded and fingerprinted FINGERPRINT_BLOCK samples
+    # at a time, so memory doesn't grow with the length of the file. Gives the
+    # same fingerprints. Not used with start_end, plot, target_hashes_per_second
+    # or without peak_sort.
+    stream_fingerprints = False
+
+    ######################################################################
+    # Number of samples decoded and fingerprinted at once when stream_fingerprints is True
+    FINGERPRINT_BLOCK = 2**21
+
+    ######################################################################
+    # Directory to cache fingerprints in. Files with fingerprints in the cache
+    # aren't fingerprinted again. Entries are keyed by the file and every setting
+    # that changes fingerprints. None turns the cache off.
+    cache_dir: typing.Optional[str] = None
+
+    ######################################################################
+    # How files are identified in the cache. "stat" uses the path, size and
+    # modification time. "content" digests the whole file, so copied and moved
+    # files are found too, but every file is read to look it up.
+    cache_key = "stat"
+
+    ######################################################################
+    # Least recently used entries are removed once the cache is bigger than
+    # this many bytes. None never removes any.
+    cache_max_bytes: typing.Optional[int] = 2**30
+
+    ######################################################################
+    # If True, recognitions count matches as they are found instead of
+    # collecting every match first. Peak memory then depends on the number
+    # of distinct offsets rather than the number of matches. With locality,
+    # matches are found and aligned one file at a time.
+    stream_matches = False
+
+    ######################################################################
+    # Maximum number of matches found at once when stream_matches is True
+    MATCH_BLOCK = 2**20
+
+    ######################################################################
+    # Hashes that occur more than this many times in one file, like those of
+    # steady tones or hum, are put on the stop list. Their matches are mostly
+    # noise and grow with the product of their occurrences. None keeps them.
+    stop_max_occurrences: typing.Optional[int] = None
+
+    ######################################################################
+    # Hashes found in more than this many fingerprinted files are put on the
+    # stop list when recognizing. Below 1, a proportion of the fingerprinted
+    # files. Meant for libraries of many files. None keeps them.
+    stop_max_files: typing.Optional[float] = None
+
+    ######################################################################
+    # When stop_max_occurrences is applied. "query" skips the hashes when
+    # recognizing, fingerprints stay the same. "fingerprint" drops them from
+    # fingerprints, so they take less memory and storage. "both" does both.
+    stop_list_at = "query"
+
     rankings_minus = (
         (0.95, 4),
         (0.9, 3),
@@ -138,6 +232,23 @@ class FingerprintConfig(BaseConfig):
         """Gets the hash style. Is one of ["base", "panako", "panako_mod", "base_three"]"""
         return self.hash_style
 
+    def set_hash_encoding(self, hash_encoding: str) -> None:
+        """Sets the hash encoding. Must be one of ["sha1", "packed"]
+
+        Args
+        ----
+            hash_encoding (str): how hashes are turned into fingerprint keys
+        """
+        if hash_encoding not in ["sha1", "packed"]:
+            raise ValueError(
+                f'Hash encoding "{hash_encoding}" must be one of ["sha1", "packed"]'
+            )
+        self.hash_encoding = hash_encoding
+
+    def get_hash_encoding(self) -> str:
+        """Gets the hash encoding. Is one of ["sha1", "packed"]"""
+        return self.hash_encoding
+
     def set_accuracy(self, accuracy: int) -> None:
         """
         Sets the accuracy level of audalign object
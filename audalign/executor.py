@@ -0,0 +1,150 @@
+"""
+Process pool shared by every audalign function that uses multiprocessing
+
+Without an executor, each fingerprint_directory, correlation, visual recognition,
+alignment and noise or leveling directory call starts a pool and closes it when
+it's done. An Executor keeps one pool open across calls, so its processes start
+and import audalign once:
+
+    with audalign.Executor(4, config=recognizer.config):
+        results = audalign.align("audio", recognizer=recognizer)
+        fine_results = audalign.fine_align(results, recognizer=fine_recognizer)
+
+or audalign.set_executor(audalign.Executor(4)) until set_executor(None).
+
+The config an executor is made with is sent to its processes once. Tasks with an
+equal config use that copy instead of pickling the config with every task.
+
+Fingerprint recognitions with multiprocessing still fork their own processes, to
+share the fingerprint index copy-on-write.
+"""
+
+import contextlib
+import multiprocessing
+import pickle
+import typing
+from functools import partial
+
+# Keyword arguments that hold configs in the functions run by pools
+CONFIG_ARGS = ["config", "base_config"]
+
+_executor = None
+_worker_config = None
+
+
+class Executor:
+    """
+    Pool of processes kept open across audalign calls, see set_executor
+
+    Args
+    ----
+        processes (int): number of processes, defaults to cpu_count
+        config (BaseConfig): config sent to the processes once
+    """
+
+    def __init__(self, processes: typing.Optional[int] = None, config=None):
+        self.processes = _num_processes(processes)
+        self._config = None if config is None else pickle.dumps(config)
+        self._previous = []
+        self._pool = multiprocessing.Pool(
+            self.processes, initializer=_initialize, initargs=(config,)
+        )
+
+    def __repr__(self) -> str:
+        return f"Executor({self.processes} processes)"
+
+    def __enter__(self):
+        self._previous.append(set_executor(self))
+        return self
+
+    def __exit__(self, *args) -> None:
+        set_executor(self._previous.pop())
+        self.close()
+
+    def map(self, function, iterable) -> list:
+        """pool.map of function over iterable, with the executor's config if it's equal"""
+        return self._pool.map(self._shared_config(function), iterable)
+
+    def close(self) -> None:
+        """Waits for running tasks and stops the processes"""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def _shared_config(self, function):
+        if self._config is None or not isinstance(function, partial):
+            return function
+        for name in CONFIG_ARGS:
+            if (
+                name in function.keywords
+                and pickle.dumps(function.keywords[name]) == self._config
+            ):
+                keywords = dict(function.keywords)
+                del keywords[name]
+                return partial(
+                    _call_with_config,
+                    partial(function.func, *function.args, **keywords),
+                    name,
+                )
+        return function
+
+
+def set_executor(executor: typing.Optional[Executor]) -> typing.Optional[Executor]:
+    """
+    Sets the executor every audalign function with multiprocessing uses instead of
+    starting its own pool. Its number of processes is used instead of num_processors.
+
+    Args
+    ----
+        executor (Executor): executor to use, None starts a pool per call again
+
+    Returns
+    -------
+        the previous executor, which isn't closed
+    """
+    global _executor
+    previous, _executor = _executor, executor
+    return previous
+
+
+def get_executor() -> typing.Optional[Executor]:
+    """Returns the executor set with set_executor, or None"""
+    return _executor
+
+
+@contextlib.contextmanager
+def get_pool(processes: typing.Optional[int] = None):
+    """
+    Yields the executor set with set_executor, or an Executor of processes that's
+    closed after the with block
+    """
+    if _executor is not None:
+        yield _executor
+        return
+    executor = Executor(processes)
+    try:
+        yield executor
+    finally:
+        executor.close()
+
+
+def _num_processes(processes: typing.Optional[int]) -> int:
+    try:
+        processes = processes or multiprocessing.cpu_count()
+    except NotImplementedError:
+        return 1
+    return 1 if processes <= 0 else processes
+
+
+def _initialize(config) -> None:
+    global _executor, _worker_config
+    # loads everything tasks use once, and forked processes don't get the pool
+    import audalign
+
+    _executor = None
+    _worker_config = config
+
+
+def _call_with_config(function, name: str, task):
+    return function(task, **{name: _worker_config})
@@ -1,7 +1,7 @@
 import fnmatch
 import math
-import multiprocessing
 import os
+import subprocess
 import typing
 from functools import partial
 from functools import wraps
@@ -10,9 +10,17 @@ import numpy as np
 from numpy.core.defchararray import array
 from pydub import AudioSegment, effects
 from pydub.exceptions import CouldntDecodeError
+from pydub.utils import db_to_float, mediainfo_json, ratio_to_db
 
 from audalign.config import BaseConfig
 from audalign.config.fingerprint import FingerprintConfig
+from audalign.executor import get_pool
+
+try:
+    import audioop
+except ImportError:
+    # Removed from the standard library in python 3.13, pydub falls back to the same
+    import pyaudioop as audioop
 
 try:
     import noisereduce
@@ -190,6 +198,143 @@ def read(
     return data, audiofile.frame_rate
 
 
+def read_blocks(
+    filename: str,
+    block_size: int,
+    sample_rate=BaseConfig.sample_rate,
+    normalize: bool = BaseConfig.normalize,
+    cant_read_extensions: list[str] = BaseConfig.cant_read_extensions,
+):
+    """
+    Decodes an audio file with ffmpeg about block_size samples at a time rather than all at once.
+    Put together, the blocks are the same samples read returns for the file.
+
+    Normalizing needs the loudest sample of the file, so normalized files are decoded twice.
+
+    Args
+        filename (str): path to audio file
+        block_size (int): number of samples in each block, the last can be shorter
+
+    Returns
+    -------
+        blocks (iterator[array[int]]): mono int16 blocks of the file's samples at sample_rate
+    """
+    if os.path.splitext(filename)[1] in cant_read_extensions + [".txt", ".json"]:
+        raise CouldntDecodeError
+    if not os.path.isfile(filename):
+        raise FileNotFoundError(filename)
+    audio_streams = [
+        x for x in mediainfo_json(filename).get("streams", []) if x["codec_type"] == "audio"
+    ]
+    if len(audio_streams) == 0:
+        raise CouldntDecodeError(f"No audio stream found in {filename}")
+    stream = audio_streams[0]
+    # Same workaround as pydub for ffprobe versions that always say fltp
+    if stream.get("sample_fmt") == "fltp" and stream.get("codec_name") in [
+        "mp3",
+        "mp4",
+        "aac",
+        "webm",
+        "ogg",
+    ]:
+        bits_per_sample = 16
+    else:
+        bits_per_sample = int(stream.get("bits_per_sample", 0))
+    if bits_per_sample not in [8, 16, 24, 32]:
+        raise CouldntDecodeError(
+            f"Can't decode {filename} in blocks, {bits_per_sample} bits per sample"
+        )
+    file_format = (
+        int(stream["channels"]),
+        int(stream["sample_rate"]),
+        bits_per_sample // 8,
+    )
+
+    gain = None
+    if normalize:
+        peak_sample_val = 0
+        for block in _decode_blocks(filename, block_size, sample_rate, *file_format):
+            peak_sample_val = max(peak_sample_val, audioop.max(block, 2))
+        # Same as pydub's effects.normalize in create_audiosegment
+        if peak_sample_val != 0:
+            # max_possible_amplitude of 16 bit samples, 0.1 dB of headroom
+            target_peak = 32768.0 * db_to_float(-0.1)
+            gain = db_to_float(float(ratio_to_db(target_peak / peak_sample_val)))
+    return _normalized_blocks(
+        _decode_blocks(filename, block_size, sample_rate, *file_format), gain
+    )
+
+
+def _normalized_blocks(blocks, gain: typing.Optional[float]):
+    for block in blocks:
+        if gain is not None:
+            block = audioop.mul(block, 2, gain)
+        yield np.frombuffer(block, np.int16)
+
+
+def _decode_blocks(
+    filename: str,
+    block_size: int,
+    sample_rate: int,
+    channels: int,
+    file_sample_rate: int,
+    sample_width: int,
+):
+    """
+    Yields mono 16 bit blocks of the file at sample_rate as bytes, converted the same
+    way pydub converts in create_audiosegment so that the samples match exactly.
+    """
+    raw_format = {1: "u8", 2: "s16le", 3: "s24le", 4: "s32le"}[sample_width]
+    process = subprocess.Popen(
+        [AudioSegment.converter, "-i", filename, "-vn", "-f", raw_format, "-"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+    # ratecv carries its state across blocks so the resampling is seamless
+    ratecv_state = None
+    frames_per_block = max(1, block_size * file_sample_rate // sample_rate)
+    try:
+        while True:
+            block = process.stdout.read(frames_per_block * channels * sample_width)
+            if len(block) == 0:
+                break
+            width = sample_width
+            if width == 1:
+                # convert from unsigned integers in wav
+                block = audioop.bias(block, 1, -128)
+            elif width == 3:
+                # pydub pads 24 bit samples to 32 bits with a byte of the sign in front
+                block = np.frombuffer(block, np.uint8).reshape(-1, 3)
+                padded = np.empty((len(block), 4), dtype=np.uint8)
+                padded[:, 0] = np.where(block[:, 2] > 0x7F, 0xFF, 0)
+                padded[:, 1:] = block
+                block, width = padded.tobytes(), 4
+            if file_sample_rate != sample_rate:
+                block, ratecv_state = audioop.ratecv(
+                    block,
+                    width,
+                    channels,
+                    file_sample_rate,
+                    sample_rate,
+                    ratecv_state,
+                )
+            if width != 2:
+                block = audioop.lin2lin(block, width, 2)
+            if channels == 2:
+                block = audioop.tomono(block, 2, 0.5, 0.5)
+            elif channels > 2:
+                samples = np.frombuffer(block, np.int16).reshape(-1, channels)
+                block = np.sum(samples // channels, axis=1, dtype=np.int16).tobytes()
+            yield block
+        if process.wait() != 0:
+            raise CouldntDecodeError(f"Decoding {filename} failed")
+    finally:
+        process.stdout.close()
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+
 def _floatify_data(audio_segment: AudioSegment):
     data = np.frombuffer(audio_segment._data, np.int16).astype(np.float32)
     data[np.where(data < 0)] /= 32768
@@ -293,19 +438,9 @@ def noise_remove_directory(
 
     if use_multiprocessing == True:
 
-        try:
-            nprocesses = num_processes or multiprocessing.cpu_count()
-        except NotImplementedError:
-            nprocesses = 1
-        else:
-            nprocesses = 1 if nprocesses <= 0 else nprocesses
-
-        with multiprocessing.Pool(nprocesses) as pool:
+        with get_pool(num_processes) as pool:
 
             pool.map(_reduce_noise, file_names)
-
-            pool.close()
-            pool.join()
     else:
         for i in file_names:
             _reduce_noise(i)
@@ -413,19 +548,9 @@ def uniform_level_directory(
 
     if use_multiprocessing == True:
 
-        try:
-            nprocesses = num_processes or multiprocessing.cpu_count()
-        except NotImplementedError:
-            nprocesses = 1
-        else:
-            nprocesses = 1 if nprocesses <= 0 else nprocesses
-
-        with multiprocessing.Pool(nprocesses) as pool:
-
-            pool.map(_uniform_level_, (x[0] for x in find_files(directory)))
+        with get_pool(num_processes) as pool:
 
-            pool.close()
-            pool.join()
+            pool.map(_uniform_level_, [x[0] for x in find_files(directory)])
     else:
         for i in (x[0] for x in find_files(directory)):
             _uniform_level_(i)
@@ -105,6 +105,46 @@ class BaseRecognizer(ABC):
         """
         raise NotImplementedError
 
+    def check_align_all_hook(
+        self,
+        file_list: list,
+        dir_or_list: typing.Union[str, list],
+        target_aligning: bool,
+        fine_aud_file_dict: typing.Optional[dict],
+    ) -> bool:
+        """True if align_all_hook aligns every file at once instead of one by one
+
+        Args:
+            file_list (list): list of files to align
+            dir_or_list (typing.Union[str, list]): a directory or list of files
+            target_aligning (bool): whether or not this a target alignment
+            fine_aud_file_dict (typing.Optional[dict]): for fine aligning
+
+        Returns:
+            bool
+        """
+        return False
+
+    def align_all_hook(
+        self,
+        file_list: list,
+        dir_or_list: typing.Union[str, list],
+        target_aligning: bool,
+        fine_aud_file_dict: typing.Optional[dict],
+    ) -> list:
+        """Implement this if check_align_all_hook can return True
+
+        Args:
+            file_list (list): list of files to align
+            dir_or_list (typing.Union[str, list]): a directory or list of files
+            target_aligning (bool): whether or not this a target alignment
+            fine_aud_file_dict (typing.Optional[dict]): for fine aligning
+
+        Returns:
+            list: what _align returns for each file
+        """
+        raise NotImplementedError
+
     def align_post_hook(
         self,
         file_list,
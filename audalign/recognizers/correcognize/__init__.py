@@ -3,8 +3,10 @@ from audalign.recognizers import BaseRecognizer
 from audalign.config.correlation import CorrelationConfig
 from audalign.recognizers.correcognize.correcognize import (
     correcognize,
+    correcognize_all,
     correcognize_directory,
 )
+from audalign.filehandler import find_files
 
 import os
 import typing
@@ -39,6 +41,45 @@ class CorrelationRecognizer(BaseRecognizer):
         self.last_recognition = recognition
         return recognition
 
+    def check_align_all_hook(
+        self,
+        file_list,
+        dir_or_list,
+        target_aligning: bool,
+        fine_aud_file_dict: typing.Optional[dict],
+    ):
+        # target files are read with start_end and against files without
+        return (
+            self.config.all_pairs
+            and not self.config.stream_correlation
+            and self.config.coarse_sample_rate is None
+            and not target_aligning
+            and self.config.locality is None
+            and self.config.start_end is None
+            and len(file_list) > 1
+        )
+
+    def align_all_hook(
+        self,
+        file_list,
+        dir_or_list,
+        target_aligning: bool,
+        fine_aud_file_dict: typing.Optional[dict],
+    ):
+        temp_config = copy.deepcopy(self.config)
+        temp_config.plot = False
+
+        if type(dir_or_list) == str:
+            against_files = [x for x, _ in find_files(dir_or_list)]
+        else:
+            against_files = list(dir_or_list)
+        return correcognize_all(
+            file_list,
+            against_files,
+            config=temp_config,
+            _file_audsegs=fine_aud_file_dict,
+        )
+
     def check_align_hook(
         self,
         file_list,
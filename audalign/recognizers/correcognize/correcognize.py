@@ -1,5 +1,5 @@
-import multiprocessing
 import os
+import tempfile
 import time
 from functools import partial
 
@@ -7,11 +7,21 @@ import audalign.recognizers.fingerprint.fingerprinter as fingerprinter
 from audalign.config.correlation import CorrelationConfig
 import matplotlib.pyplot as plt
 import numpy as np
+import scipy.fft
 import scipy.signal as signal
 import tqdm
-from audalign.filehandler import find_files, get_shifted_file, read
+from audalign.executor import get_pool
+from audalign.filehandler import find_files, get_shifted_file, read, read_blocks
 from pydub.exceptions import CouldntDecodeError
 
+# Lag windows up to this many lags are correlated with direct dot products
+DIRECT_LAGS = 64
+# Samples of overlap-save blocks or locality windows FFT'd at once
+FFT_BATCH = 2**22
+# Bytes of stream_memory_bytes per FFT sample of stream_find_peaks, about eight
+# float64 buffers of blocks, spectra and the correlation
+STREAM_BYTES_PER_SAMPLE = 64
+
 
 def correcognize(
     target_file_path: str,
@@ -67,6 +77,7 @@ def correcognize(
         sos=sos,
         normalize=config.normalize,
         cant_read_extensions=config.cant_read_extensions,
+        stream_config=config,
     )
     against_array = get_array(
         against_file_path,
@@ -76,6 +87,7 @@ def correcognize(
         sos=sos,
         normalize=config.normalize,
         cant_read_extensions=config.cant_read_extensions,
+        stream_config=config,
     )
 
     t = time.time()
@@ -150,6 +162,7 @@ def correcognize_directory(
             sos=sos,
             normalize=config.normalize,
             cant_read_extensions=config.cant_read_extensions,
+            stream_config=config,
         )
         target_file_path = (target_file_path, target_array)
 
@@ -177,17 +190,8 @@ def correcognize_directory(
         for file_path in against_files:
             results_list += [_correcognize_dir_(file_path)]
     else:
-        try:
-            nprocesses = config.num_processors or multiprocessing.cpu_count()
-        except NotImplementedError:
-            nprocesses = 1
-        else:
-            nprocesses = 1 if nprocesses <= 0 else nprocesses
-
-        with multiprocessing.Pool(nprocesses) as pool:
+        with get_pool(config.num_processors) as pool:
             results_list = pool.map(_correcognize_dir_, tqdm.tqdm(list(against_files)))
-            pool.close()
-            pool.join()
 
     file_match = {}
     for i in results_list:
@@ -208,6 +212,207 @@ def correcognize_directory(
     return None
 
 
+def correcognize_all(
+    file_paths: list,
+    against_files: list,
+    config: CorrelationConfig,
+    _file_audsegs: dict = None,
+) -> list:
+    """
+    Recognizes every file of file_paths against against_files without locality, the
+    same as correcognize_directory for each file
+
+    Every file is decoded and filtered once and its rFFT, padded to fit the longest
+    pair, is kept. Every pair of files is correlated once by multiplying spectra,
+    the correlation of the other direction is the same one reversed.
+
+    If the spectra would take more than config.all_pairs_memory_bytes, each file is
+    recognized with correcognize_directory instead.
+
+    Args
+    ----
+        file_paths (list[str]): files to recognize
+        against_files (list[str]): files to recognize them against
+        config (CorrelationConfig): config with locality and start_end None
+        _file_audsegs (dict): shifts of fine alignments
+
+    Returns
+    -------
+        list: what correcognize_directory returns for each file of file_paths
+    """
+    assert (
+        config.sample_rate < 200000
+    )  # I accidentally used 441000 once... not good, big crash
+
+    t = time.time()
+
+    max_lags = config.max_lags
+    if max_lags is not None:
+        max_lags = int(max_lags * config.sample_rate)
+    filter_matches = config.filter_matches
+    if filter_matches is None:
+        filter_matches = 0.0
+
+    if config.freq_threshold <= 0:
+        config.freq_threshold = 1
+    sos = signal.butter(
+        10, config.freq_threshold, "highpass", fs=config.sample_rate, output="sos"
+    )
+
+    paths = list(dict.fromkeys(list(against_files) + list(file_paths)))
+    _read_file_ = partial(
+        _read_file, sos_filter=sos, _file_audsegs=_file_audsegs, config=config
+    )
+    if config.multiprocessing == False:
+        arrays = [_read_file_(x) for x in paths]
+    else:
+        with get_pool(config.num_processors) as pool:
+            arrays = pool.map(_read_file_, paths)
+
+    lengths = [0 if x is None else len(x) for x in arrays]
+    if max(lengths) == 0:
+        return [None] * len(file_paths)
+    nfft = scipy.fft.next_fast_len(2 * max(lengths) - 1, real=True)
+    spectra_bytes = (nfft // 2 + 1) * 16 * sum(x > 0 for x in lengths)
+    if spectra_bytes > config.all_pairs_memory_bytes:
+        print(
+            f"Spectra need {spectra_bytes} bytes, more than all_pairs_memory_bytes, "
+            "recognizing file by file"
+        )
+        del arrays
+        return [
+            correcognize_directory(
+                x, against_files, config=config, _file_audsegs=_file_audsegs
+            )
+            for x in file_paths
+        ]
+    spectra = [
+        None if x is None else scipy.fft.rfft(x, nfft, workers=config.fft_workers)
+        for x in arrays
+    ]
+    del arrays
+
+    index = {x: i for i, x in enumerate(paths)}
+    targets = [index[x] for x in file_paths]
+    target_set = set(i for i in targets if spectra[i] is not None)
+    against = [index[x] for x in dict.fromkeys(against_files)]
+    against_set = set(i for i in against if spectra[i] is not None)
+    names = [os.path.basename(x) for x in paths]
+
+    pairs = [
+        (i, j)
+        for i in range(len(paths))
+        for j in range(i + 1, len(paths))
+        if names[i] != names[j]
+        and (
+            (i in against_set and j in target_set)
+            or (i in target_set and j in against_set)
+        )
+    ]
+    print(f"Correlating {len(pairs)} pairs of {len(paths)} files")
+    _pair_match_ = partial(
+        _pair_match,
+        filter_matches=filter_matches,
+        match_len_filter=config.match_len_filter,
+        max_lags=max_lags,
+        config=config,
+        **config.passthrough_args,
+    )
+    file_matches = {i: {} for i in targets}
+    for i, j in tqdm.tqdm(pairs):
+        # correlate(array i, array j) is circular at lags -(lengths[j] - 1) to
+        # lengths[i] - 1, only the ones within max_lags are kept
+        circular = scipy.fft.irfft(
+            spectra[i] * spectra[j].conj(), nfft, workers=config.fft_workers
+        )
+        low, high = -(lengths[j] - 1), lengths[i] - 1
+        if max_lags is not None:
+            low, high = max(low, -max_lags), min(high, max_lags)
+        correlation = np.concatenate(
+            (
+                circular[nfft + low : nfft + min(high, -1) + 1] if low < 0 else [],
+                circular[max(low, 0) : high + 1] if high >= 0 else [],
+            )
+        )
+        if j in target_set and i in against_set:
+            file_matches[j][i] = _pair_match_(
+                correlation, (lengths[i], lengths[j]), low, paths[i]
+            )
+        if i in target_set and j in against_set:
+            file_matches[i][j] = _pair_match_(
+                correlation[::-1].copy(), (lengths[j], lengths[i]), -high, paths[j]
+            )
+
+    t = time.time() - t
+
+    results = []
+    for i in targets:
+        file_match = {}
+        for j in against:
+            file_match = {**file_match, **file_matches[i].get(j, {})}
+        if len(file_match) > 0:
+            results.append({"match_time": t, "match_info": file_match})
+        else:
+            results.append(None)
+    return results
+
+
+def _read_file(
+    file_path: str,
+    sos_filter,
+    _file_audsegs: dict,
+    config: CorrelationConfig,
+):
+    """get_array for correcognize_all, None if file_path can't be decoded"""
+    try:
+        return get_array(
+            file_path,
+            start_end=None,
+            sample_rate=config.sample_rate,
+            _file_audsegs=_file_audsegs,
+            sos=sos_filter,
+            normalize=config.normalize,
+            cant_read_extensions=config.cant_read_extensions,
+        )
+    except CouldntDecodeError as e:
+        print(f'File "{file_path}" could not be decoded')
+        if config.fail_on_decode_error:
+            raise e
+        return None
+
+
+def _pair_match(
+    correlation: np.ndarray,
+    len_tups: tuple,
+    first_lag: int,
+    against_file_path: str,
+    filter_matches: float,
+    match_len_filter: int,
+    max_lags: float,
+    config: CorrelationConfig,
+    **kwargs,
+) -> dict:
+    """Peaks of a correlation computed by correcognize_all, as _correcognize returns"""
+    results_list_tuple, scaling_factor = find_maxes(
+        correlation=(correlation, len_tups, first_lag),
+        filter_matches=filter_matches,
+        match_len_filter=match_len_filter,
+        max_lags=max_lags,
+        SCALING_16_BIT=config.SCALING_16_BIT,
+        locality_filter_prop=None,
+        locality=None,
+        indexes_len=0,
+        **kwargs,
+    )
+    return process_results(
+        results_list=results_list_tuple,
+        file_name=os.path.basename(against_file_path),
+        scaling_factor=scaling_factor,
+        locality=None,
+        config=config,
+    )
+
+
 def _correcognize(
     target_array: list,
     target_file_path: str,
@@ -226,6 +431,44 @@ def _correcognize(
     )
 
     print("Calculating correlation... ", end="")
+    if locality is None and (_coarse(config) or _streams(config)):
+        min_lag, max_lag = -(target_array.size - 1), against_array.size - 1
+        if max_lags is not None:
+            min_lag, max_lag = max(min_lag, -max_lags), min(max_lag, max_lags)
+        if _coarse(config):
+            results_list_tuple, scaling_factor = coarse_find_peaks(
+                against_array,
+                target_array,
+                min_lag,
+                max_lag,
+                filter_matches=filter_matches,
+                match_len_filter=match_len_filter,
+                SCALING_16_BIT=config.SCALING_16_BIT,
+                factor=max(1, round(config.sample_rate / config.coarse_sample_rate)),
+                num_candidates=config.coarse_candidates,
+                refine_lags=int(config.coarse_refine * config.sample_rate),
+                workers=config.fft_workers,
+            )
+        else:
+            results_list_tuple, scaling_factor = stream_find_peaks(
+                against_array,
+                target_array,
+                min_lag,
+                max_lag,
+                filter_matches=filter_matches,
+                match_len_filter=match_len_filter,
+                SCALING_16_BIT=config.SCALING_16_BIT,
+                memory_bytes=config.stream_memory_bytes,
+                workers=config.fft_workers,
+            )
+        return process_results(
+            results_list=results_list_tuple,
+            file_name=os.path.basename(against_file_path),
+            scaling_factor=scaling_factor,
+            locality=locality,
+            config=config,
+        )
+
     indexes = (
         find_index_arr(
             against_array,
@@ -242,6 +485,8 @@ def _correcognize(
         target_array,
         locality=locality,
         indexes=indexes,
+        max_lags=max_lags,
+        workers=config.fft_workers,
     )
 
     if locality is None:
@@ -304,6 +549,7 @@ def _correcognize_dir(
             sos=sos_filter,
             normalize=config.normalize,
             cant_read_extensions=config.cant_read_extensions,
+            stream_config=config,
         )
     else:
         target_file_path, target_array = target_file_path
@@ -321,6 +567,7 @@ def _correcognize_dir(
             sos=sos_filter,
             normalize=config.normalize,
             cant_read_extensions=config.cant_read_extensions,
+            stream_config=config,
         )
         return _correcognize(
             target_array=target_array,
@@ -351,7 +598,27 @@ def get_array(
     sos,
     normalize: bool,
     cant_read_extensions: list[str] = CorrelationConfig.cant_read_extensions,
+    stream_config: CorrelationConfig = None,
 ):
+    """
+    Decodes and filters file_path. If stream_config streams correlations, files
+    without start_end or _file_audsegs are decoded and filtered a block at a time
+    into a temporary file, see _read_stream
+    """
+    if (
+        stream_config is not None
+        and _streams(stream_config)
+        and _file_audsegs is None
+        and start_end is None
+    ):
+        return _read_stream(
+            file_path,
+            sample_rate=sample_rate,
+            sos=sos,
+            normalize=normalize,
+            cant_read_extensions=cant_read_extensions,
+            block_size=stream_config.stream_memory_bytes // STREAM_BYTES_PER_SAMPLE,
+        )
     if _file_audsegs is not None:
         target_array = get_shifted_file(
             file_path,
@@ -372,6 +639,63 @@ def get_array(
     return target_array
 
 
+def _streams(config: CorrelationConfig) -> bool:
+    """whether correlations without locality are found with stream_find_peaks"""
+    return (
+        config.stream_correlation
+        and config.locality is None
+        and not config.passthrough_args
+        and not config.plot
+    )
+
+
+def _coarse(config: CorrelationConfig) -> bool:
+    """whether correlations without locality are found with coarse_find_peaks"""
+    return (
+        config.coarse_sample_rate is not None
+        and config.locality is None
+        and not config.passthrough_args
+        and not config.plot
+    )
+
+
+def _read_stream(
+    file_path: str,
+    sample_rate: int,
+    sos,
+    normalize: bool,
+    cant_read_extensions: list,
+    block_size: int,
+) -> np.ndarray:
+    """
+    get_array decoded and filtered block_size samples at a time into a temporary
+    float64 file, which is mapped and removed. Filtering carries the filter's state
+    from block to block, so the samples are the same. Windows can't remove mapped
+    files, so they're read back instead.
+    """
+    fd, path = tempfile.mkstemp(suffix=".f64")
+    try:
+        state = None if sos is None else np.zeros((sos.shape[0], 2))
+        with os.fdopen(fd, "wb") as f:
+            for block in read_blocks(
+                file_path,
+                max(block_size, 1),
+                sample_rate=sample_rate,
+                normalize=normalize,
+                cant_read_extensions=cant_read_extensions,
+            ):
+                if sos is not None:
+                    block, state = signal.sosfilt(sos, block, zi=state)
+                f.write(np.asarray(block, dtype=np.float64).tobytes())
+        if os.path.getsize(path) == 0:
+            return np.zeros(0)
+        if os.name == "nt":
+            return np.fromfile(path, dtype=np.float64)
+        return np.memmap(path, dtype=np.float64, mode="r")
+    finally:
+        os.remove(path)
+
+
 def calc_array_indexes(array, locality, LOCALITY_OVERLAP_RATIO):
     index_list = []
     if locality > len(array):
@@ -415,31 +739,391 @@ def find_index_arr(
     return index_pairs
 
 
+def correlate_lags(
+    a: np.ndarray,
+    b: np.ndarray,
+    min_lag: int,
+    max_lag: int,
+    workers: int = None,
+) -> np.ndarray:
+    """
+    signal.correlate(a, b) at lags min_lag to max_lag only, clipped to the lags of the
+    "full" correlation, -(len(b) - 1) to len(a) - 1. Lag l is sum(a[n + l] * b[n])
+
+    Up to DIRECT_LAGS lags are direct dot products. More lags correlate overlap-save
+    blocks of b with the parts of a they overlap, FFT_BATCH samples of rFFTs at a
+    time. Windows of over half the full correlation are sliced from it.
+    """
+    min_lag = max(min_lag, -(len(b) - 1))
+    max_lag = min(max_lag, len(a) - 1)
+    num_lags = max_lag - min_lag + 1
+    if num_lags <= 0:
+        return np.zeros(0)
+    if 2 * num_lags > len(a) + len(b) - 1:
+        return signal.correlate(a, b)[min_lag + len(b) - 1 : max_lag + len(b)]
+
+    # only the samples of b that overlap a at some lag
+    start, end = max(0, -max_lag), min(len(b), len(a) - min_lag)
+    b = b[start:end]
+    nfft = scipy.fft.next_fast_len(min(8 * num_lags, len(b) + num_lags - 1), real=True)
+    block = nfft - num_lags + 1
+    num_blocks = -(-len(b) // block)
+    # a_window[n + w] is a[start + n + min_lag + w], zeros outside of a
+    a_window = np.zeros(num_blocks * block + num_lags - 1)
+    first = start + min_lag
+    low, high = max(first, 0), min(first + len(b) + num_lags - 1, len(a))
+    a_window[low - first : high - first] = a[low:high]
+    if num_lags <= DIRECT_LAGS:
+        return np.correlate(a_window[: len(b) + num_lags - 1], b, mode="valid")
+
+    b_blocks = np.zeros(num_blocks * block)
+    b_blocks[: len(b)] = b
+    b_blocks = b_blocks.reshape(num_blocks, block)
+    a_blocks = np.lib.stride_tricks.sliding_window_view(a_window, nfft)[::block]
+    spectrum = np.zeros(nfft // 2 + 1, dtype=np.complex128)
+    batch = max(1, FFT_BATCH // nfft)
+    for i in range(0, num_blocks, batch):
+        # sums the blocks' spectra, their correlations add up the same way
+        spectrum += np.sum(
+            scipy.fft.rfft(a_blocks[i : i + batch], nfft, workers=workers)
+            * scipy.fft.rfft(b_blocks[i : i + batch], nfft, workers=workers).conj(),
+            axis=0,
+        )
+    return scipy.fft.irfft(spectrum, nfft, workers=workers)[:num_lags]
+
+
+def iter_correlate_lags(
+    a: np.ndarray,
+    b: np.ndarray,
+    min_lag: int,
+    max_lag: int,
+    memory_bytes: int,
+    workers: int = None,
+):
+    """
+    correlate_lags(a, b, min_lag, max_lag) a chunk of lags at a time, with FFTs of
+    about memory_bytes / STREAM_BYTES_PER_SAMPLE samples. a and b can be memmaps,
+    each chunk only reads the samples it needs.
+
+    Each chunk of up to half an FFT of lags sums the overlap-save spectra of the
+    blocks of b it overlaps with the parts of a they overlap, and is transformed back
+    once.
+
+    Yields
+    ------
+        (first lag, correlation at lags from first lag on) for each chunk in lag order
+    """
+    min_lag = max(min_lag, -(len(b) - 1))
+    max_lag = min(max_lag, len(a) - 1)
+    if max_lag < min_lag:
+        return
+    nfft = 2 ** max(int(np.log2(max(memory_bytes / STREAM_BYTES_PER_SAMPLE, 1))), 4)
+    # no bigger than a single block of b for every lag
+    nfft = min(nfft, scipy.fft.next_fast_len(len(b) + max_lag - min_lag, real=True))
+    chunk = max(nfft // 2, 1)
+    for low in range(min_lag, max_lag + 1, chunk):
+        num_lags = min(chunk, max_lag - low + 1)
+        block = nfft - num_lags + 1
+        # only the samples of b that overlap a at some lag of the chunk
+        start, end = max(0, -(low + num_lags - 1)), min(len(b), len(a) - low)
+        spectrum = np.zeros(nfft // 2 + 1, dtype=np.complex128)
+        for i in range(start, end, block):
+            # a_block[n + w] is a[i + low + n + w], zeros outside of a
+            a_block = np.zeros(nfft)
+            first = i + low
+            a_low, a_high = max(first, 0), min(first + nfft, len(a))
+            a_block[a_low - first : a_high - first] = a[a_low:a_high]
+            spectrum += (
+                scipy.fft.rfft(a_block, workers=workers)
+                * scipy.fft.rfft(
+                    np.asarray(b[i : min(i + block, end)], dtype=np.float64),
+                    nfft,
+                    workers=workers,
+                ).conj()
+            )
+        yield low, scipy.fft.irfft(spectrum, nfft, workers=workers)[:num_lags]
+
+
+def stream_find_peaks(
+    against_array: np.ndarray,
+    target_array: np.ndarray,
+    min_lag: int,
+    max_lag: int,
+    filter_matches: float,
+    match_len_filter: int,
+    SCALING_16_BIT: int,
+    memory_bytes: int,
+    workers: int = None,
+):
+    """
+    _find_peaks of correlate_lags(against_array, target_array, min_lag, max_lag)
+    without holding the correlation, found in the chunks of iter_correlate_lags
+
+    Peaks are found in each chunk with the end of the last one carried over, from the
+    sample before its trailing run of equal values, which could still be the start
+    of a plateau. Only the match_len_filter highest peaks, with ties, are kept
+    between chunks. Heights are normalized and filtered once the whole correlation's
+    maximum is known, which doesn't change their order.
+
+    Returns
+    -------
+        peaks_tuples, scaling_factor: as _find_peaks returns
+    """
+    if match_len_filter is None:
+        match_len_filter = 30
+    max_corr, max_abs = None, 0.0
+    lags, heights = np.zeros(0, dtype=np.int64), np.zeros(0)
+    carried = np.zeros(0)
+    for first_lag, chunk in iter_correlate_lags(
+        against_array, target_array, min_lag, max_lag, memory_bytes, workers
+    ):
+        chunk_max = np.max(chunk)
+        max_corr = chunk_max if max_corr is None else max(max_corr, chunk_max)
+        max_abs = max(max_abs, np.max(np.abs(chunk)))
+
+        values = np.concatenate((carried, chunk))
+        first_lag -= len(carried)
+        peaks, _ = signal.find_peaks(values)
+        lags = np.concatenate((lags, first_lag + peaks))
+        heights = np.concatenate((heights, values[peaks]))
+        if 0 < match_len_filter < len(heights):
+            kth = len(heights) - match_len_filter
+            keep = heights >= np.partition(heights, kth)[kth]
+            lags, heights = lags[keep], heights[keep]
+
+        different = np.flatnonzero(values != values[-1])
+        carried = values[different[-1] if len(different) > 0 else 0 :]
+
+    if max_corr is None:
+        return [], 0.0
+    return _top_peaks(
+        lags,
+        heights,
+        max_corr,
+        max_abs,
+        (len(against_array), len(target_array)),
+        filter_matches,
+        match_len_filter,
+        SCALING_16_BIT,
+    )
+
+
+def energy_envelope(array: np.ndarray, factor: int) -> np.ndarray:
+    """
+    Root mean square of every factor samples of array, minus the envelope's mean so
+    envelope correlations aren't weighted by how much the files overlap. Trailing
+    samples that don't fill factor are dropped.
+    """
+    num_blocks = len(array) // factor
+    envelope = np.zeros(num_blocks)
+    step = max(1, FFT_BATCH // factor)
+    for i in range(0, num_blocks, step):
+        blocks = np.asarray(
+            array[i * factor : min(i + step, num_blocks) * factor], dtype=np.float64
+        ).reshape(-1, factor)
+        envelope[i : i + step] = np.sqrt(np.mean(blocks**2, axis=1))
+    if num_blocks > 0:
+        envelope -= np.mean(envelope)
+    return envelope
+
+
+def coarse_find_peaks(
+    against_array: np.ndarray,
+    target_array: np.ndarray,
+    min_lag: int,
+    max_lag: int,
+    filter_matches: float,
+    match_len_filter: int,
+    SCALING_16_BIT: int,
+    factor: int,
+    num_candidates: int,
+    refine_lags: int,
+    workers: int = None,
+):
+    """
+    _find_peaks of correlate_lags(against_array, target_array, min_lag, max_lag),
+    searched coarse to fine
+
+    The energy envelopes of factor samples are correlated first. The lags within
+    refine_lags (at least factor) of the num_candidates highest envelope peaks and
+    of its maximum are then correlated with correlate_lags, overlapping windows
+    merged. Peaks, confidences and scaling_factor are those of the refined lags.
+
+    Returns
+    -------
+        peaks_tuples, scaling_factor: as _find_peaks returns
+    """
+    if match_len_filter is None:
+        match_len_filter = 30
+    min_lag = max(min_lag, -(len(target_array) - 1))
+    max_lag = min(max_lag, len(against_array) - 1)
+    if max_lag < min_lag:
+        return [], 0.0
+
+    windows = [(min_lag, max_lag)]
+    coarse_a = energy_envelope(against_array, factor)
+    coarse_b = energy_envelope(target_array, factor)
+    coarse_min, coarse_max = min_lag // factor, -(-max_lag // factor)
+    coarse = correlate_lags(coarse_a, coarse_b, coarse_min, coarse_max, workers)
+    if len(coarse) > 0:
+        coarse_first = max(coarse_min, -(len(coarse_b) - 1))
+        peaks, _ = signal.find_peaks(coarse)
+        candidates = peaks[np.argsort(-coarse[peaks], kind="stable")[:num_candidates]]
+        candidates = np.union1d(candidates, [np.argmax(coarse)])
+        refine_lags = max(refine_lags, factor)
+        windows = []
+        for lag in (coarse_first + candidates) * factor:
+            low = max(lag - refine_lags, min_lag)
+            high = min(lag + refine_lags, max_lag)
+            if low > high:
+                continue
+            if len(windows) > 0 and low <= windows[-1][1] + 1:
+                windows[-1] = (windows[-1][0], max(windows[-1][1], high))
+            else:
+                windows.append((low, high))
+
+    lags, heights = [], []
+    max_corr, max_abs = None, 0.0
+    for low, high in windows:
+        correlation = correlate_lags(against_array, target_array, low, high, workers)
+        window_max = np.max(correlation)
+        max_corr = window_max if max_corr is None else max(max_corr, window_max)
+        max_abs = max(max_abs, np.max(np.abs(correlation)))
+        peaks, _ = signal.find_peaks(correlation)
+        lags.append(low + peaks)
+        heights.append(correlation[peaks])
+    if max_corr is None:
+        return [], 0.0
+    return _top_peaks(
+        np.concatenate(lags),
+        np.concatenate(heights),
+        max_corr,
+        max_abs,
+        (len(against_array), len(target_array)),
+        filter_matches,
+        match_len_filter,
+        SCALING_16_BIT,
+    )
+
+
+def _top_peaks(
+    lags: np.ndarray,
+    heights: np.ndarray,
+    max_corr: float,
+    max_abs: float,
+    len_tups: tuple,
+    filter_matches: float,
+    match_len_filter: int,
+    SCALING_16_BIT: int,
+):
+    """
+    Normalizes and filters the peaks of a correlation searched in parts the way
+    _find_peaks does, lags in increasing order
+    """
+    scaling_factor = max_corr / (len_tups[0] + len_tups[1] - 1) / SCALING_16_BIT
+    if max_corr > 0:
+        heights = heights / max_abs
+    keep = heights >= filter_matches
+    lags, heights = lags[keep], heights[keep]
+    # highest first, equal heights in lag order
+    order = np.argsort(-heights, kind="stable")[:match_len_filter]
+    return list(zip(lags[order], heights[order])), scaling_factor
+
+
 def calc_corrs(
     against_array,
     target_array,
     locality: float,
     indexes: list,
+    max_lags: int = None,
+    workers: int = None,
 ):
+    """
+    Without locality, yields (correlation, (against length, target length), first lag),
+    only lags within max_lags if it's set. With locality, yields
+    [(correlation, (against window length, target window length)), index pair]
+    for each index pair, see _locality_corrs
+    """
     if locality is None:
-        yield (
-            signal.correlate(against_array, target_array),
-            (against_array.size, target_array.size),
-        )
+        if max_lags is None:
+            yield (
+                signal.correlate(against_array, target_array),
+                (against_array.size, target_array.size),
+                -(target_array.size - 1),
+            )
+        else:
+            yield (
+                correlate_lags(
+                    against_array, target_array, -max_lags, max_lags, workers
+                ),
+                (against_array.size, target_array.size),
+                max(-max_lags, -(target_array.size - 1)),
+            )
     else:
         locality_a = len(against_array) if locality > len(against_array) else locality
         locality_b = len(target_array) if locality > len(target_array) else locality
-        for pair in indexes:
-            yield [
-                (
-                    signal.correlate(
-                        against_array[pair[0] : pair[0] + locality_a],
-                        target_array[pair[1] : pair[1] + locality_b],
-                    ),
-                    (locality_a, locality_b),
-                ),
-                pair,
-            ]
+        yield from _locality_corrs(
+            against_array, target_array, locality_a, locality_b, indexes, workers
+        )
+
+
+def _locality_corrs(
+    against_array,
+    target_array,
+    locality_a: int,
+    locality_b: int,
+    indexes: list,
+    workers: int = None,
+):
+    """
+    signal.correlate of the windows of every index pair, in the order of indexes
+
+    Every target window of the pairs is rFFT'd once into a stack of conjugate
+    spectra. Pairs come against window by against window, so each against window is
+    rFFT'd once for the batch of pairs it's in. Each batch of pairs multiplies
+    spectra and transforms back FFT_BATCH samples at a time.
+    """
+    if len(indexes) == 0:
+        return
+    nfft = scipy.fft.next_fast_len(locality_a + locality_b - 1, real=True)
+    batch = max(1, FFT_BATCH // nfft)
+
+    target_starts = sorted(set(x[1] for x in indexes))
+    target_rows = {x: i for i, x in enumerate(target_starts)}
+    target_spectra = np.empty((len(target_starts), nfft // 2 + 1), dtype=np.complex128)
+    for i in range(0, len(target_starts), batch):
+        windows = [target_array[x : x + locality_b] for x in target_starts[i : i + batch]]
+        target_spectra[i : i + batch] = scipy.fft.rfft(
+            np.stack(windows), nfft, workers=workers
+        ).conj()
+
+    against_spectra = {}
+    for i in range(0, len(indexes), batch):
+        pairs = indexes[i : i + batch]
+        starts = list(dict.fromkeys(x[0] for x in pairs))
+        missing = [x for x in starts if x not in against_spectra]
+        if len(missing) > 0:
+            spectra = scipy.fft.rfft(
+                np.stack([against_array[x : x + locality_a] for x in missing]),
+                nfft,
+                workers=workers,
+            )
+            against_spectra.update(zip(missing, spectra))
+        # keeps the last batch's windows, the next batch can start with them
+        against_spectra = {x: against_spectra[x] for x in starts}
+
+        circular = scipy.fft.irfft(
+            np.stack([against_spectra[x[0]] for x in pairs])
+            * target_spectra[[target_rows[x[1]] for x in pairs]],
+            nfft,
+            workers=workers,
+        )
+        # full correlations, lags -(locality_b - 1) to locality_a - 1
+        correlations = np.concatenate(
+            (circular[:, nfft - locality_b + 1 :], circular[:, :locality_a]), axis=1
+        )
+        for pair, correlation in zip(pairs, correlations):
+            yield [(correlation, (locality_a, locality_b)), pair]
 
 
 def find_maxes(
@@ -458,6 +1142,7 @@ def find_maxes(
         return _find_peaks(
             correlation=correlation[0],
             len_tups=correlation[1],
+            first_lag=correlation[2],
             filter_matches=filter_matches,
             match_len_filter=match_len_filter,
             max_lags=max_lags,
@@ -497,17 +1182,27 @@ def _find_peaks(
     max_lags: float,
     SCALING_16_BIT: int,
     index_pair: tuple = None,
+    first_lag: int = None,
     **kwargs,
 ):
-    """This is where kwargs go. returns zip of peak indices and their heights sorted by height"""
+    """
+    This is where kwargs go. returns zip of peak indices and their heights sorted by height
+
+    correlation is the "full" correlation of arrays of len_tups lengths, or the lags
+    from first_lag on if it's given
+    """
     max_corr = np.max(correlation)
-    scaling_factor = max_corr / len(correlation) / SCALING_16_BIT
+    # scaled by the full length, so restricted lags keep the same scale
+    scaling_factor = max_corr / (len_tups[0] + len_tups[1] - 1) / SCALING_16_BIT
     correlation = (
         correlation / np.max(np.abs(correlation), axis=0)
         if max_corr > 0
         else correlation
     )
-    lag_array = signal.correlation_lags(len_tups[0], len_tups[1], mode="full")
+    if first_lag is None:
+        lag_array = signal.correlation_lags(len_tups[0], len_tups[1], mode="full")
+    else:
+        lag_array = np.arange(first_lag, first_lag + len(correlation))
     if max_lags is not None:
         shift = 0
         if index_pair is not None:
@@ -519,14 +1214,18 @@ def _find_peaks(
 
     # https://docs.scipy.org/doc/scipy/reference/generated/scipy.signal.find_peaks.html
     peaks, properties = signal.find_peaks(correlation, height=filter_matches, **kwargs)
-    peaks = [lag_array[x] for x in peaks]
-    peaks_tuples = zip(peaks, properties["peak_heights"])
-    peaks_tuples = sorted(peaks_tuples, key=lambda x: x[1], reverse=True)
+    heights = properties["peak_heights"]
 
     if match_len_filter is None:
         match_len_filter = 30
-    if len(peaks_tuples) > match_len_filter:
-        peaks_tuples = peaks_tuples[:match_len_filter]
+    order = np.arange(len(heights))
+    if 0 < match_len_filter < len(heights):
+        # only sorts the highest peaks, with every peak tied with the last one
+        kth = len(heights) - match_len_filter
+        order = np.flatnonzero(heights >= np.partition(heights, kth)[kth])
+    # highest first, equal heights in lag order
+    order = order[np.argsort(-heights[order], kind="stable")][:match_len_filter]
+    peaks_tuples = list(zip(lag_array[peaks[order]], heights[order]))
     return peaks_tuples, scaling_factor
 
 
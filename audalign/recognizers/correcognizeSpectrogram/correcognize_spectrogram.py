@@ -1,4 +1,3 @@
-import multiprocessing
 import os
 import time
 from functools import partial
@@ -10,6 +9,7 @@ import matplotlib.pyplot as plt
 import numpy as np
 import scipy.signal as signal
 import tqdm
+from audalign.executor import get_pool
 from audalign.filehandler import find_files, get_shifted_file, read
 from pydub.exceptions import CouldntDecodeError
 
@@ -172,17 +172,8 @@ def correcognize_directory(
         for file_path in against_files:
             results_list += [_correcognize_dir_(file_path)]
     else:
-        try:
-            nprocesses = config.num_processors or multiprocessing.cpu_count()
-        except NotImplementedError:
-            nprocesses = 1
-        else:
-            nprocesses = 1 if nprocesses <= 0 else nprocesses
-
-        with multiprocessing.Pool(nprocesses) as pool:
+        with get_pool(config.num_processors) as pool:
             results_list = pool.map(_correcognize_dir_, tqdm.tqdm(list(against_files)))
-            pool.close()
-            pool.join()
 
     file_match = {}
     for i in results_list:
@@ -1,11 +1,21 @@
 from audalign.recognizers import BaseRecognizer
 from audalign.config.fingerprint import FingerprintConfig
 import audalign.filehandler as filehandler
+from audalign.executor import get_pool
 import audalign.recognizers.fingerprint.recognize as recognize
 import audalign.recognizers.fingerprint.fingerprinter as fingerprinter
+from audalign.recognizers.fingerprint.cache import FingerprintCache
+import audalign.recognizers.fingerprint.database as database
+from audalign.recognizers.fingerprint.store import (
+    FileFingerprints,
+    FingerprintIndex,
+    StoredFingerprints,
+)
 
 import os
 import multiprocessing
+import shutil
+import tempfile
 from functools import partial
 import pickle
 import json
@@ -19,6 +29,7 @@ class FingerprintRecognizer(BaseRecognizer):
     fingerprinted_files = []
     total_fingerprints = 0
     temp_fingerprints_list = []
+    fingerprint_index: FingerprintIndex
 
     def __init__(
         self, config: FingerprintConfig = None, load_fingerprints_file: str = None
@@ -28,6 +39,7 @@ class FingerprintRecognizer(BaseRecognizer):
         self.fingerprinted_files = []
         self.total_fingerprints = 0
         self.temp_fingerprints_list = []
+        self.fingerprint_index = FingerprintIndex()
 
         if load_fingerprints_file is not None:
             self.load_fingerprinted_files(load_fingerprints_file)
@@ -92,6 +104,7 @@ class FingerprintRecognizer(BaseRecognizer):
         self.file_names = []
         self.fingerprinted_files = []
         self.total_fingerprints = 0
+        self.fingerprint_index.clear()
 
     def align_get_file_names(
         self,
@@ -192,6 +205,61 @@ class FingerprintRecognizer(BaseRecognizer):
 
         return recognition
 
+    def check_align_all_hook(
+        self,
+        file_list: list,
+        dir_or_list,
+        target_aligning: bool,
+        fine_aud_file_dict: typing.Optional[dict],
+    ) -> bool:
+        # every file is recognized against the index, in one pass or spread over
+        # processes, if they're all fingerprinted
+        self.fingerprint_index.sync(self.fingerprinted_files)
+        return (
+            not target_aligning
+            and len(file_list) > 1
+            and all(os.path.basename(x) in self.fingerprint_index for x in file_list)
+            and (self._all_pairs() or self._num_processes() > 1)
+        )
+
+    def align_all_hook(
+        self,
+        file_list: list,
+        dir_or_list,
+        target_aligning: bool,
+        fine_aud_file_dict: typing.Optional[dict],
+    ) -> list:
+        if self._all_pairs():
+            return recognize.recognize_all(
+                self, file_list, self.config, processes=self._num_processes()
+            )
+        return recognize.recognize_each(
+            self, file_list, self.config, processes=self._num_processes()
+        )
+
+    def _all_pairs(self) -> bool:
+        """
+        whether recognize_all can recognize the files, in memory without locality and
+        with few enough indexed files for its pair keys
+        """
+        return (
+            self.config.locality is None
+            and len(self.fingerprint_index.file_names) <= recognize.MAX_PAIR_FILES
+            and not any(
+                isinstance(x, StoredFingerprints) for _, x in self.fingerprinted_files
+            )
+        )
+
+    def _num_processes(self) -> int:
+        if self.config.multiprocessing != True:
+            return 1
+        # Try to use the maximum amount of processes if not given.
+        try:
+            nprocesses = self.config.num_processors or multiprocessing.cpu_count()
+        except NotImplementedError:
+            nprocesses = 1
+        return 1 if nprocesses <= 0 else nprocesses
+
     def _align(self, file_path, dir_or_list):
         recognition = recognize.recognize(
             self,
@@ -225,6 +293,7 @@ class FingerprintRecognizer(BaseRecognizer):
                     self.fingerprinted_files.append(processed_file)
                     self.file_names.append(processed_file[0])
                     self.total_fingerprints += len(processed_file[1])
+                    self.fingerprint_index.add(*processed_file)
 
     def _fingerprint_directory(
         self,
@@ -262,6 +331,19 @@ class FingerprintRecognizer(BaseRecognizer):
                 continue
             filenames_to_fingerprint.append(filename)
 
+        # fine alignments fingerprint shifted audio, which isn't cached
+        cache = FingerprintCache.from_config(self.config) if _file_audsegs is None else None
+        cached = []
+        if cache is not None:
+            for filename in list(filenames_to_fingerprint):
+                hashes = cache.get(filename, self.config)
+                if hashes is not None:
+                    print(f"{os.path.basename(filename)} found in fingerprint cache")
+                    cached.append([os.path.basename(filename), hashes])
+                    filenames_to_fingerprint.remove(filename)
+            if len(filenames_to_fingerprint) == 0 and len(cached) > 0:
+                return cached
+
         if len(filenames_to_fingerprint) == 0:
             if one_file_already_fingerprinted == True:
                 print("All files in directory already fingerprinted")
@@ -283,23 +365,32 @@ class FingerprintRecognizer(BaseRecognizer):
         )
 
         if self.config.multiprocessing == True:
+            nprocesses = self._num_processes()
 
-            # Try to use the maximum amount of processes if not given.
+            # workers write their fingerprints to files that are mapped here
+            # instead of pickling them back
+            result_dir = tempfile.mkdtemp(dir=fingerprinter.RESULT_DIR)
             try:
-                nprocesses = self.config.num_processors or multiprocessing.cpu_count()
-            except NotImplementedError:
-                nprocesses = 1
-            else:
-                nprocesses = 1 if nprocesses <= 0 else nprocesses
-
-            with multiprocessing.Pool(nprocesses) as self.pool:
-
-                result = self.pool.map(
-                    _fingerprint_worker_directory, filenames_to_fingerprint
-                )
-
-                self.pool.close()
-                self.pool.join()
+                with get_pool(nprocesses) as pool:
+
+                    result = pool.map(
+                        partial(
+                            fingerprinter._fingerprint_worker_to_directory,
+                            config=self.config,
+                            directory=result_dir,
+                        ),
+                        filenames_to_fingerprint,
+                    )
+                result = [
+                    [file_name, fingerprinter._adopt_result(x)] for file_name, x in result
+                ]
+            finally:
+                shutil.rmtree(result_dir, ignore_errors=True)
+
+            if cache is not None:
+                for filename, (_, hashes) in zip(filenames_to_fingerprint, result):
+                    if hashes is not None:
+                        cache.put(filename, self.config, hashes)
 
         else:
 
@@ -314,8 +405,10 @@ class FingerprintRecognizer(BaseRecognizer):
                 file_name, hashes = _fingerprint_worker_directory(filename)
                 if file_name == None:
                     continue
+                if cache is not None and hashes is not None:
+                    cache.put(filename, self.config, hashes)
                 result.append([file_name, hashes])
-        return result
+        return cached + list(result)
 
     def fingerprint_file(
         self,
@@ -347,6 +440,7 @@ class FingerprintRecognizer(BaseRecognizer):
             self.fingerprinted_files.append([file_name, hashes])
             self.file_names.append(file_name)
             self.total_fingerprints += len(hashes)
+            self.fingerprint_index.add(file_name, hashes)
 
     def _fingerprint_file(
         self,
@@ -368,23 +462,69 @@ class FingerprintRecognizer(BaseRecognizer):
         [file_name, hashes]
         """
 
-        file_name, hashes = fingerprinter._fingerprint_worker(
-            file_path,
-            config=self.config,
-        )
+        cache = FingerprintCache.from_config(self.config)
+        hashes = None if cache is None else cache.get(file_path, self.config)
+        if hashes is not None:
+            file_name = os.path.basename(file_path)
+            print(f"{file_name} found in fingerprint cache")
+        else:
+            file_name, hashes = fingerprinter._fingerprint_worker(
+                file_path,
+                config=self.config,
+            )
+            if cache is not None and hashes is not None:
+                cache.put(file_path, self.config, hashes)
         file_name = set_file_name or file_name
         return [file_name, hashes]
 
-    def save_fingerprinted_files(self, filename: str) -> None:
+    def save_fingerprinted_files(self, filename: str, append: bool = False) -> None:
         """
-        Serializes fingerprinted files to json or pickle file
+        Serializes fingerprinted files to json, pickle, afdb or sqlite file
+
+        json and pickle are saved as {hash: [offsets]} dictionaries per file. afdb is
+        a binary database that loads almost instantly, see database.py. sqlite saves
+        only what changed in one transaction, see sqlite_store.py
 
         Args
         ----
-            filename (str): file to load saved fingerprints from
+            filename (str): file to save fingerprints to
+            append (bool): afdb and sqlite only. Only writes the files that aren't saved
+                in filename yet. afdb appends them as a new segment at its end,
+                database.compact_database merges the segments back into one.
+                Raises a ValueError for json and pickle files
         """
 
-        data = [self.fingerprinted_files, self.total_fingerprints, self.file_names]
+        if filename.split(".")[-1] == "sqlite":
+            import audalign.recognizers.fingerprint.sqlite_store as sqlite_store
+
+            sqlite_store.write_sqlite(
+                filename, self.fingerprinted_files, self.config, append=append
+            )
+            return
+        if filename.split(".")[-1] == database.DATABASE_EXTENSION:
+            if append:
+                database.append_database(filename, self.fingerprinted_files, self.config)
+                return
+            database.write_database(
+                filename,
+                self.fingerprinted_files,
+                self.total_fingerprints,
+                self.file_names,
+                self.config,
+            )
+            return
+        if append:
+            raise ValueError(
+                f"Only afdb and sqlite files can be appended to, not {filename}"
+            )
+        data = [
+            [
+                [file_name, fingerprints.to_dict(self.config)]
+                for file_name, fingerprints in self.fingerprinted_files
+            ],
+            self.total_fingerprints,
+            self.file_names,
+        ]
         if filename.split(".")[-1] == "pickle":
             with open(filename, "wb") as f:
                 pickle.dump(data, f)
@@ -392,31 +532,44 @@ class FingerprintRecognizer(BaseRecognizer):
             with open(filename, "w") as f:
                 json.dump(data, f)
         else:
-            print("File type must be either pickle or json")
+            print("File type must be either pickle, json, afdb or sqlite")
 
     def load_fingerprinted_files(self, filename: str) -> None:
         """
-        Loads/adds saved json or pickle file into current audalign object
+        Loads/adds saved json, pickle, afdb or sqlite file into current audalign object
+
+        afdb files are memory mapped, their fingerprints are read from disk as needed.
+        sqlite fingerprints stay in the database, recognitions look up matching hashes
+        in it, so the library doesn't have to fit in memory
 
         Args
         ----
-            filename (str): must be either json or pickle extension
+            filename (str): must be either json, pickle, afdb or sqlite extension
 
         Returns
         -------
         None
         """
         try:
-            if filename.split(".")[-1] == "pickle":
-                with open(filename, "rb") as f:
-                    data = pickle.load(f)
-            elif filename.split(".")[-1] == "json":
-                with open(filename, "r") as f:
-                    data = json.load(f)
+            if filename.split(".")[-1] == "sqlite":
+                import audalign.recognizers.fingerprint.sqlite_store as sqlite_store
+
+                data = sqlite_store.read_sqlite(filename, self.config)
+                self.fingerprinted_files.extend(data[0])
+            elif filename.split(".")[-1] == database.DATABASE_EXTENSION:
+                data = database.read_database(filename, self.config)
+                self.fingerprinted_files.extend(data[0])
+            elif filename.split(".")[-1] in ["pickle", "json"]:
+                data = database.read_serialized(filename)
+                self.fingerprinted_files.extend(
+                    [
+                        [file_name, FileFingerprints.from_dict(hashes, self.config)]
+                        for file_name, hashes in data[0]
+                    ]
+                )
             else:
-                print("File type must be either pickle or json")
+                print("File type must be either pickle, json, afdb or sqlite")
                 return
-            self.fingerprinted_files.extend(data[0])
             self.total_fingerprints += data[1]
             self.file_names.extend(data[2])
             self.filter_duplicates()
@@ -439,6 +592,8 @@ class FingerprintRecognizer(BaseRecognizer):
         while i < len(self.file_names):
             if self.file_names[i] == filename:
                 self.total_fingerprints -= len(self.fingerprinted_files[i][1])
+                if filename in self.fingerprint_index:
+                    self.fingerprint_index.remove(filename)
                 return self.file_names.pop(i), self.fingerprinted_files.pop(i)
             i += 1
         raise KeyError
@@ -448,6 +603,7 @@ class FingerprintRecognizer(BaseRecognizer):
             self.file_names.append(filename)
             self.fingerprinted_files.append(file_fingerprints)
             self.total_fingerprints += len(file_fingerprints[1])
+            self.fingerprint_index.add(filename, file_fingerprints[1])
 
     def filter_duplicates(self) -> None:
         """
@@ -463,3 +619,4 @@ class FingerprintRecognizer(BaseRecognizer):
             else:
                 name_checker.add(self.file_names[i])
                 i += 1
+        self.fingerprint_index.sync(self.fingerprinted_files)
@@ -0,0 +1,150 @@
+import hashlib
+import json
+import os
+import tempfile
+import typing
+
+import numpy as np
+
+from audalign.config.fingerprint import FingerprintConfig
+from audalign.recognizers.fingerprint.store import FileFingerprints
+
+# Every FingerprintConfig setting that changes the fingerprints of a file
+FINGERPRINT_FIELDS = [
+    "hash_style",
+    "hash_encoding",
+    "sample_rate",
+    "normalize",
+    "start_end",
+    "freq_threshold",
+    "spectrogram_engine",
+    "fft_window_size",
+    "DEFAULT_OVERLAP_RATIO",
+    "default_fan_value",
+    "default_amp_min",
+    "peak_neighborhood_size",
+    "peaks_per_frame",
+    "target_hashes_per_second",
+    "min_hash_time_delta",
+    "max_hash_time_delta",
+    "peak_sort",
+    "FINGERPRINT_REDUCTION",
+    "stop_max_occurrences",
+    "stop_list_at",
+]
+
+
+class FingerprintCache:
+    """
+    On disk cache of FileFingerprints, one .npz file per entry.
+
+    Entries are keyed by the audio file, either its path, size and modification time
+    or a digest of its content, plus a digest of every config setting that changes
+    fingerprints. Loading an entry marks it as recently used, once the cache is
+    bigger than max_bytes the least recently used entries are removed.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: typing.Optional[int] = None,
+        cache_key: str = "stat",
+    ):
+        if cache_key not in ["stat", "content"]:
+            raise ValueError(f'Cache key "{cache_key}" must be one of ["stat", "content"]')
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.cache_key = cache_key
+        os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def from_config(cls, config: FingerprintConfig):
+        """The config's cache, None if config.cache_dir isn't set"""
+        if config.cache_dir is None:
+            return None
+        return cls(config.cache_dir, config.cache_max_bytes, config.cache_key)
+
+    def key(self, file_path: str, config: FingerprintConfig) -> str:
+        """hex digest of the file and config's fingerprint settings"""
+        digest = hashlib.sha1()
+        if self.cache_key == "content":
+            with open(file_path, "rb") as f:
+                for chunk in iter(lambda: f.read(2**20), b""):
+                    digest.update(chunk)
+        else:
+            stat = os.stat(file_path)
+            digest.update(
+                f"{os.path.abspath(file_path)}|{stat.st_size}|{stat.st_mtime_ns}".encode()
+            )
+        digest.update(config_digest(config).encode())
+        return digest.hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def get(
+        self, file_path: str, config: FingerprintConfig
+    ) -> typing.Optional[FileFingerprints]:
+        """Returns the cached fingerprints of file_path, None if they aren't cached"""
+        try:
+            entry_path = self._entry_path(self.key(file_path, config))
+            with np.load(entry_path) as entry:
+                fingerprints = FileFingerprints(
+                    entry["hashes"], entry["offsets"], is_sorted=True
+                )
+            os.utime(entry_path)
+        except (OSError, ValueError, KeyError):
+            return None
+        return fingerprints
+
+    def put(
+        self, file_path: str, config: FingerprintConfig, fingerprints: FileFingerprints
+    ) -> None:
+        """Caches the fingerprints of file_path, then evicts down to max_bytes"""
+        entry_path = self._entry_path(self.key(file_path, config))
+        # written to a temporary file first so other processes never read half an entry
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, hashes=fingerprints.hashes, offsets=fingerprints.offsets)
+            os.replace(temp_path, entry_path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        self.evict()
+
+    def evict(self) -> None:
+        """Removes least recently used entries until the cache fits in max_bytes"""
+        if self.max_bytes is None:
+            return
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".npz"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
+
+    def clear(self) -> None:
+        """Removes every entry"""
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".npz"):
+                os.remove(entry.path)
+
+
+def config_digest(config: FingerprintConfig) -> str:
+    """hex digest of every config setting that changes fingerprints"""
+    settings = {field: getattr(config, field) for field in FINGERPRINT_FIELDS}
+    return hashlib.sha1(
+        json.dumps(settings, sort_keys=True, default=str).encode()
+    ).hexdigest()
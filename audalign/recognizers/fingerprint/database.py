@@ -0,0 +1,414 @@
+"""
+Binary fingerprint database, read with np.memmap
+
+A database is one or more segments one after another. Each segment's layout, every
+section starts on a SECTION_ALIGN byte boundary from the start of the segment
+
+    header      HEADER struct: magic, version, section positions and sizes
+    file table  utf-8 json of file names, total fingerprints and hash encoding
+    directory   uint64 (num_files, 3) array: start, end and distinct hashes of each file
+    hashes      uint64 array, each file's hashes sorted, files one after another
+    offsets     uint32 array parallel to hashes
+
+append_database adds a segment to the end of the file with only the new files,
+compact_database merges every segment back into one.
+
+Loading only parses the headers and file tables. Every file's FileFingerprints are
+views into the mapped hash and offset arrays, so pages are read when matched and
+shared by every process that opens the same database.
+"""
+
+import json
+import os
+import pickle
+import struct
+import tempfile
+import typing
+
+import numpy as np
+
+from audalign.config.fingerprint import FingerprintConfig
+from audalign.recognizers.fingerprint.store import FileFingerprints
+
+DATABASE_EXTENSION = "afdb"
+MAGIC = b"AUDALIGN"
+VERSION = 1
+SECTION_ALIGN = 64
+# magic, version, number of files, number of hash occurrences, then the start of the
+# file table, its length in bytes, and the start of the directory, hashes and offsets
+HEADER = struct.Struct("<8sIIQQQQQQ")
+
+
+def _align(position: int) -> int:
+    return -(-position // SECTION_ALIGN) * SECTION_ALIGN
+
+
+def _write_segment(
+    f: typing.BinaryIO,
+    fingerprinted_files: list,
+    total_fingerprints: int,
+    file_names: list,
+    hash_encoding: str,
+) -> None:
+    """
+    Writes a segment at f's position, which must be SECTION_ALIGN aligned.
+    The header is written last, so a segment cut off part way is never read.
+    """
+    segment_start = f.tell()
+    table = json.dumps(
+        {
+            "files": [file_name for file_name, _ in fingerprinted_files],
+            "file_names": list(file_names),
+            "total_fingerprints": total_fingerprints,
+            "hash_encoding": hash_encoding,
+        }
+    ).encode()
+    lengths = np.array([len(x.hashes) for _, x in fingerprinted_files], dtype=np.uint64)
+    directory = np.zeros((len(fingerprinted_files), 3), dtype=np.uint64)
+    directory[:, 1] = np.cumsum(lengths)
+    directory[:, 0] = directory[:, 1] - lengths
+    directory[:, 2] = [x.num_hashes for _, x in fingerprinted_files]
+    num_occurrences = int(lengths.sum())
+
+    table_start = _align(HEADER.size)
+    directory_start = _align(table_start + len(table))
+    hashes_start = _align(directory_start + directory.nbytes)
+    offsets_start = _align(hashes_start + num_occurrences * 8)
+    segment_end = _align(offsets_start + num_occurrences * 4)
+
+    f.write(bytes(HEADER.size))
+    f.seek(segment_start + table_start)
+    f.write(table)
+    f.seek(segment_start + directory_start)
+    f.write(directory.tobytes())
+    f.seek(segment_start + hashes_start)
+    for _, fingerprints in fingerprinted_files:
+        f.write(np.ascontiguousarray(fingerprints.hashes, dtype="<u8").tobytes())
+    f.seek(segment_start + offsets_start)
+    for _, fingerprints in fingerprinted_files:
+        f.write(np.ascontiguousarray(fingerprints.offsets, dtype="<u4").tobytes())
+    f.truncate(segment_start + segment_end)
+    f.flush()
+    os.fsync(f.fileno())
+    f.seek(segment_start)
+    f.write(
+        HEADER.pack(
+            MAGIC,
+            VERSION,
+            len(fingerprinted_files),
+            num_occurrences,
+            table_start,
+            len(table),
+            directory_start,
+            hashes_start,
+            offsets_start,
+        )
+    )
+    f.flush()
+    os.fsync(f.fileno())
+    f.seek(segment_start + segment_end)
+
+
+def _read_segments(filename: str) -> list:
+    """
+    Reads the header and file table of every segment
+
+    Raises
+    ------
+        ValueError: if filename isn't a database
+
+    Returns
+    -------
+        list of (segment start, unpacked HEADER, file table) of each complete segment
+    """
+    segments = []
+    file_size = os.path.getsize(filename)
+    with open(filename, "rb") as f:
+        segment_start = 0
+        while segment_start + HEADER.size <= file_size:
+            f.seek(segment_start)
+            header = HEADER.unpack(f.read(HEADER.size))
+            if header[0] != MAGIC:
+                break
+            if header[1] != VERSION:
+                raise ValueError(f'"{filename}" has unsupported version {header[1]}')
+            segment_end = segment_start + _align(header[8] + header[3] * 4)
+            if segment_end > file_size:
+                break
+            f.seek(segment_start + header[4])
+            segments.append(
+                (segment_start, header, json.loads(f.read(header[5]).decode()))
+            )
+            segment_start = segment_end
+    if len(segments) == 0:
+        raise ValueError(f'"{filename}" is not a fingerprint database')
+    return segments
+
+
+def _segments_end(segments: list) -> int:
+    segment_start, header, _ = segments[-1]
+    return segment_start + _align(header[8] + header[3] * 4)
+
+
+def _check_encoding(filename: str, segments: list, hash_encoding: str) -> None:
+    for _, _, table in segments:
+        if table["hash_encoding"] != hash_encoding:
+            raise ValueError(
+                f'"{filename}" uses "{table["hash_encoding"]}" hash encoding, '
+                f'config uses "{hash_encoding}"'
+            )
+
+
+def write_database(
+    filename: str,
+    fingerprinted_files: list,
+    total_fingerprints: int,
+    file_names: list,
+    config: FingerprintConfig,
+) -> None:
+    """
+    Writes fingerprinted files to a binary database of one segment
+
+    Written to a temporary file first then moved over filename, so databases that
+    are currently mapped, including filename itself, stay valid.
+
+    Args
+    ----
+        filename (str): database to write
+        fingerprinted_files (list[[str, FileFingerprints]]): files to save
+        total_fingerprints (int): total distinct hashes of the files
+        file_names (list[str]): names of the fingerprinted files
+        config (FingerprintConfig): config the files were fingerprinted with
+    """
+    _replace(
+        filename,
+        [[fingerprinted_files, total_fingerprints, file_names]],
+        config.hash_encoding,
+    )
+
+
+def _replace(filename: str, segments_data: list, hash_encoding: str) -> None:
+    fd, temp_path = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(filename)), suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for fingerprinted_files, total_fingerprints, file_names in segments_data:
+                _write_segment(
+                    f, fingerprinted_files, total_fingerprints, file_names, hash_encoding
+                )
+        os.replace(temp_path, filename)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def append_database(
+    filename: str,
+    fingerprinted_files: list,
+    config: FingerprintConfig,
+) -> int:
+    """
+    Appends a segment with the fingerprinted files the database doesn't have yet
+
+    Only the new files are written, the rest of the database is left as is. Makes a
+    new database if filename doesn't exist. Anything after the last complete segment,
+    like a segment cut off by a crash, is overwritten.
+
+    Args
+    ----
+        filename (str): database to append to
+        fingerprinted_files (list[[str, FileFingerprints]]): files to save, files
+            already in the database are skipped
+        config (FingerprintConfig): config the files were fingerprinted with
+
+    Raises
+    ------
+        ValueError: if filename isn't a database or uses another hash encoding
+
+    Returns
+    -------
+        int: number of files appended
+    """
+    if not os.path.exists(filename):
+        new_files = _unique_files(fingerprinted_files, set())
+        write_database(
+            filename,
+            new_files,
+            sum(len(x) for _, x in new_files),
+            [file_name for file_name, _ in new_files],
+            config,
+        )
+        return len(new_files)
+    segments = _read_segments(filename)
+    _check_encoding(filename, segments, config.hash_encoding)
+    saved = set(file_name for _, _, table in segments for file_name in table["files"])
+    new_files = _unique_files(fingerprinted_files, saved)
+    if len(new_files) == 0:
+        return 0
+    with open(filename, "r+b") as f:
+        f.seek(_segments_end(segments))
+        _write_segment(
+            f,
+            new_files,
+            sum(len(x) for _, x in new_files),
+            [file_name for file_name, _ in new_files],
+            config.hash_encoding,
+        )
+    return len(new_files)
+
+
+def _unique_files(fingerprinted_files: list, saved: set) -> list:
+    """fingerprinted_files not in saved, first of each name"""
+    new_files = []
+    for file_name, fingerprints in fingerprinted_files:
+        if file_name not in saved:
+            saved.add(file_name)
+            new_files.append([file_name, fingerprints])
+    return new_files
+
+
+def compact_database(filename: str) -> int:
+    """
+    Merges every segment of a database into one, dropping repeated file names
+
+    The first saved copy of a file is kept, the same one load_fingerprinted_files
+    keeps. Written to a temporary file first, loaded databases stay valid.
+
+    Args
+    ----
+        filename (str): database to compact
+
+    Raises
+    ------
+        ValueError: if filename isn't a database
+
+    Returns
+    -------
+        int: number of segments merged
+    """
+    segments = _read_segments(filename)
+    hash_encoding = segments[0][2]["hash_encoding"]
+    _check_encoding(filename, segments, hash_encoding)
+    fingerprinted_files, _, file_names = _map_segments(filename, segments)
+    fingerprinted_files = _unique_files(fingerprinted_files, set())
+    file_names = list(dict.fromkeys(file_names))
+    _replace(
+        filename,
+        [
+            [
+                fingerprinted_files,
+                sum(len(x) for _, x in fingerprinted_files),
+                file_names,
+            ]
+        ],
+        hash_encoding,
+    )
+    return len(segments)
+
+
+def _map_segments(filename: str, segments: list) -> list:
+    mapped = np.memmap(filename, dtype=np.uint8, mode="r")
+    fingerprinted_files, total_fingerprints, file_names = [], 0, []
+    for segment_start, header, table in segments:
+        num_files, num_occurrences = header[2], header[3]
+        directory_start, hashes_start, offsets_start = [
+            segment_start + x for x in header[6:9]
+        ]
+        directory = mapped[directory_start : directory_start + num_files * 24]
+        directory = directory.view("<u8").reshape(num_files, 3)
+        hashes = mapped[hashes_start : hashes_start + num_occurrences * 8].view("<u8")
+        offsets = mapped[offsets_start : offsets_start + num_occurrences * 4].view("<u4")
+        fingerprinted_files.extend(
+            [
+                file_name,
+                FileFingerprints(
+                    hashes[start:end],
+                    offsets[start:end],
+                    is_sorted=True,
+                    num_hashes=num_hashes,
+                ),
+            ]
+            for file_name, (start, end, num_hashes) in zip(
+                table["files"], directory.tolist()
+            )
+        )
+        total_fingerprints += table["total_fingerprints"]
+        file_names.extend(table["file_names"])
+    return [fingerprinted_files, total_fingerprints, file_names]
+
+
+def read_database(filename: str, config: FingerprintConfig) -> list:
+    """
+    Maps every segment of a binary database
+
+    Args
+    ----
+        filename (str): database to read
+        config (FingerprintConfig): fingerprints must use config's hash encoding
+
+    Raises
+    ------
+        ValueError: if filename isn't a database or uses another hash encoding
+
+    Returns
+    -------
+        [fingerprinted_files, total_fingerprints, file_names] the same as json and
+        pickle files, with FileFingerprints backed by the mapped file. Files in more
+        than one segment are repeated, filter_duplicates keeps the first.
+    """
+    segments = _read_segments(filename)
+    _check_encoding(filename, segments, config.hash_encoding)
+    return _map_segments(filename, segments)
+
+
+def read_serialized(filename: str) -> list:
+    """
+    Reads a json or pickle file saved by save_fingerprinted_files
+
+    Raises
+    ------
+        ValueError: if filename isn't a json or pickle file
+
+    Returns
+    -------
+        [fingerprinted_files, total_fingerprints, file_names] with {hash: [offsets]}
+        dictionaries as fingerprints
+    """
+    extension = filename.split(".")[-1]
+    if extension == "pickle":
+        with open(filename, "rb") as f:
+            return pickle.load(f)
+    elif extension == "json":
+        with open(filename, "r") as f:
+            return json.load(f)
+    raise ValueError(f'"{filename}" must be either a pickle or json file')
+
+
+def convert_to_database(
+    source: str,
+    destination: str,
+    config: typing.Optional[FingerprintConfig] = None,
+) -> None:
+    """
+    Converts a json or pickle file saved by save_fingerprinted_files to a binary database
+
+    Args
+    ----
+        source (str): json or pickle file
+        destination (str): database to write
+        config (FingerprintConfig, optional): config the source was fingerprinted with,
+            only its hash encoding matters. Defaults to FingerprintConfig()
+    """
+    config = FingerprintConfig() if config is None else config
+    data = read_serialized(source)
+    write_database(
+        destination,
+        [
+            [file_name, FileFingerprints.from_dict(hashes, config)]
+            for file_name, hashes in data[0]
+        ],
+        data[1],
+        data[2],
+        config,
+    )
@@ -1,9 +1,16 @@
+import functools
 import hashlib
+import itertools
+import os
+import tempfile
 
 import matplotlib.mlab as mlab
 import matplotlib.pyplot as plt
 import numpy as np
+import scipy.fft
+from audalign.config import BaseConfig
 from audalign.config.fingerprint import FingerprintConfig
+from audalign.recognizers.fingerprint.store import FileFingerprints
 from pydub.exceptions import CouldntDecodeError
 from scipy.ndimage import (
     binary_erosion,
@@ -14,6 +21,11 @@ from scipy.ndimage import (
 
 np.seterr(divide="ignore")
 
+# Number of samples the "scipy" spectrogram engine windows and FFTs at once
+SPECTROGRAM_BLOCK = 2**22
+# Where pool processes write fingerprints for the parent to map, tmpfs on linux
+RESULT_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
 
 def _fingerprint_worker(
     file_path: str,
@@ -36,19 +48,36 @@ def _fingerprint_worker(
 
     Returns
     -------
-        file_name (str, hashes : dict{str: [int]}): file_name and hash dictionary
+        file_name (str, hashes : FileFingerprints): file_name and fingerprints
     """
+    blocks = None
     if type(file_path) == str:
         file_name = os.path.basename(file_path)
 
         try:
-            channel, _ = audalign.filehandler.read(
-                file_path,
-                start_end=config.start_end,
-                sample_rate=config.sample_rate,
-                normalize=config.normalize,
-                cant_read_extensions=config.cant_read_extensions,
-            )
+            if _streams(config):
+                print(f"Fingerprinting {file_name}")
+                # blocks are decoded as they're fingerprinted, decoding errors included
+                blocks = list(
+                    iter_fingerprints(
+                        audalign.filehandler.read_blocks(
+                            file_path,
+                            config.FINGERPRINT_BLOCK,
+                            sample_rate=config.sample_rate,
+                            normalize=config.normalize,
+                            cant_read_extensions=config.cant_read_extensions,
+                        ),
+                        config,
+                    )
+                )
+            else:
+                channel, _ = audalign.filehandler.read(
+                    file_path,
+                    start_end=config.start_end,
+                    sample_rate=config.sample_rate,
+                    normalize=config.normalize,
+                    cant_read_extensions=config.cant_read_extensions,
+                )
         except FileNotFoundError:
             print(f'"{file_path}" not found')
             return None, None
@@ -68,17 +97,107 @@ def _fingerprint_worker(
             file_path[0], file_path[1], sample_rate=config.sample_rate
         )
 
-    print(f"Fingerprinting {file_name}")
-    hashes = fingerprint(
-        channel,
-        config=config,
-    )
+    if blocks is None:
+        print(f"Fingerprinting {file_name}")
+        hashes = fingerprint(
+            channel,
+            config=config,
+        )
+    else:
+        hashes = None if None in blocks else FileFingerprints.concatenate(blocks)
+    if (
+        hashes is not None
+        and config.stop_max_occurrences is not None
+        and stop_list_stages(config)[0]
+    ):
+        hashes = hashes.drop_common(config.stop_max_occurrences)
 
     print(f"Finished fingerprinting {file_name}")
 
     return file_name, hashes
 
 
+def _fingerprint_worker_to_directory(
+    file_path: str,
+    config: FingerprintConfig,
+    directory: str,
+) -> tuple:
+    """
+    Runs _fingerprint_worker in a pool process and writes the fingerprints to .npy
+    files in directory, so only their paths are pickled back to the parent
+
+    Args
+    ----
+        file_path (str): file_path to be fingerprinted
+        config (FingerprintConfig): config to fingerprint with
+        directory (str): directory to write the fingerprints to
+
+    Returns
+    -------
+        file_name (str, result): file_name and (hashes path, offsets path, num_hashes)
+        for _adopt_result, the FileFingerprints themselves if they couldn't be
+        written, or None
+    """
+    file_name, hashes = _fingerprint_worker(file_path, config)
+    return file_name, _write_result(hashes, directory)
+
+
+def _write_result(hashes: FileFingerprints, directory: str):
+    """Writes fingerprints to .npy files in directory, see _fingerprint_worker_to_directory"""
+    if hashes is None:
+        return None
+    paths = []
+    try:
+        for array in [hashes.hashes, hashes.offsets]:
+            fd, path = tempfile.mkstemp(dir=directory, suffix=".npy")
+            paths.append(path)
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, array)
+    except OSError:  # full or missing directory
+        for path in paths:
+            os.remove(path)
+        return hashes
+    return (paths[0], paths[1], hashes.num_hashes)
+
+
+def _adopt_result(result):
+    """
+    Maps the fingerprints written by _fingerprint_worker_to_directory without copying
+    them and removes their files, which stay mapped until the arrays are freed.
+    Windows can't remove mapped files, so they're read there instead.
+    """
+    if result is None or isinstance(result, FileFingerprints):
+        return result
+    hashes_path, offsets_path, num_hashes = result
+    mmap_mode = None if os.name == "nt" else "r"
+    fingerprints = FileFingerprints(
+        np.load(hashes_path, mmap_mode=mmap_mode),
+        np.load(offsets_path, mmap_mode=mmap_mode),
+        is_sorted=True,
+        num_hashes=num_hashes,
+    )
+    os.remove(hashes_path)
+    os.remove(offsets_path)
+    return fingerprints
+
+
+def stop_list_stages(config: FingerprintConfig) -> tuple:
+    """
+    Returns
+    -------
+        whether stop_max_occurrences applies when fingerprinting (bool), and when
+        recognizing (bool)
+    """
+    if config.stop_list_at not in ["query", "fingerprint", "both"]:
+        raise ValueError(
+            f'Stop list at "{config.stop_list_at}" must be one of ["query", "fingerprint", "both"]'
+        )
+    return (
+        config.stop_list_at in ["fingerprint", "both"],
+        config.stop_list_at in ["query", "both"],
+    )
+
+
 def fingerprint(
     channel_samples,
     config: FingerprintConfig,
@@ -95,32 +214,35 @@ def fingerprint(
 
     Returns
     -------
-        hashes (dict{str: [int]}): hashes of the form dict{hash: location}
-    """
-    # FFT the signal and extract frequency components
-    # To get the frequencies of each row, get the second returned component
-    arr2D, frequencies, _ = mlab.specgram(
-        channel_samples,
-        NFFT=config.fft_window_size,
-        Fs=config.sample_rate,
-        window=mlab.window_hanning,
-        noverlap=int(config.fft_window_size * config.DEFAULT_OVERLAP_RATIO),
+        hashes (FileFingerprints): sorted hashes and their locations
+    """
+    arr2D, freq_start = _thresholded_spectrogram(channel_samples, config)
+
+    if retspec:
+        return arr2D
+
+    # find local maxima
+    local_maxima = get_2D_peaks(arr2D, config=config, freq_start=freq_start)
+
+    # return hashes
+    return generate_hashes(
+        local_maxima,
+        config,
     )
-    # )[0]
-
-    # apply log transform since specgram() returns linear array
-    # print(arr2D)
-    # print(max(arr2D[0]))
-    arr2D = 10 * np.log2(arr2D)
-    # got better results with a log2, but this means that nothing is in terms of decibels
-    # arr2D = 10 * np.log10(arr2D, out=np.zeros_like(arr2D), where=(arr2D != 0))
-    arr2D[arr2D == -np.inf] = 0  # replace infs with zeros
-    # print(max(arr2D[0]))
-    # print(f"length of arr2d {len(arr2D)}")
-    # print(f"length of arr2d height {len(arr2D[1])}")
 
+
+def _thresholded_spectrogram(channel_samples, config: BaseConfig) -> tuple:
+    """
+    Returns
+    -------
+        arr2D (array[float]): spectrogram with the bins below freq_threshold zeroed
+        freq_start (int): first bin that isn't zeroed
+    """
+    # FFT the signal, extract frequency components and log transform them
+    arr2D, frequencies = spectrogram(channel_samples, config)
+
+    index = 0
     if config.freq_threshold is not None:
-        index = 0
         for i, frequency in enumerate(frequencies):
             if frequency > config.freq_threshold - 0.0001:
                 index = i
@@ -128,21 +250,219 @@ def fingerprint(
         else:
             index = len(frequencies)
         arr2D[0:index] = 0
+    return arr2D, index
 
-    if retspec:
-        return arr2D
 
-    # find local maxima
-    local_maxima = get_2D_peaks(arr2D, config=config)
+def _streams(config: FingerprintConfig) -> bool:
+    """whether files are fingerprinted block by block with iter_fingerprints"""
+    return (
+        config.stream_fingerprints
+        and config.peak_sort
+        and config.start_end is None
+        and not config.plot
+        and config.target_hashes_per_second is None
+    )
 
-    # return hashes
-    return generate_hashes(
-        local_maxima,
-        config,
+
+def iter_fingerprints(sample_blocks, config: FingerprintConfig):
+    """
+    Fingerprints audio one block of samples at a time. Yields the fingerprints of every
+    block with offsets counted from the start of the audio. Put together, they're the
+    same fingerprints fingerprint gives for all the samples at once.
+
+    Only what's still needed is kept between blocks: samples of frames not yet in
+    the spectrogram, peak_neighborhood_size spectrogram frames before the peaks still
+    to be found, and the peaks of the last max_hash_time_delta frames, which hashes
+    still to be made can pair with. Needs peak_sort.
+
+    Args
+        sample_blocks (iterator[array[int]]): consecutive blocks of audio data
+        config (FingerprintConfig): fingerprinting settings
+
+    Yields
+    ------
+        hashes (FileFingerprints): fingerprints of every block, None if the hash style is bad
+    """
+    nfft = config.fft_window_size
+    step = nfft - int(nfft * config.DEFAULT_OVERLAP_RATIO)
+    # peaks are local maxima over peak_neighborhood_size frames in both directions
+    radius = max(config.peak_neighborhood_size, 1)
+    samples = None  # samples from the first frame not in the spectrogram on
+    arr2D, spec_start, spec_end = None, 0, 0  # spectrogram of frames spec_start to spec_end
+    freq_start = 0
+    peaks = np.zeros((0, 2), dtype=np.int32)  # peaks of frames hashes_end to peaks_end
+    peaks_end = hashes_end = 0
+
+    for block in itertools.chain(sample_blocks, [None]):
+        finished = block is None
+        if not finished:
+            samples = block if samples is None else np.concatenate([samples, block])
+        if samples is None:
+            return
+
+        # spectrogram of every complete window, short audio is zero padded into one window
+        num_frames = max(0, (len(samples) - (nfft - step)) // step)
+        if finished and spec_end == 0 and num_frames == 0 and len(samples) > 0:
+            num_frames = 1
+        if num_frames > 0:
+            new_frames, freq_start = _thresholded_spectrogram(
+                samples[: (num_frames - 1) * step + nfft], config
+            )
+            samples = samples[num_frames * step :]
+            spec_end += num_frames
+            arr2D = (
+                new_frames
+                if arr2D is None
+                else np.concatenate([arr2D, new_frames], axis=1)
+            )
+        if arr2D is None:
+            continue
+
+        # peaks are final once radius frames after them are in the spectrogram
+        new_peaks_end = spec_end if finished else spec_end - radius
+        if new_peaks_end > peaks_end:
+            new_peaks = get_2D_peaks(arr2D, config, freq_start=freq_start)
+            new_peaks[:, config._IDX_TIME_J] += spec_start
+            new_times = new_peaks[:, config._IDX_TIME_J]
+            new_peaks = new_peaks[(new_times >= peaks_end) & (new_times < new_peaks_end)]
+            new_peaks = new_peaks[
+                np.argsort(new_peaks[:, config._IDX_TIME_J], kind="stable")
+            ]
+            peaks = np.concatenate([peaks, new_peaks])
+            peaks_end = new_peaks_end
+            keep_start = max(peaks_end - radius, spec_start)
+            arr2D = arr2D[:, keep_start - spec_start :]
+            spec_start = keep_start
+
+        # hashes are final once every peak they can pair with is found
+        new_hashes_end = peaks_end if finished else peaks_end - config.max_hash_time_delta
+        if new_hashes_end > hashes_end:
+            hashes = generate_hashes(peaks, config)
+            if hashes is None:
+                yield None
+                return
+            in_block = hashes.offsets < new_hashes_end
+            yield FileFingerprints(
+                hashes.hashes[in_block], hashes.offsets[in_block], is_sorted=True
+            )
+            hashes_end = new_hashes_end
+            peaks = peaks[peaks[:, config._IDX_TIME_J] >= hashes_end]
+
+
+def spectrogram(channel_samples, config: BaseConfig) -> tuple:
+    """
+    Log2 power spectrogram of the channel with the config's spectrogram_engine.
+    Silent cells are 0 rather than -inf.
+
+    Args
+        channel_samples (array[int]): audio file data
+        config (BaseConfig): uses spectrogram_engine, fft_window_size, DEFAULT_OVERLAP_RATIO,
+            sample_rate and fft_workers
+
+    Returns
+    -------
+        arr2D, frequencies (array[float], array[float]): spectrogram of frequency bins by time frames
+            and the frequency of each bin
+    """
+    if config.spectrogram_engine == "mlab":
+        # To get the frequencies of each row, get the second returned component
+        arr2D, frequencies, _ = mlab.specgram(
+            channel_samples,
+            NFFT=config.fft_window_size,
+            Fs=config.sample_rate,
+            window=mlab.window_hanning,
+            noverlap=int(config.fft_window_size * config.DEFAULT_OVERLAP_RATIO),
+        )
+        # apply log transform since specgram() returns linear array
+        arr2D = 10 * np.log2(arr2D)
+        # got better results with a log2, but this means that nothing is in terms of decibels
+        # arr2D = 10 * np.log10(arr2D, out=np.zeros_like(arr2D), where=(arr2D != 0))
+        arr2D[arr2D == -np.inf] = 0  # replace infs with zeros
+        return arr2D, frequencies
+    elif config.spectrogram_engine == "scipy":
+        return _scipy_spectrogram(channel_samples, config)
+    raise ValueError(
+        f'Spectrogram engine "{config.spectrogram_engine}" must be one of ["mlab", "scipy"]'
     )
 
 
-def get_2D_peaks(arr2D, config: FingerprintConfig):
+def _scipy_spectrogram(channel_samples, config: BaseConfig) -> tuple:
+    """
+    Same spectrogram as mlab.specgram's hanning windowed psd, log transformed.
+
+    Frames are a strided view of the samples, they are only copied a block at
+    a time to be windowed and FFT'd in float32, then written into the output.
+    """
+    nfft = config.fft_window_size
+    step = nfft - int(nfft * config.DEFAULT_OVERLAP_RATIO)
+    samples = np.asarray(channel_samples, dtype=np.float32)
+    if len(samples) < nfft:
+        samples = np.concatenate(
+            [samples, np.zeros(nfft - len(samples), dtype=np.float32)]
+        )
+    frames = np.lib.stride_tricks.sliding_window_view(samples, nfft)[::step]
+    window = _hanning_window(nfft)
+
+    # one sided psd, every bin but DC and nyquist (if there is one) is doubled
+    scale = np.full(nfft // 2 + 1, 2.0, dtype=np.float32)
+    scale[0] = 1.0
+    if nfft % 2 == 0:
+        scale[-1] = 1.0
+    scale /= config.sample_rate * np.sum(window.astype(np.float64) ** 2)
+    scale = scale.astype(np.float32)
+
+    arr2D = np.empty((len(scale), len(frames)), dtype=np.float32)
+    block_frames = max(1, SPECTROGRAM_BLOCK // nfft)
+    for start in range(0, len(frames), block_frames):
+        block = frames[start : start + block_frames] * window
+        spectrum = scipy.fft.rfft(
+            block, axis=1, overwrite_x=True, workers=config.fft_workers
+        )
+        power = np.square(spectrum.real)
+        power += np.square(spectrum.imag)
+        power *= scale
+        # log in place, silent cells stay 0 instead of -inf
+        np.log2(power, out=power, where=power > 0)
+        power *= 10
+        arr2D[:, start : start + block_frames] = power.T
+    return arr2D, scipy.fft.rfftfreq(nfft, 1 / config.sample_rate)
+
+
+@functools.lru_cache(maxsize=8)
+def _hanning_window(fft_window_size: int) -> np.ndarray:
+    """float32 hanning window, cached per fft_window_size"""
+    window = np.hanning(fft_window_size).astype(np.float32)
+    window.flags.writeable = False
+    return window
+
+
+def get_2D_peaks(arr2D, config: FingerprintConfig, freq_start: int = 0) -> np.ndarray:
+    """
+    Finds the local maxima of the spectrogram louder than default_amp_min, at most
+    peaks_per_frame of them per frame and only the loudest that make about
+    target_hashes_per_second, if they're set
+
+    Args
+        arr2D (array[float]): log spectrogram, frequency bins by time frames
+        config (FingerprintConfig): uses peak_neighborhood_size, peak_filter, default_amp_min,
+            peaks_per_frame and target_hashes_per_second
+        freq_start (int): frequency bins below freq_start are zeroed and skipped
+
+    Returns
+    -------
+        peaks (array[int32]): (n, 2) array of (freq, time) peaks, sorted by frequency then time
+    """
+    if config.peak_filter not in ["sparse", "iterated", "footprint"]:
+        raise ValueError(
+            f'Peak filter "{config.peak_filter}" must be one of ["sparse", "iterated", "footprint"]'
+        )
+    if config.default_amp_min < 0:
+        # zeroed bins are louder than default_amp_min, they have to be searched too
+        freq_start = 0
+    # Zeroed bins can't be peaks and can't hide any peaks above them,
+    # every peak is louder than 0
+    band = arr2D[freq_start:]
+
     #  http://docs.scipy.org/doc/scipy/reference/generated/scipy.ndimage.iterate_structure.html#scipy.ndimage.iterate_structure
     struct = generate_binary_structure(
         2, 1
@@ -152,61 +472,202 @@ def get_2D_peaks(arr2D, config: FingerprintConfig):
     # I think it's more important to keep those edges of sound events than worry about noise here or speed
     neighborhood = iterate_structure(struct, config.peak_neighborhood_size)
 
-    # find local maxima using our filter shape
-    local_max = maximum_filter(arr2D, footprint=neighborhood) == arr2D
-    background = arr2D == 0
-    eroded_background = binary_erosion(
-        background, structure=neighborhood, border_value=1
-    )
+    if config.peak_filter == "sparse" and config.default_amp_min >= 0:
+        frequency_idx, time_idx = _sparse_local_maxima(
+            band, neighborhood.shape[0] // 2, config.default_amp_min
+        )
+    else:
+        # find local maxima using our filter shape
+        if config.peak_filter == "footprint":
+            local_max = maximum_filter(band, footprint=neighborhood) == band
+        else:
+            local_max = (
+                _iterated_maximum_filter(band, neighborhood.shape[0] // 2) == band
+            )
+
+        # Boolean mask of arr2D with True at peaks
+        detected_peaks = local_max & (band > config.default_amp_min)
+        if config.default_amp_min < 0:
+            # silent background passes the amplitude filter, drop it like before
+            # (Fixed deprecated boolean operator by changing '-' to '^')
+            eroded_background = binary_erosion(
+                band == 0, structure=neighborhood, border_value=1
+            )
+            detected_peaks = (local_max ^ eroded_background) & (
+                band > config.default_amp_min
+            )
+        # np.nonzero is already sorted by frequency then time
+        frequency_idx, time_idx = np.nonzero(detected_peaks)
 
-    # Boolean mask of arr2D with True at peaks (Fixed deprecated boolean operator by changing '-' to '^')
-    detected_peaks = local_max ^ eroded_background
-
-    # extract peaks
-    amps = arr2D[detected_peaks]
-    j, i = np.where(detected_peaks)
-
-    # filter peaks
-    amps = amps.flatten()
-    peaks = zip(i, j, amps)
-
-    # This cuts off by frequency band rather than hertz
-    # peaks_filtered = filter(
-    #     lambda x: x[2] > config.default_amp_min and x[1] > config.freq_threshold, peaks
-    # )  # time, freq, amp
-    peaks_filtered = filter(
-        lambda x: x[2] > config.default_amp_min, peaks
-    )  # time, freq, amp
-    # get indices for frequency and time
-    frequency_idx = []
-    time_idx = []
-    for x in peaks_filtered:
-        frequency_idx.append(x[1])
-        time_idx.append(x[0])
+    peaks = np.empty((len(frequency_idx), 2), dtype=np.int32)
+    peaks[:, config._IDX_FREQ_I] = frequency_idx + freq_start
+    peaks[:, config._IDX_TIME_J] = time_idx
+    if config.peaks_per_frame is not None or config.target_hashes_per_second is not None:
+        peaks = _limit_density(peaks, band[frequency_idx, time_idx], config)
 
     if config.plot:
         # scatter of the peaks
         fig, ax = plt.subplots()
         ax.imshow(arr2D)
-        ax.scatter(time_idx, frequency_idx, color="r")
+        ax.scatter(
+            peaks[:, config._IDX_TIME_J], peaks[:, config._IDX_FREQ_I], color="r"
+        )
         ax.set_xlabel("Time")
         ax.set_ylabel("Frequency")
         ax.set_title("Spectrogram")
         plt.gca().invert_yaxis()
         plt.show()
 
-    return zip(frequency_idx, time_idx)
+    return peaks
+
+
+def _limit_density(peaks: np.ndarray, amps: np.ndarray, config: FingerprintConfig):
+    """
+    Keeps the peaks_per_frame loudest peaks of every frame, then the loudest peaks
+    that make about target_hashes_per_second. Peaks keep their order.
+    """
+    keep = np.ones(len(peaks), dtype=bool)
+    times = peaks[:, config._IDX_TIME_J]
+    if config.peaks_per_frame is not None:
+        if config.peaks_per_frame < 1:
+            raise ValueError(
+                f"Peaks per frame '{config.peaks_per_frame}' must be at least 1"
+            )
+        # loudest first in every frame, rank is the position in the frame
+        order = np.lexsort((-amps, times))
+        sorted_times = times[order]
+        frame_start = np.flatnonzero(np.r_[True, sorted_times[1:] != sorted_times[:-1]])
+        rank = np.arange(len(order)) - np.repeat(
+            frame_start, np.diff(np.r_[frame_start, len(order)])
+        )
+        keep[order[rank >= config.peaks_per_frame]] = False
+
+    if config.target_hashes_per_second is not None:
+        if config.target_hashes_per_second <= 0:
+            raise ValueError(
+                f"Target hashes per second '{config.target_hashes_per_second}' must be positive"
+            )
+        if len(times) > 0:
+            step = config.fft_window_size - int(
+                config.fft_window_size * config.DEFAULT_OVERLAP_RATIO
+            )
+            seconds = (times.max() + 1) * step / config.sample_rate
+            target = config.target_hashes_per_second * seconds
+            # raising the amplitude threshold is keeping the num loudest peaks,
+            # bisected on the number of hashes they make
+            candidates = np.flatnonzero(keep)
+            loudest = candidates[np.argsort(-amps[candidates], kind="stable")]
+            low, high = 0, len(loudest)
+            if _count_hashes(peaks[np.sort(loudest)], config) > target:
+                while high - low > 1:
+                    num = (low + high) // 2
+                    if _count_hashes(peaks[np.sort(loudest[:num])], config) > target:
+                        high = num
+                    else:
+                        low = num
+                keep[loudest[low:]] = False
+    return peaks[keep]
+
+
+def _count_hashes(peaks: np.ndarray, config: FingerprintConfig) -> int:
+    """Number of hashes generate_hashes makes from the peaks, without hashing"""
+    if len(peaks) == 0:
+        return 0
+    triplets = config.hash_style in ["panako_mod", "panako", "base_three"]
+    if not config.peak_sort:
+        candidates = (
+            _triplet_candidates(peaks, config)
+            if triplets
+            else _pair_candidates(peaks, config)
+        )
+        return sum(len(block[0]) for block in candidates)
+    # sorted by time, the partners of every anchor are one run of the fan out window
+    times = np.sort(peaks[:, config._IDX_TIME_J])
+    anchors = np.arange(len(times))
+    window_end = np.minimum(anchors + config.default_fan_value, len(times))
+    first = np.clip(
+        np.searchsorted(times, times + config.min_hash_time_delta, side="left"),
+        anchors + 1,
+        window_end,
+    )
+    last = np.clip(
+        np.searchsorted(times, times + config.max_hash_time_delta, side="right"),
+        anchors + 1,
+        window_end,
+    )
+    partners = np.maximum(last - first, 0)
+    if triplets:
+        return int(np.sum(partners * (partners - 1) // 2))
+    return int(np.sum(partners))
+
+
+def _iterated_maximum_filter(arr2D, radius: int) -> np.ndarray:
+    """
+    Maximum filter over a diamond of the given radius, the footprint of
+    iterate_structure(generate_binary_structure(2, 1), radius).
+
+    A diamond is a 3x3 cross grown radius times, so filtering by the cross
+    radius times gives the exact same maxima with five cells per pass.
+    """
+    source = np.ascontiguousarray(arr2D)
+    buffers = [np.empty_like(source), np.empty_like(source)]
+    for i in range(radius):
+        filtered = buffers[i % 2]
+        np.copyto(filtered, source)
+        np.maximum(filtered[1:], source[:-1], out=filtered[1:])
+        np.maximum(filtered[:-1], source[1:], out=filtered[:-1])
+        np.maximum(filtered[:, 1:], source[:, :-1], out=filtered[:, 1:])
+        np.maximum(filtered[:, :-1], source[:, 1:], out=filtered[:, :-1])
+        source = filtered
+    return source
+
+
+def _sparse_local_maxima(arr2D, radius: int, amp_min: float) -> tuple:
+    """
+    Local maxima louder than amp_min within a diamond of the given radius.
+
+    Only the loud cells are checked, one neighbor offset at a time, closest
+    neighbors first since they knock out the most candidates. Neighbors past
+    the edges are clipped onto the edge, which is always in the diamond too.
+
+    Returns
+    -------
+        frequency_idx, time_idx (array[int], array[int]): sorted by frequency then time
+    """
+    frequency_idx, time_idx = np.nonzero(arr2D > amp_min)
+    amps = arr2D[frequency_idx, time_idx]
+    d_freqs, d_times = np.mgrid[-radius : radius + 1, -radius : radius + 1]
+    distances = (np.abs(d_freqs) + np.abs(d_times)).ravel()
+    order = np.argsort(distances, kind="stable")
+    order = order[(distances[order] > 0) & (distances[order] <= radius)]
+    for d_freq, d_time in zip(d_freqs.ravel()[order], d_times.ravel()[order]):
+        if len(amps) == 0:
+            break
+        neighbors = arr2D[
+            np.clip(frequency_idx + d_freq, 0, arr2D.shape[0] - 1),
+            np.clip(time_idx + d_time, 0, arr2D.shape[1] - 1),
+        ]
+        keep = neighbors <= amps
+        if not keep.all():
+            frequency_idx, time_idx, amps = (
+                frequency_idx[keep],
+                time_idx[keep],
+                amps[keep],
+            )
+    return frequency_idx, time_idx
 
 
 def generate_hashes(peaks, config: FingerprintConfig):
     """
-    Hash list structure:
-       sha1_hash[0:30]    time_offset
-    [(e05b341a9b77a51fd26..., 32), ... ]
+    Hashes peaks into the file's fingerprints
+
+    Fingerprint structure:
+       hashes (sorted uint64)    offsets (uint32)
+    [0x1b77a51fd26e05b3, ...]    [32, ...]
     """
-    peaks = list(peaks)
+    peaks = _peak_array(peaks)
     if config.peak_sort:
-        peaks = sorted(peaks, key=lambda x: x[1])
+        peaks = peaks[np.argsort(peaks[:, config._IDX_TIME_J], kind="stable")]
     # print("Length of Peaks List is: {}".format(len(peaks)))
 
     if config.hash_style == "panako_mod":
@@ -221,147 +682,247 @@ def generate_hashes(peaks, config: FingerprintConfig):
         print(f'Hash style "{config.hash_style}" is not inplemented')
 
 
+def _peak_array(peaks) -> np.ndarray:
+    """turns an iterable of (freq, time) peaks into an (n, 2) int64 array"""
+    if not isinstance(peaks, np.ndarray):
+        peaks = list(peaks)
+    return np.asarray(peaks, dtype=np.int64).reshape(-1, 2)
+
+
+def _pair_candidates(peaks: np.ndarray, config: FingerprintConfig):
+    """
+    Yields blocks of (anchor, partner) peak indices for every pair within the fan out
+    window whose time delta is within min_hash_time_delta and max_hash_time_delta.
+
+    Pairs are yielded in the same order as looping over anchors, then partners.
+    """
+    times = peaks[:, config._IDX_TIME_J]
+    fan = np.arange(1, config.default_fan_value)
+    block_size = max(1, config.HASH_CANDIDATE_BLOCK // max(len(fan), 1))
+    for start in range(0, len(times), block_size):
+        anchors = np.arange(start, min(start + block_size, len(times)))
+        partners = anchors[:, None] + fan
+        t_delta = times[np.minimum(partners, len(times) - 1)] - times[anchors, None]
+        valid = (
+            (partners < len(times))
+            & (t_delta >= config.min_hash_time_delta)
+            & (t_delta <= config.max_hash_time_delta)
+        )
+        rows, cols = np.nonzero(valid)
+        yield anchors[rows], partners[rows, cols]
+
+
+def _triplet_candidates(peaks: np.ndarray, config: FingerprintConfig):
+    """
+    Yields blocks of (anchor, second, third) peak indices for every triplet within the
+    fan out window where both time deltas from the anchor are within min_hash_time_delta
+    and max_hash_time_delta.
+
+    Triplets are yielded in the same order as looping over anchors, then second peaks,
+    then third peaks.
+    """
+    times = peaks[:, config._IDX_TIME_J]
+    second, third = np.triu_indices(config.default_fan_value, 1)
+    second, third = second[second >= 1], third[second >= 1]
+    fan = np.arange(config.default_fan_value)
+    block_size = max(1, config.HASH_CANDIDATE_BLOCK // max(len(second), 1))
+    for start in range(0, len(times), block_size):
+        anchors = np.arange(start, min(start + block_size, len(times)))
+        partners = anchors[:, None] + fan
+        t_delta = times[np.minimum(partners, len(times) - 1)] - times[anchors, None]
+        in_window = (
+            (partners < len(times))
+            & (t_delta >= config.min_hash_time_delta)
+            & (t_delta <= config.max_hash_time_delta)
+        )
+        rows, cols = np.nonzero(in_window[:, second] & in_window[:, third])
+        anchors = anchors[rows]
+        yield anchors, anchors + second[cols], anchors + third[cols]
+
+
+def _hash_fingerprints(hash_blocks, config: FingerprintConfig) -> FileFingerprints:
+    """builds the file's fingerprints from blocks of (hashes, offsets)"""
+    hashes, offsets = [], []
+    # sha1 keys are stored as their first 64 bits, FINGERPRINT_REDUCTION hex digits at most
+    shift = np.uint64(64 - 4 * min(config.FINGERPRINT_REDUCTION, 16))
+    for block_hashes, block_offsets in hash_blocks:
+        if config.hash_encoding != "packed":
+            digests = b"".join(
+                hashlib.sha1(hash_string.encode("utf-8")).digest()[0:8]
+                for hash_string in block_hashes
+            )
+            block_hashes = np.frombuffer(digests, dtype=">u8").astype(np.uint64) >> shift
+        hashes.append(block_hashes)
+        offsets.append(block_offsets)
+    if len(hashes) == 0:
+        return FileFingerprints()
+    return FileFingerprints(np.concatenate(hashes), np.concatenate(offsets))
+
+
+def _freq_bits(config: FingerprintConfig) -> int:
+    """bits needed for a spectrogram frequency bin index"""
+    return (config.fft_window_size // 2).bit_length()
+
+
+def _time_bits(config: FingerprintConfig) -> int:
+    """bits needed for a time delta between hashed peaks"""
+    return int(config.max_hash_time_delta).bit_length()
+
+
+def _pack_hashes(fields: list) -> np.ndarray:
+    """
+    Bit packs hash fields into one integer per hash
+
+    Args
+        fields (list[tuple(array[int], int)]): (values, bits) for every field, values must
+            be non-negative and fit in bits
+
+    Returns
+    -------
+        hashes (array[uint32] or array[uint64]): uint32 if all fields fit in 32 bits
+    """
+    total_bits = sum(bits for _, bits in fields)
+    if total_bits > 64:
+        raise ValueError(
+            f"Packed hashes need {total_bits} bits, more than 64. "
+            "Lower fft_window_size or max_hash_time_delta, or use sha1 encoding"
+        )
+    hashes = np.zeros(len(fields[0][0]), dtype=np.uint64)
+    for values, bits in fields:
+        hashes <<= np.uint64(bits)
+        hashes |= values.astype(np.uint64)
+    if total_bits <= 32:
+        return hashes.astype(np.uint32)
+    return hashes
+
+
 def panako_mod(peaks, config: FingerprintConfig):
-    hash_dict = {}
-    for i in range(0, len(peaks), 1):
-        freq1 = peaks[i][config._IDX_FREQ_I]
-        t1 = peaks[i][config._IDX_TIME_J]
-        for j in range(1, config.default_fan_value - 1):
-            if i + j < len(peaks):
-                freq2 = peaks[i + j][config._IDX_FREQ_I]
-                t2 = peaks[i + j][config._IDX_TIME_J]
-                for k in range(j + 1, config.default_fan_value):
-                    if (i + k) < len(peaks):
-
-                        freq3 = peaks[i + k][config._IDX_FREQ_I]
-                        t3 = peaks[i + k][config._IDX_TIME_J]
-
-                        t_delta = t3 - t1
-
-                        if (
-                            t_delta >= config.min_hash_time_delta
-                            and t_delta <= config.max_hash_time_delta
-                        ):
-
-                            t_delta = t2 - t1
-
-                            if (
-                                t_delta >= config.min_hash_time_delta
-                                and t_delta <= config.max_hash_time_delta
-                            ):
-                                h = hashlib.sha1(
-                                    f"{freq1-freq2}|{freq2-freq3}|{(t2-t1)/(t3-t1):.8f}".encode(
-                                        "utf-8"
-                                    )
-                                ).hexdigest()[0 : config.FINGERPRINT_REDUCTION]
-                                if h not in hash_dict:
-                                    hash_dict[h] = [int(t1)]
-                                else:
-                                    hash_dict[h] += [int(t1)]
-    return hash_dict
+    peaks = _peak_array(peaks)
+    freqs = peaks[:, config._IDX_FREQ_I]
+    times = peaks[:, config._IDX_TIME_J]
+    freq_bits, time_bits = _freq_bits(config), _time_bits(config)
+
+    def hash_blocks():
+        for i, j, k in _triplet_candidates(peaks, config):
+            t_delta2, t_delta1 = times[j] - times[i], times[k] - times[i]
+            if config.hash_encoding == "packed":
+                # the reduced fraction keeps the time ratio exact
+                gcd = np.gcd(t_delta2, t_delta1)
+                yield _pack_hashes(
+                    [
+                        (freqs[i] - freqs[j] + (1 << freq_bits), freq_bits + 1),
+                        (freqs[j] - freqs[k] + (1 << freq_bits), freq_bits + 1),
+                        (t_delta2 // gcd, time_bits),
+                        (t_delta1 // gcd, time_bits),
+                    ]
+                ), times[i]
+                continue
+            yield [
+                f"{freq_delta1}|{freq_delta2}|{t_ratio:.8f}"
+                for freq_delta1, freq_delta2, t_ratio in zip(
+                    (freqs[i] - freqs[j]).tolist(),
+                    (freqs[j] - freqs[k]).tolist(),
+                    (t_delta2 / t_delta1).tolist(),
+                )
+            ], times[i]
+
+    return _hash_fingerprints(hash_blocks(), config)
 
 
 def base(peaks, config: FingerprintConfig):
-    hash_dict = {}
-    for i in range(0, len(peaks), 1):
-        freq1 = peaks[i][config._IDX_FREQ_I]
-        t1 = peaks[i][config._IDX_TIME_J]
-        for j in range(1, config.default_fan_value):
-            if i + j < len(peaks):
-                freq2 = peaks[i + j][config._IDX_FREQ_I]
-                t2 = peaks[i + j][config._IDX_TIME_J]
-                t_delta = t2 - t1
-
-                if (
-                    t_delta >= config.min_hash_time_delta
-                    and t_delta <= config.max_hash_time_delta
-                ):
-
-                    h = hashlib.sha1(
-                        f"{freq1}|{freq2}|{t_delta}".encode("utf-8")
-                    ).hexdigest()[0 : config.FINGERPRINT_REDUCTION]
-                    if h not in hash_dict:
-                        hash_dict[h] = [int(t1)]
-                    else:
-                        hash_dict[h] += [int(t1)]
-    return hash_dict
+    peaks = _peak_array(peaks)
+    freqs = peaks[:, config._IDX_FREQ_I]
+    times = peaks[:, config._IDX_TIME_J]
+    freq_bits, time_bits = _freq_bits(config), _time_bits(config)
+
+    def hash_blocks():
+        for i, j in _pair_candidates(peaks, config):
+            if config.hash_encoding == "packed":
+                yield _pack_hashes(
+                    [
+                        (freqs[i], freq_bits),
+                        (freqs[j], freq_bits),
+                        (times[j] - times[i], time_bits),
+                    ]
+                ), times[i]
+                continue
+            yield [
+                f"{freq1}|{freq2}|{t_delta}"
+                for freq1, freq2, t_delta in zip(
+                    freqs[i].tolist(),
+                    freqs[j].tolist(),
+                    (times[j] - times[i]).tolist(),
+                )
+            ], times[i]
+
+    return _hash_fingerprints(hash_blocks(), config)
 
 
 def panako(peaks, config: FingerprintConfig):
-    hash_dict = {}
-    for i in range(0, len(peaks), 1):
-        freq1 = peaks[i][config._IDX_FREQ_I]
-        t1 = peaks[i][config._IDX_TIME_J]
-        for j in range(1, config.default_fan_value - 1):
-            if i + j < len(peaks):
-                freq2 = peaks[i + j][config._IDX_FREQ_I]
-                t2 = peaks[i + j][config._IDX_TIME_J]
-                for k in range(j + 1, config.default_fan_value):
-                    if (i + k) < len(peaks):
-
-                        freq3 = peaks[i + k][config._IDX_FREQ_I]
-                        t3 = peaks[i + k][config._IDX_TIME_J]
-
-                        t_delta1 = t3 - t1
-
-                        if (
-                            t_delta1 >= config.min_hash_time_delta
-                            and t_delta1 <= config.max_hash_time_delta
-                        ):
-
-                            t_delta2 = t2 - t1
-
-                            if (
-                                t_delta2 >= config.min_hash_time_delta
-                                and t_delta2 <= config.max_hash_time_delta
-                            ):
-                                h = hashlib.sha1(
-                                    f"{freq1-freq2}|{freq2-freq3}|{freq1//400}|{freq3//400}|{(t_delta2)/(t_delta1):.8f}".encode(
-                                        "utf-8"
-                                    )
-                                ).hexdigest()[0 : config.FINGERPRINT_REDUCTION]
-                                if h not in hash_dict:
-                                    hash_dict[h] = [int(t1)]
-                                else:
-                                    hash_dict[h] += [int(t1)]
-    return hash_dict
+    peaks = _peak_array(peaks)
+    freqs = peaks[:, config._IDX_FREQ_I]
+    times = peaks[:, config._IDX_TIME_J]
+    freq_bits, time_bits = _freq_bits(config), _time_bits(config)
+    band_bits = (config.fft_window_size // 2 // 400).bit_length()
+
+    def hash_blocks():
+        for i, j, k in _triplet_candidates(peaks, config):
+            t_delta2, t_delta1 = times[j] - times[i], times[k] - times[i]
+            if config.hash_encoding == "packed":
+                gcd = np.gcd(t_delta2, t_delta1)
+                yield _pack_hashes(
+                    [
+                        (freqs[i] - freqs[j] + (1 << freq_bits), freq_bits + 1),
+                        (freqs[j] - freqs[k] + (1 << freq_bits), freq_bits + 1),
+                        (freqs[i] // 400, band_bits),
+                        (freqs[k] // 400, band_bits),
+                        (t_delta2 // gcd, time_bits),
+                        (t_delta1 // gcd, time_bits),
+                    ]
+                ), times[i]
+                continue
+            yield [
+                f"{freq_delta1}|{freq_delta2}|{band1}|{band3}|{t_ratio:.8f}"
+                for freq_delta1, freq_delta2, band1, band3, t_ratio in zip(
+                    (freqs[i] - freqs[j]).tolist(),
+                    (freqs[j] - freqs[k]).tolist(),
+                    (freqs[i] // 400).tolist(),
+                    (freqs[k] // 400).tolist(),
+                    (t_delta2 / t_delta1).tolist(),
+                )
+            ], times[i]
+
+    return _hash_fingerprints(hash_blocks(), config)
 
 
 def base_three(peaks, config: FingerprintConfig):
-    hash_dict = {}
-    for i in range(0, len(peaks), 1):
-        freq1 = peaks[i][config._IDX_FREQ_I]
-        t1 = peaks[i][config._IDX_TIME_J]
-        for j in range(1, config.default_fan_value - 1):
-            if i + j < len(peaks):
-                freq2 = peaks[i + j][config._IDX_FREQ_I]
-                t2 = peaks[i + j][config._IDX_TIME_J]
-                for k in range(j + 1, config.default_fan_value):
-                    if (i + k) < len(peaks):
-
-                        freq3 = peaks[i + k][config._IDX_FREQ_I]
-                        t3 = peaks[i + k][config._IDX_TIME_J]
-
-                        t_delta1 = t3 - t1
-
-                        if (
-                            t_delta1 >= config.min_hash_time_delta
-                            and t_delta1 <= config.max_hash_time_delta
-                        ):
-
-                            t_delta2 = t2 - t1
-
-                            if (
-                                t_delta2 >= config.min_hash_time_delta
-                                and t_delta2 <= config.max_hash_time_delta
-                            ):
-                                h = hashlib.sha1(
-                                    f"{freq1}|{freq2}|{freq3}|{t_delta1}|{t_delta2}".encode(
-                                        "utf-8"
-                                    )
-                                ).hexdigest()[0 : config.FINGERPRINT_REDUCTION]
-                                if h not in hash_dict:
-                                    hash_dict[h] = [int(t1)]
-                                else:
-                                    hash_dict[h] += [int(t1)]
-    return hash_dict
+    peaks = _peak_array(peaks)
+    freqs = peaks[:, config._IDX_FREQ_I]
+    times = peaks[:, config._IDX_TIME_J]
+    freq_bits, time_bits = _freq_bits(config), _time_bits(config)
+
+    def hash_blocks():
+        for i, j, k in _triplet_candidates(peaks, config):
+            if config.hash_encoding == "packed":
+                yield _pack_hashes(
+                    [
+                        (freqs[i], freq_bits),
+                        (freqs[j], freq_bits),
+                        (freqs[k], freq_bits),
+                        (times[k] - times[i], time_bits),
+                        (times[j] - times[i], time_bits),
+                    ]
+                ), times[i]
+                continue
+            yield [
+                f"{freq1}|{freq2}|{freq3}|{t_delta1}|{t_delta2}"
+                for freq1, freq2, freq3, t_delta1, t_delta2 in zip(
+                    freqs[i].tolist(),
+                    freqs[j].tolist(),
+                    freqs[k].tolist(),
+                    (times[k] - times[i]).tolist(),
+                    (times[j] - times[i]).tolist(),
+                )
+            ], times[i]
+
+    return _hash_fingerprints(hash_blocks(), config)
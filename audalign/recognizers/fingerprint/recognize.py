@@ -1,7 +1,13 @@
+import multiprocessing
 import os
 import time
+from functools import partial
+
+import numpy as np
 
 from audalign.recognizers.fingerprint import FingerprintConfig
+from audalign.recognizers.fingerprint.fingerprinter import stop_list_stages
+from audalign.recognizers.fingerprint.store import match_offsets
 
 
 def recognize(recognizer, file_path: str, config: FingerprintConfig):
@@ -20,48 +26,55 @@ def recognize(recognizer, file_path: str, config: FingerprintConfig):
 
         None : if no match
     """
-    filter_matches = config.filter_matches
-    if filter_matches is None:
-        filter_matches = 1
     locality_filter_prop = config.locality_filter_prop
     if locality_filter_prop is None:
         locality_filter_prop = 0.6
     elif locality_filter_prop > 1.0:
         locality_filter_prop = 1.0
-    locality = None
-    if config.locality is not None:  # convert from seconds to samples
-        locality = max(  # turns into frames
-            int(
-                config.locality
-                // (
-                    config.fft_window_size
-                    / config.sample_rate
-                    * config.DEFAULT_OVERLAP_RATIO
-                )
-            ),
-            1,
-        )
-    max_lags = None
-    if config.max_lags is not None:
-        max_lags = max(  # turns into frames
-            int(
-                config.max_lags
-                // (
-                    config.fft_window_size
-                    / config.sample_rate
-                    * config.DEFAULT_OVERLAP_RATIO
-                )
-            ),
-            1,
-        )
+    locality = _to_frames(config.locality, config)
+    max_lags = _to_frames(config.max_lags, config)
 
     t = time.time()
-    matches = find_matches(recognizer, file_path)
-    if config.locality:
+    if config.stream_matches:
+        rough_match = stream_align_matches(
+            recognizer,
+            file_path,
+            locality=locality,
+            locality_filter_prop=locality_filter_prop,
+            max_lags=max_lags,
+            max_offsets=config.match_len_filter,
+            max_matches=config.MATCH_BLOCK,
+        )
+    elif config.locality:
+        matches = find_matches(recognizer, file_path)
         rough_match = locality_align_matches(matches, locality, locality_filter_prop)
     else:
-        rough_match = align_matches(matches)
+        matches = find_matches(recognizer, file_path)
+        rough_match = align_matches(
+            matches, max_lags=max_lags, max_offsets=config.match_len_filter
+        )
+
+    return _match_result(rough_match, locality, max_lags, config, t)
+
+
+def _to_frames(seconds, config: FingerprintConfig):
+    """converts locality or max_lags from seconds to frames, None stays None"""
+    if seconds is None:
+        return None
+    return max(
+        int(
+            seconds
+            // (config.fft_window_size / config.sample_rate * config.DEFAULT_OVERLAP_RATIO)
+        ),
+        1,
+    )
+
 
+def _match_result(rough_match: dict, locality, max_lags, config: FingerprintConfig, t):
+    """recognize's result from aligned matches started at time t, None if no match"""
+    filter_matches = config.filter_matches
+    if filter_matches is None:
+        filter_matches = 1
     filter_set = False
 
     if filter_matches != 1:
@@ -89,13 +102,248 @@ def recognize(recognizer, file_path: str, config: FingerprintConfig):
     return None
 
 
+def recognize_all(
+    recognizer, file_paths: list, config: FingerprintConfig, processes: int = 1
+) -> list:
+    """
+    Recognizes every file against all the other fingerprinted files in one pass over
+    the fingerprint_index, instead of running recognize for each file. Every pair of
+    files is matched once and counted for both of them.
+
+    Gives the same match_info as recognize, for files that are fingerprinted and not
+    stored, without locality. match_time is the time of the whole pass. The index
+    can hold up to MAX_PAIR_FILES files.
+
+    Args
+        file_paths (list[str]): files to recognize
+        config (FingerprintConfig): recognition settings
+        processes (int): splits the pairs over this many forked processes
+
+    Returns
+    -------
+        match results (list[dict, None]): recognize's result for each file
+    """
+    t = time.time()
+    max_lags = _to_frames(config.max_lags, config)
+    index = recognizer.fingerprint_index
+    index.sync(recognizer.fingerprinted_files)
+    print(f"Finding matches of {len(file_paths)} files...  ", end="")
+
+    skip = None
+    max_occurrences = config.stop_max_occurrences
+    if not stop_list_stages(config)[1]:
+        max_occurrences = None
+    if max_occurrences is not None or config.stop_max_files is not None:
+        hashes = index.hash_stats()[0]
+        skip = hashes[index.stop_list(hashes, max_occurrences, config.stop_max_files)]
+
+    # file_ids numbered 0 to num_files - 1 in the same order, so keys fit in int64
+    # for up to MAX_PAIR_FILES files
+    file_ids = np.array(sorted(index.file_names), dtype=np.int64)
+    num_files = len(file_ids)
+    if num_files > MAX_PAIR_FILES:
+        raise ValueError(
+            f"recognize_all can't key pairs of {num_files} indexed files, more than "
+            f"{MAX_PAIR_FILES}"
+        )
+    numbers = np.zeros(file_ids.max() + 1 if num_files > 0 else 0, dtype=np.int64)
+    numbers[file_ids] = np.arange(num_files)
+    # files named the same but for case aren't matched, like recognize's exclude
+    same_names = {}
+    name_groups = np.zeros(len(numbers), dtype=np.int64)
+    for file_id, file_name in index.file_names.items():
+        name_groups[file_id] = same_names.setdefault(file_name.lower(), file_id)
+
+    keys, counts, first_found, second_found = _merge_pair_counts(
+        _fork_map(
+            _count_pairs,
+            (index, skip, max_lags, numbers, num_files, name_groups, config.MATCH_BLOCK),
+            [(i, processes) for i in range(processes)],
+            processes,
+        )
+    )
+    print("Aligning matches")
+
+    ids = {file_name: file_id for file_id, file_name in index.file_names.items()}
+    targets = {ids[os.path.basename(x)] for x in file_paths}
+    sample_difference_counters = {file_id: {} for file_id in targets}
+    pairs, pair_starts = np.unique(keys // PAIR_SPAN, return_index=True)
+    pair_ends = np.append(pair_starts[1:], len(keys))
+    differences = keys % PAIR_SPAN + PAIR_MIN_DIFFERENCE
+    for pair, start, end in zip(pairs.tolist(), pair_starts.tolist(), pair_ends.tolist()):
+        first_id, second_id = file_ids[list(divmod(pair, num_files))].tolist()
+        for target_id, against_id, found, sign in [
+            (first_id, second_id, first_found, 1),
+            (second_id, first_id, second_found, -1),
+        ]:
+            if target_id not in targets:
+                continue
+            best = _top_offsets(
+                counts[start:end], found[start:end], config.match_len_filter
+            )
+            sample_difference_counters[target_id][index.file_names[against_id]] = {
+                difference: [count, None]
+                for difference, count in zip(
+                    (sign * differences[start:end][best]).tolist(),
+                    counts[start:end][best].tolist(),
+                )
+            }
+
+    return [
+        _match_result(
+            sample_difference_counters[ids[os.path.basename(x)]], None, max_lags, config, t
+        )
+        for x in file_paths
+    ]
+
+
+# offsets are uint32, so every difference fits in PAIR_SPAN
+PAIR_MIN_DIFFERENCE, PAIR_SPAN = -(2**32), 2**33
+# pair keys of more indexed files than this overflow int64
+MAX_PAIR_FILES = 2**15
+
+
+def _count_pairs(
+    index,
+    skip,
+    max_lags,
+    numbers: np.ndarray,
+    num_files: int,
+    name_groups: np.ndarray,
+    max_matches: int,
+    part: tuple,
+):
+    """
+    recognize_all's offset counts of one part of the index's pairs
+
+    Returns
+    -------
+        _count_pair_offsets of (first file, last file, offset) keys
+    """
+    # counted like stream_align_matches
+    empty = np.zeros(0, dtype=np.int64)
+    offset_counts = _count_pair_offsets(empty, empty, empty)
+    block_counts = []
+    for (
+        first_ids,
+        second_ids,
+        first_offsets,
+        second_offsets,
+        first_order,
+        second_order,
+    ) in index.iter_pairs(skip, max_matches, part):
+        sample_differences = second_offsets - first_offsets
+        keep = name_groups[first_ids] != name_groups[second_ids]
+        if max_lags is not None:
+            keep &= np.abs(sample_differences) <= max_lags
+        keys = (
+            numbers[first_ids[keep]] * num_files + numbers[second_ids[keep]]
+        ) * PAIR_SPAN + (sample_differences[keep] - PAIR_MIN_DIFFERENCE)
+        block_counts.append(
+            _count_pair_offsets(keys, first_order[keep], second_order[keep])
+        )
+        if sum(len(x[0]) for x in block_counts) > max(len(offset_counts[0]), max_matches):
+            offset_counts = _merge_pair_counts([offset_counts] + block_counts)
+            block_counts = []
+    return _merge_pair_counts([offset_counts] + block_counts)
+
+
+def recognize_each(
+    recognizer, file_paths: list, config: FingerprintConfig, processes: int = 1
+) -> list:
+    """
+    Runs recognize for every file, spread over forked processes
+
+    Args
+        file_paths (list[str]): files to recognize
+        config (FingerprintConfig): recognition settings
+        processes (int): number of processes to recognize files in
+
+    Returns
+    -------
+        match results (list[dict, None]): recognize's result for each file
+    """
+    return _fork_map(_recognize_file, (recognizer, config), file_paths, processes)
+
+
+def _recognize_file(recognizer, config: FingerprintConfig, file_path: str):
+    return recognize(recognizer, file_path, config)
+
+
+# what _fork_map's processes share with the process that forked them
+_shared = None
+
+
+def _fork_map(function, shared: tuple, tasks: list, processes: int) -> list:
+    """
+    function(*shared, task) for every task, in up to processes forked processes.
+
+    Forked processes get shared, like the recognizer and its fingerprint_index,
+    copy-on-write instead of pickled. Only the tasks and results are pickled. Runs
+    everything in this process if there's one process, one task or no fork.
+    """
+    global _shared
+    processes = min(processes, len(tasks))
+    if processes <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+        return [function(*shared, task) for task in tasks]
+    _shared = shared
+    try:
+        with multiprocessing.get_context("fork").Pool(processes) as pool:
+            return pool.map(partial(_call_shared, function), tasks, chunksize=1)
+    finally:
+        _shared = None
+
+
+def _call_shared(function, task):
+    return function(*_shared, task)
+
+
+def _count_pair_offsets(
+    keys: np.ndarray,
+    first_found: np.ndarray,
+    second_found: np.ndarray,
+    weights: np.ndarray = None,
+):
+    """
+    _count_offsets with the lowest match order of each key for both files of a pair
+
+    Returns
+    -------
+        sorted unique keys (array[int64]), counts (array[int64]), lowest first_found
+        (array[int64]) and lowest second_found (array[int64]) of each key
+    """
+    if len(keys) == 0:
+        return keys, keys, keys, keys
+    order = np.lexsort((first_found, keys))
+    keys = keys[order]
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(keys)) + 1))
+    if weights is None:
+        counts = np.diff(np.append(starts, len(keys)))
+    else:
+        counts = np.add.reduceat(weights[order], starts)
+    return (
+        keys[starts],
+        counts.astype(np.int64),
+        first_found[order][starts],
+        np.minimum.reduceat(second_found[order], starts),
+    )
+
+
+def _merge_pair_counts(all_counts: list):
+    """Merges results of _count_pair_offsets into one"""
+    if len(all_counts) == 1:
+        return all_counts[0]
+    keys, counts, first_found, second_found = [np.concatenate(x) for x in zip(*all_counts)]
+    return _count_pair_offsets(keys, first_found, second_found, weights=counts)
+
+
 def find_matches(
     recognizer,
     file_path,
 ):
     """
     fingerprints target file, then finds every occurence of exact same hashes in already
-    fingerprinted files
+    fingerprinted files through the recognizer's fingerprint_index
 
     Args
         samples (array of decoded file): array of decoded file from filehandler.read
@@ -103,44 +351,147 @@ def find_matches(
 
     Returns
     -------
-        Matches(list[str, int, int, int]): list of all matches, file_name match, corresponding offset, target location, file_match offset
+        Matches(tuple): file names (list[str]), index into file names of each match
+        (array[int64]), target offsets (array[int64]), file_match offsets (array[int64])
     """
     file_name = os.path.basename(file_path)
+    target_fingerprints = _target_fingerprints(recognizer, file_path)
+    if target_fingerprints is None:
+        empty = np.zeros(0, dtype=np.int64)
+        return [], empty, empty, empty
 
-    target_mapper = {}
-
+    print(f"{file_name}: Finding Matches...  ", end="")
+    index = recognizer.fingerprint_index
+    index.sync(recognizer.fingerprinted_files)
+    file_ids, t_offsets, a_offsets = index.match(
+        target_fingerprints,
+        exclude=[x for x in recognizer.file_names if x.lower() == file_name.lower()],
+    )
+    file_ids, file_index = np.unique(file_ids, return_inverse=True)
+    file_names = [index.file_names[x] for x in file_ids.tolist()]
+    return file_names, file_index.astype(np.int64), t_offsets, a_offsets
+
+
+def _target_fingerprints(recognizer, file_path):
+    """
+    fingerprints of file_path, fingerprinting it if not already fingerprinted, without
+    the hashes on the stop list
+    """
+    file_name = os.path.basename(file_path)
+    target = None
     if file_name not in recognizer.file_names:
-        fingerprints = recognizer._fingerprint_file(file_path)
-        target_mapper = fingerprints[1]
+        target = recognizer._fingerprint_file(file_path)[1]
     else:
         for audio_file in recognizer.fingerprinted_files:
             if audio_file[0] == file_name:
-                target_mapper = audio_file[1]
+                target = audio_file[1]
                 break
+    if target is None:
+        return None
+
+    config = recognizer.config
+    max_occurrences = config.stop_max_occurrences
+    if not stop_list_stages(config)[1]:
+        max_occurrences = None
+    if max_occurrences is None and config.stop_max_files is None:
+        return target
+    index = recognizer.fingerprint_index
+    index.sync(recognizer.fingerprinted_files)
+    target_hashes, _, counts = target.unique()
+    stopped = index.stop_list(target_hashes, max_occurrences, config.stop_max_files)
+    if max_occurrences is not None:
+        stopped |= counts > max_occurrences
+    return target.drop_hashes(stopped)
+
+
+def stream_align_matches(
+    recognizer,
+    file_path,
+    locality: int = None,
+    locality_filter_prop: float = 0.6,
+    max_lags: int = None,
+    max_offsets: int = None,
+    max_matches: int = 2**20,
+):
+    """
+    Same as find_matches followed by align_matches or locality_align_matches, without
+    keeping every match at once.
 
-    matches = []
+    Without locality, matches are found max_matches at a time and counted into the
+    offset counts right away. With locality, matches are found and aligned one file at
+    a time.
+
+    Returns
+    -------
+        sample_difference_counter (dict): same as align_matches or locality_align_matches
+    """
+    file_name = os.path.basename(file_path)
+    target_fingerprints = _target_fingerprints(recognizer, file_path)
+    sample_difference_counter = {}
+    if target_fingerprints is None:
+        return sample_difference_counter
 
     print(f"{file_name}: Finding Matches...  ", end="")
-    for audio_file in recognizer.fingerprinted_files:
-        if audio_file[0].lower() != file_name.lower():
-            already_hashes = audio_file[1]
-            for t_hash in target_mapper.keys():
-                if t_hash in already_hashes.keys():
-                    for t_offset in target_mapper[t_hash]:
-                        for a_offset in already_hashes[t_hash]:
-                            sample_difference = a_offset - t_offset
-                            matches.append(
-                                [audio_file[0], sample_difference, t_offset, a_offset]
-                            )
-    return matches
-
-
-def align_matches(matches: list):
+    print("Aligning matches")
+    if locality:
+        for name, fingerprints in recognizer.fingerprinted_files:
+            if name.lower() == file_name.lower():
+                continue
+            t_offsets, a_offsets = match_offsets(target_fingerprints, fingerprints)
+            temp_file_dict = _locality_align_file(
+                a_offsets - t_offsets,
+                t_offsets,
+                a_offsets,
+                locality,
+                locality_filter_prop,
+            )
+            if len(temp_file_dict) > 0:
+                sample_difference_counter[name] = temp_file_dict
+        return sample_difference_counter
+
+    index = recognizer.fingerprint_index
+    index.sync(recognizer.fingerprinted_files)
+    # offsets are uint32, so every difference fits in span
+    min_difference, span = -(2**32), 2**33
+    # blocks are counted on their own, then merged into offset_counts once they add
+    # up to its size, so the merges don't resort offset_counts every block
+    offset_counts = _count_offsets(*[np.zeros(0, dtype=np.int64)] * 2)
+    block_counts = []
+    for file_ids, t_offsets, a_offsets, match_order in index.iter_match(
+        target_fingerprints,
+        exclude=[x for x in recognizer.file_names if x.lower() == file_name.lower()],
+        max_matches=max_matches,
+    ):
+        sample_differences = a_offsets - t_offsets
+        if max_lags is not None:
+            within_lags = np.abs(sample_differences) <= max_lags
+            file_ids = file_ids[within_lags]
+            sample_differences = sample_differences[within_lags]
+            match_order = match_order[within_lags]
+        keys = file_ids.astype(np.int64) * span + (sample_differences - min_difference)
+        block_counts.append(_count_offsets(keys, match_order))
+        if sum(len(x[0]) for x in block_counts) > max(
+            len(offset_counts[0]), max_matches
+        ):
+            offset_counts = _merge_counts([offset_counts] + block_counts)
+            block_counts = []
+    offset_counts = _merge_counts([offset_counts] + block_counts)
+
+    return _offsets_to_counter(
+        index.file_names, *offset_counts, span, min_difference, max_offsets
+    )
+
+
+def align_matches(matches: tuple, max_lags: int = None, max_offsets: int = None):
     """
     takes matches from find_matches and converts it to a dictionary of counts per offset and file name
 
+    Offsets are counted with np.unique and ordered by count, then by which was matched first
+
     Args
-        matches (list[str, int]): list of matches from find_matches
+        matches (tuple): matches from find_matches
+        max_lags (int, None): leaves out offsets further than max_lags frames
+        max_offsets (int, None): only keeps the max_offsets offsets with the highest counts per file
 
     Returns
     -------
@@ -148,177 +499,358 @@ def align_matches(matches: list):
     """
 
     print("Aligning matches")
+    file_names, file_index, t_offsets, a_offsets = matches
     sample_difference_counter = {}
-    for file_name, sample_difference, _, _ in matches:
-        if file_name not in sample_difference_counter:
-            sample_difference_counter[file_name] = {}
-        if sample_difference not in sample_difference_counter[file_name]:
-            sample_difference_counter[file_name][sample_difference] = [0, None]
-        sample_difference_counter[file_name][sample_difference][0] += 1
+    sample_differences = a_offsets - t_offsets
+    if max_lags is not None:
+        within_lags = np.abs(sample_differences) <= max_lags
+        file_index = file_index[within_lags]
+        sample_differences = sample_differences[within_lags]
+    if len(sample_differences) == 0:
+        return sample_difference_counter
+
+    # one key per file and offset
+    min_difference = sample_differences.min()
+    span = int(sample_differences.max() - min_difference) + 1
+    keys = file_index * span + (sample_differences - min_difference)
+    keys, counts, first_found = _count_offsets(keys, np.arange(len(keys)))
+    return _offsets_to_counter(
+        file_names, keys, counts, first_found, span, min_difference, max_offsets
+    )
+
+
+def _count_offsets(keys: np.ndarray, match_order: np.ndarray, weights: np.ndarray = None):
+    """
+    Counts occurrences of each key, or sums their weights
 
+    Returns
+    -------
+        sorted unique keys (array[int64]), counts (array[int64]), lowest match_order
+        of each key (array[int64])
+    """
+    order = np.lexsort((match_order, keys))
+    keys = keys[order]
+    starts = np.flatnonzero(np.diff(keys)) + 1
+    starts = np.concatenate(([0], starts)) if len(keys) > 0 else starts
+    if weights is None:
+        counts = np.diff(np.append(starts, len(keys)))
+    else:
+        counts = np.add.reduceat(weights[order], starts) if len(keys) > 0 else starts
+    return keys[starts], counts.astype(np.int64), match_order[order][starts]
+
+
+def _merge_counts(all_counts: list):
+    """Merges results of _count_offsets into one"""
+    if len(all_counts) == 1:
+        return all_counts[0]
+    keys, counts, first_found = [np.concatenate(x) for x in zip(*all_counts)]
+    return _count_offsets(keys, first_found, weights=counts)
+
+
+def _offsets_to_counter(
+    file_names,
+    keys: np.ndarray,
+    counts: np.ndarray,
+    first_found: np.ndarray,
+    span: int,
+    min_difference: int,
+    max_offsets: int = None,
+):
+    """Turns counted (file, offset) keys into align_matches' sample_difference_counter"""
+    sample_difference_counter = {}
+    files, file_starts = np.unique(keys // span, return_index=True)
+    file_ends = np.append(file_starts[1:], len(keys))
+    for i, start, end in zip(files.tolist(), file_starts.tolist(), file_ends.tolist()):
+        best = _top_offsets(counts[start:end], first_found[start:end], max_offsets)
+        differences = keys[start:end][best] % span + min_difference
+        sample_difference_counter[file_names[i]] = {
+            difference: [count, None]
+            for difference, count in zip(
+                differences.tolist(), counts[start:end][best].tolist()
+            )
+        }
     return sample_difference_counter
 
 
-def locality_align_matches(matches: list, locality: int, locality_filter_prop: int):
-
-    print("Aligning matches")
-    sample_difference_counter = {}
-    file_dict = {}
-
-    # converting matches into file_dict of matches
-    for file_name, sample_difference, t_offset, a_offset in matches:
-        if file_dict.get(file_name) is None:
-            file_dict[file_name] = []
-        file_dict[file_name].append((sample_difference, t_offset, a_offset))
+def _top_offsets(counts: np.ndarray, first_found: np.ndarray, max_offsets: int = None):
+    """
+    Orders offsets by count, then by first_found. Uses np.argpartition to only order
+    the max_offsets highest if given.
 
-    # shifting windows for each filename match
-    for name in file_dict.keys():
-        temp_file_dict = {}
-        start_window = 0
-        end_window = 1
-        last_end = 1
-
-        # sorts by t_offset
-        file_dict[name] = sorted(file_dict[name], key=lambda x: x[1])
-
-        while (
-            end_window < len(file_dict[name]) - 1
-            and file_dict[name][end_window][1] - file_dict[name][start_window][1]
-            <= locality
-        ):
-            end_window += 1
-            last_end = end_window
+    Returns
+    -------
+        indexes of offsets in order (array[int])
+    """
+    best = np.arange(len(counts))
+    if max_offsets is not None and len(counts) > max_offsets:
+        partitioned = np.argpartition(-counts, max_offsets - 1)
+        lowest_count = counts[partitioned[max_offsets - 1]]
+        above = np.flatnonzero(counts > lowest_count)
+        # ties at the lowest count kept go to the ones found first
+        ties = np.flatnonzero(counts == lowest_count)
+        ties = ties[np.argsort(first_found[ties])[: max_offsets - len(above)]]
+        best = np.concatenate((above, ties))
+    return best[np.lexsort((first_found[best], -counts[best]))]
 
-        # moves end while there's room and locality is
-        while True:  # end_window <= len(file_dict[name]):
 
-            # {(toff, aoff): {samp_diff : confidence}}
-            toff_dict = find_loc_matches(
-                file_dict[name][start_window:end_window], locality
-            )
+def locality_align_matches(matches: tuple, locality: int, locality_filter_prop: int):
 
-            # combines and turns into {offset: [confidence, [loc_tups]]}
-            for tup, samp_dict in toff_dict.items():
-                for samp_diff, confidence in samp_dict.items():
-                    if temp_file_dict.get(samp_diff) is None:
-                        temp_file_dict[samp_diff] = [confidence, []]
-                    elif temp_file_dict[samp_diff][0] < confidence:
-                        temp_file_dict[samp_diff][0] = confidence
-                    temp_file_dict[samp_diff][1] += [(*tup, confidence)]
-
-            # breaks out of while if at end of file and within locality
-            if end_window >= len(file_dict[name]):
-                break
+    print("Aligning matches")
+    sample_difference_counter = {}
 
-            while True:
-                start_window += 1
-                while (
-                    end_window <= len(file_dict[name]) - 1
-                    and file_dict[name][end_window][1]
-                    - file_dict[name][start_window][1]
-                    <= locality
-                ):
-                    end_window += 1
-                if end_window >= len(file_dict[name]):
-                    break
-                if end_window > last_end:
-                    last_end = end_window
-                    break
-
-        # # filter to top 30
-        if len(temp_file_dict.keys()) > 30:
-            temp_file_list = [
-                (samp_diff, conf_loc) for samp_diff, conf_loc in temp_file_dict.items()
-            ]
-            temp_file_list = sorted(
-                temp_file_list, key=lambda x: x[1][0], reverse=True
-            )  # sort by confidence
-            temp_file_dict = {}
-            for i in range(30):
-                temp_file_dict[temp_file_list[i][0]] = temp_file_list[i][1]
-
-        # locality_filter_prop
-        for _, matches in temp_file_dict.items():
-            index = 0
-            while index < len(matches[1]):
-                if matches[1][index][2] < matches[0] * locality_filter_prop:
-                    matches[1].pop(index)
-                    continue
-                index += 1
+    # splitting matches by file
+    file_names, file_index, t_offsets, a_offsets = matches
+    file_order = np.argsort(file_index, kind="stable")
+    files, file_starts = np.unique(file_index[file_order], return_index=True)
+    file_ends = np.append(file_starts[1:], len(file_order))
 
+    # shifting windows for each filename match
+    for i, start, end in zip(files.tolist(), file_starts.tolist(), file_ends.tolist()):
+        file_matches = file_order[start:end]
+        temp_file_dict = _locality_align_file(
+            a_offsets[file_matches] - t_offsets[file_matches],
+            t_offsets[file_matches],
+            a_offsets[file_matches],
+            locality,
+            locality_filter_prop,
+        )
         if len(temp_file_dict) > 0:
-            sample_difference_counter[name] = temp_file_dict
+            sample_difference_counter[file_names[i]] = temp_file_dict
 
     # return {filename: {offset: [confidence, [loc_tups]]}}
     return sample_difference_counter
 
 
-def find_loc_matches(matches_list: list, locality: int):
-    """receives from align matches locality,
-        matcheslist = [(sample_difference, t_offset, a_offset)]
+def _locality_align_file(
+    sample_differences: np.ndarray,
+    t_offsets: np.ndarray,
+    a_offsets: np.ndarray,
+    locality: int,
+    locality_filter_prop: float,
+    max_window_matches: int = 2**18,
+):
+    """
+    locality_align_matches for one file
+
+    Target windows slide over the matches sorted by t_offset. Inside each target
+    window, against windows slide over its matches sorted by a_offset, and every
+    against window counts its matches per sample_difference.
 
-    Args:
-        matches_list (list): [(sample_difference, t_offset, a_offset)]
-        locality (int): [description]
+    Both windows only move forward, so instead of recounting every against window,
+    each match gets the contiguous range of against windows it falls in. Sweeping over
+    the starts and ends of those ranges, sorted by sample_difference, gives each
+    sample_difference's count in every window. Target windows are done together,
+    about max_window_matches matches at a time.
 
-    Returns:
-        [dict]: {(toff, aoff): {samp_diff : confidence}}
+    Args
+        sample_differences, t_offsets, a_offsets (array[int64]): matches of one file
+
+    Returns
+    -------
+        temp_file_dict (dict): {offset: [confidence, [loc_tups]]}
     """
-    # matches_list = list(set(matches_list))
+    if len(t_offsets) == 0:
+        return {}
+    t_order = np.argsort(t_offsets, kind="stable")
+    t_offsets = t_offsets[t_order]
+    a_offsets = a_offsets[t_order]
+    unique_differences, differences = np.unique(
+        sample_differences[t_order], return_inverse=True
+    )
+    differences = differences.reshape(-1)
+    num_matches = len(t_offsets)
+    not_counted = np.iinfo(np.int64).max
+
+    # per sample_difference: highest confidence and first window and match counted in
+    confidence = np.zeros(len(unique_differences), dtype=np.int64)
+    first_counted = np.full((2, len(unique_differences)), not_counted)
+    # per batch: (window t locs, window a locs, sample_difference counts)
+    batches = []
+
+    reach = np.searchsorted(t_offsets, t_offsets + locality, side="right")
+    t_starts, t_ends = _sweep_windows(
+        reach, max(1, min(reach[0], num_matches - 1)), num_matches
+    )
+    # target windows of one match only have an empty against window
+    several = t_ends - t_starts > 1
+    t_starts, t_ends = t_starts[several], t_ends[several]
+    window_sizes = t_ends - t_starts
+    batch_bounds = np.append(
+        np.unique(
+            (np.cumsum(window_sizes) - window_sizes) // max_window_matches,
+            return_index=True,
+        )[1],
+        len(t_starts),
+    ).tolist()
+    first_window = 0  # numbering against windows across batches
+
+    for batch_start, batch_end in zip(batch_bounds[:-1], batch_bounds[1:]):
+        starts = t_starts[batch_start:batch_end]
+        sizes = window_sizes[batch_start:batch_end]
+        t_window = np.repeat(np.arange(len(sizes)), sizes)
+        matches = np.repeat(starts - np.cumsum(sizes) + sizes, sizes) + np.arange(
+            len(t_window)
+        )
 
-    a_matches = sorted(matches_list, key=lambda x: x[2])
-    temp_file_dict = {}
-    start_window = 0
-    end_window = 0
-    last_end = 0
+        # sorts each target window by a_offset, keeping t_offset order for ties.
+        # a window's reach never gets into the next target window, so the sweep
+        # of every target window can be done at once
+        a_keys = t_window * 2**33 + a_offsets[matches]
+        a_order = np.argsort(a_keys, kind="stable")
+        a_keys, matches, t_window = a_keys[a_order], matches[a_order], t_window[a_order]
+        window_a = a_offsets[matches]
+        match_differences = differences[matches]
+        reach = np.searchsorted(a_keys, a_keys + locality, side="right") - 1
+        a_starts, a_ends = _sweep_windows(reach, reach[0], len(reach) - 1)
+        a_locs = (window_a[a_ends] - window_a[a_starts]) // 2 + window_a[a_starts]
+        a_t_window = t_window[a_starts]
+        # windows with the same loc_tup replace the one before, only the last counts
+        kept = np.append(
+            (a_locs[1:] != a_locs[:-1]) | (a_t_window[1:] != a_t_window[:-1]), True
+        )
+        a_starts, a_ends = a_starts[kept], a_ends[kept]
+        a_locs, a_t_window = a_locs[kept], a_t_window[kept]
+        t_locs = (t_offsets[t_ends[batch_start:batch_end] - 1] - t_offsets[starts]) // 2
+        t_locs += t_offsets[starts]
+
+        # range of against windows [first, last] each match is counted in
+        positions = np.arange(len(matches))
+        first_windows = np.searchsorted(a_ends, positions, side="right")
+        last_windows = np.searchsorted(a_starts, positions, side="right") - 1
+        counted = first_windows <= last_windows
+        positions = positions[counted]
+        first_windows = first_windows[counted]
+        last_windows = last_windows[counted]
+        match_differences = match_differences[counted]
+        if len(positions) == 0:
+            first_window += len(a_locs)
+            continue
 
-    while (
-        end_window < len(a_matches) - 1
-        and a_matches[end_window + 1][2] - a_matches[start_window][2] <= locality
-    ):
-        end_window += 1
-        last_end = end_window
+        # sweeps +1 at first, -1 after last, per sample_difference
+        event_differences = np.concatenate((match_differences, match_differences))
+        event_windows = np.concatenate((first_windows, last_windows + 1))
+        event_order = np.argsort(
+            event_differences * (len(a_locs) + 1) + event_windows, kind="stable"
+        )
+        event_differences = event_differences[event_order]
+        event_windows = event_windows[event_order]
+        running_counts = np.cumsum(
+            np.repeat([1, -1], len(positions))[event_order], dtype=np.int64
+        )
+        # the count from each event to the next event of the same sample_difference
+        segment_ends = np.append(
+            (event_differences[1:] != event_differences[:-1])
+            | (event_windows[1:] != event_windows[:-1]),
+            True,
+        )
+        segment_differences = event_differences[segment_ends]
+        segment_starts = event_windows[segment_ends]
+        segment_counts = running_counts[segment_ends]
+        segment_stops = np.append(segment_starts[1:], 0)
+        present = segment_counts > 0
+        segment_differences = segment_differences[present]
+        segment_starts = segment_starts[present]
+        segment_stops = segment_stops[present]
+        segment_counts = segment_counts[present]
+
+        counted_differences, group_starts = np.unique(
+            segment_differences, return_index=True
+        )
+        confidence[counted_differences] = np.maximum(
+            confidence[counted_differences],
+            np.maximum.reduceat(segment_counts, group_starts),
+        )
+        new = first_counted[0, counted_differences] == not_counted
+        if np.any(new):
+            # first window counting each new sample_difference, then its first match in it
+            new_differences = counted_differences[new]
+            first_window_of = np.full(len(confidence), -1)
+            first_window_of[new_differences] = segment_starts[group_starts][new]
+            in_first_window = (
+                first_windows <= first_window_of[match_differences]
+            ) & (first_window_of[match_differences] <= last_windows)
+            first_position = np.full(len(confidence), not_counted)
+            np.minimum.at(
+                first_position,
+                match_differences[in_first_window],
+                positions[in_first_window],
+            )
+            first_counted[0, new_differences] = (
+                first_window_of[new_differences] + first_window
+            )
+            first_counted[1, new_differences] = first_position[new_differences]
 
-    while True:  # end_window <= len(a_matches):
+        # counts under locality_filter_prop of the confidence so far never get through
+        passing = ~(
+            segment_counts < confidence[segment_differences] * locality_filter_prop
+        )
+        batches.append(
+            (
+                t_locs[a_t_window],
+                a_locs,
+                segment_differences[passing],
+                segment_starts[passing],
+                segment_stops[passing],
+                segment_counts[passing],
+            )
+        )
+        first_window += len(a_locs)
 
-        loc_tup = (
-            ((matches_list[-1][1] - matches_list[0][1]) // 2) + matches_list[0][1],
-            ((a_matches[end_window][2] - a_matches[start_window][2]) // 2)
-            + a_matches[start_window][2],
+    temp_file_dict = {}
+    offsets = np.flatnonzero(first_counted[0] != not_counted)
+    if len(offsets) == 0:
+        return temp_file_dict
+    offsets = offsets[np.lexsort((first_counted[1, offsets], first_counted[0, offsets]))]
+    # filter to top 30
+    if len(offsets) > 30:
+        offsets = offsets[np.argsort(-confidence[offsets], kind="stable")[:30]]
+
+    for difference in offsets.tolist():
+        temp_file_dict[int(unique_differences[difference])] = [
+            int(confidence[difference]),
+            [],
+        ]
+    is_kept = np.zeros(len(confidence), dtype=bool)
+    is_kept[offsets] = True
+    for t_locs, a_locs, segment_differences, starts, stops, counts in batches:
+        # locality_filter_prop
+        kept = is_kept[segment_differences] & ~(
+            counts < confidence[segment_differences] * locality_filter_prop
         )
-        # loc_tup = ( # Old version
-        #     (matches_list[-1][1] - matches_list[0][1]) // 2,
-        #     (a_matches[end_window][2] - a_matches[start_window][2]) // 2,
-        # )
-        temp_file_dict[loc_tup] = {}
-        for sample_difference, t_offset, a_offset in a_matches[start_window:end_window]:
-            if sample_difference not in temp_file_dict[loc_tup].keys():
-                temp_file_dict[loc_tup][sample_difference] = 0
-            temp_file_dict[loc_tup][sample_difference] += 1
-        # gives us temp_file_dict--- {(toff, aoff): {samp_diff : confidence}}
-
-        # breaks out of while if at end of file and within locality
-
-        if end_window >= len(a_matches) - 1:
-            break
-
-        while True:
-            start_window += 1
-            while (
-                end_window < len(a_matches) - 1
-                and a_matches[end_window + 1][2] - a_matches[start_window][2]
-                <= locality
-            ):
-                end_window += 1
-            if end_window >= len(a_matches) - 1:
-                break
-            if end_window > last_end:
-                last_end = end_window
-                break
+        lengths = (stops - starts)[kept]
+        windows = np.repeat(starts[kept] - np.cumsum(lengths) + lengths, lengths)
+        windows += np.arange(len(windows))
+        for difference, t_loc, a_loc, count in zip(
+            unique_differences[np.repeat(segment_differences[kept], lengths)].tolist(),
+            t_locs[windows].tolist(),
+            a_locs[windows].tolist(),
+            np.repeat(counts[kept], lengths).tolist(),
+        ):
+            temp_file_dict[difference][1].append((t_loc, a_loc, count))
 
     return temp_file_dict
 
 
+def _sweep_windows(reach: np.ndarray, first_end: int, last: int):
+    """
+    Windows of a sliding window that only moves on when its end does
+
+    Args
+        reach (array[int]): end of the window starting at each index
+        first_end (int): end of the first window
+        last (int): stops after the first window that ends at or after last
+
+    Returns
+    -------
+        window starts (array[int]), window ends (array[int])
+    """
+    ends = np.maximum.accumulate(np.concatenate(([first_end], reach[1:])))
+    starts = np.flatnonzero(np.append(True, ends[1:] > ends[:-1]))
+    ends = ends[starts]
+    stop = int(np.searchsorted(ends, last, side="left")) + 1
+    return starts[:stop], np.minimum(ends[:stop], last)
+
+
 def process_results(
     results,
     locality,
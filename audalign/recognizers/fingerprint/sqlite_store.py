@@ -0,0 +1,339 @@
+"""
+SQLite fingerprint store, for libraries that need durable saves, concurrent readers or
+don't fit in memory
+
+Every hash occurrence is a row of the fingerprints table, looked up through a covering
+(hash, file_id, offset) index. A file's rows are inserted with consecutive rowids, in
+FileFingerprints order, so loading a file reads one rowid range.
+
+Loaded files are StoredFingerprints, FingerprintIndex looks their hashes up here
+SQLITE_BATCH at a time instead of loading them.
+"""
+
+import os
+import sqlite3
+import typing
+
+import numpy as np
+
+from audalign.config.fingerprint import FingerprintConfig
+from audalign.recognizers.fingerprint.store import FileFingerprints, StoredFingerprints
+
+SQLITE_EXTENSION = "sqlite"
+# hashes per IN (...) lookup, under the 999 variable limit of older SQLite versions
+SQLITE_BATCH = 900
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS files (
+    file_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    file_name TEXT NOT NULL UNIQUE,
+    num_hashes INTEGER NOT NULL,
+    first_row INTEGER NOT NULL,
+    last_row INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS fingerprints (
+    hash INTEGER NOT NULL,
+    file_id INTEGER NOT NULL,
+    offset INTEGER NOT NULL
+);
+"""
+INDEX = (
+    "CREATE INDEX IF NOT EXISTS fingerprints_hash ON fingerprints (hash, file_id, offset)"
+)
+
+
+class SQLiteStore:
+    """
+    Fingerprints of files in an SQLite database
+
+    Hashes are stored as int64 with the same bits as the uint64 hashes. Connections
+    aren't shared with forked processes, each process opens its own.
+    """
+
+    batch_size = SQLITE_BATCH
+
+    def __init__(self, path: str):
+        self.path = path
+        self._connection = None
+        self._pid = None
+        self._loaded = (None, None)  # (file_id, FileFingerprints) of the last load
+        self.connection.executescript(SCHEMA)
+        self.connection.execute(INDEX)
+
+    def __repr__(self) -> str:
+        return f'SQLiteStore("{self.path}")'
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._pid != os.getpid():
+            self._connection = sqlite3.connect(self.path)
+            # readers don't block the writer and a cut off save is rolled back
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._pid = os.getpid()
+        return self._connection
+
+    def is_path(self, path: str) -> bool:
+        return os.path.realpath(self.path) == os.path.realpath(path)
+
+    @property
+    def hash_encoding(self) -> typing.Optional[str]:
+        row = self.connection.execute(
+            "SELECT value FROM info WHERE key = 'hash_encoding'"
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def check_encoding(self, config: FingerprintConfig) -> None:
+        """Raises ValueError if the store holds another hash encoding than config"""
+        hash_encoding = self.hash_encoding
+        if hash_encoding is not None and hash_encoding != config.hash_encoding:
+            raise ValueError(
+                f'"{self.path}" uses "{hash_encoding}" hash encoding, '
+                f'config uses "{config.hash_encoding}"'
+            )
+
+    def files(self) -> list:
+        """(file_id, file_name, num_hashes) of every file in the order they were saved"""
+        return self.connection.execute(
+            "SELECT file_id, file_name, num_hashes FROM files ORDER BY file_id"
+        ).fetchall()
+
+    def num_rows(self) -> int:
+        """about the number of saved hash occurrences, exact unless files were removed"""
+        return self.connection.execute(
+            "SELECT coalesce(max(rowid), 0) FROM fingerprints"
+        ).fetchone()[0]
+
+    def load(self, file_id: int) -> FileFingerprints:
+        """
+        Reads a file's fingerprints, the last one read is kept
+
+        Raises
+        ------
+            KeyError: if file_id isn't in the store
+        """
+        if self._loaded[0] == file_id:
+            return self._loaded[1]
+        row = self.connection.execute(
+            "SELECT num_hashes, first_row, last_row FROM files WHERE file_id = ?",
+            (file_id,),
+        ).fetchone()
+        if row is None:
+            raise KeyError(file_id)
+        num_hashes, first_row, last_row = row
+        rows = np.array(
+            self.connection.execute(
+                "SELECT hash, offset FROM fingerprints "
+                "WHERE rowid BETWEEN ? AND ? ORDER BY rowid",
+                (first_row, last_row),
+            ).fetchall(),
+            dtype=np.int64,
+        ).reshape(-1, 2)
+        fingerprints = FileFingerprints(
+            np.ascontiguousarray(rows[:, 0]).view(np.uint64),
+            rows[:, 1],
+            is_sorted=True,
+            num_hashes=num_hashes,
+        )
+        self._loaded = (file_id, fingerprints)
+        return fingerprints
+
+    def postings(self, hashes: np.ndarray):
+        """
+        Finds every occurrence of at most batch_size hashes
+
+        Returns
+        -------
+            hashes (array[uint64]), file_ids (array[int64]), offsets (array[int64]) ordered
+            by hash, then file_id, then the order the file's hashes were saved in
+        """
+        hashes = np.asarray(hashes, dtype=np.uint64).view(np.int64).tolist()
+        rows = np.array(
+            self.connection.execute(
+                "SELECT hash, file_id, offset, rowid FROM fingerprints "
+                f"WHERE hash IN ({','.join('?' * len(hashes))})",
+                hashes,
+            ).fetchall(),
+            dtype=np.int64,
+        ).reshape(-1, 4)
+        found = np.ascontiguousarray(rows[:, 0]).view(np.uint64)
+        order = np.lexsort((rows[:, 3], rows[:, 1], found))
+        return found[order], rows[order, 1], rows[order, 2]
+
+    def hash_stats(self, hashes: typing.Optional[np.ndarray] = None):
+        """
+        Document frequency and occurrence statistics of the given hashes, or every hash
+
+        Returns
+        -------
+            hashes (array[uint64]) that are stored, sorted, number of files each is in
+            (array[int64]), total occurrences (array[int64]), most occurrences in one
+            file (array[int64])
+        """
+        query = (
+            "SELECT hash, count(*), sum(occurrences), max(occurrences) FROM "
+            "(SELECT hash, file_id, count(*) AS occurrences FROM fingerprints{} "
+            "GROUP BY hash, file_id) GROUP BY hash"
+        )
+        if hashes is None:
+            rows = self.connection.execute(query.format("")).fetchall()
+        else:
+            hashes = np.asarray(hashes, dtype=np.uint64).view(np.int64).tolist()
+            rows = []
+            for start in range(0, len(hashes), self.batch_size):
+                batch = hashes[start : start + self.batch_size]
+                rows.extend(
+                    self.connection.execute(
+                        query.format(f" WHERE hash IN ({','.join('?' * len(batch))})"),
+                        batch,
+                    ).fetchall()
+                )
+        rows = np.array(rows, dtype=np.int64).reshape(-1, 4)
+        found = np.ascontiguousarray(rows[:, 0]).view(np.uint64)
+        order = np.argsort(found)
+        return found[order], rows[order, 1], rows[order, 2], rows[order, 3]
+
+    def insert(self, file_name: str, fingerprints: FileFingerprints) -> int:
+        """Adds a file in the current transaction, returns its file_id"""
+        connection = self.connection
+        first_row = connection.execute(
+            "SELECT coalesce(max(rowid), 0) + 1 FROM fingerprints"
+        ).fetchone()[0]
+        hashes = np.asarray(fingerprints.hashes).view(np.int64)
+        offsets = fingerprints.offsets
+        file_id = connection.execute(
+            "INSERT INTO files (file_name, num_hashes, first_row, last_row) "
+            "VALUES (?, ?, ?, ?)",
+            (file_name, len(fingerprints), first_row, first_row + len(hashes) - 1),
+        ).lastrowid
+        connection.executemany(
+            "INSERT INTO fingerprints (rowid, hash, file_id, offset) VALUES (?, ?, ?, ?)",
+            zip(
+                range(first_row, first_row + len(hashes)),
+                hashes.tolist(),
+                [file_id] * len(hashes),
+                offsets.tolist(),
+            ),
+        )
+        return file_id
+
+    def delete(self, file_id: int) -> None:
+        """Removes a file in the current transaction"""
+        first_row, last_row = self.connection.execute(
+            "SELECT first_row, last_row FROM files WHERE file_id = ?", (file_id,)
+        ).fetchone()
+        self.connection.execute(
+            "DELETE FROM fingerprints WHERE rowid BETWEEN ? AND ?", (first_row, last_row)
+        )
+        self.connection.execute("DELETE FROM files WHERE file_id = ?", (file_id,))
+        if self._loaded[0] == file_id:
+            self._loaded = (None, None)
+
+
+def write_sqlite(
+    filename: str,
+    fingerprinted_files: list,
+    config: FingerprintConfig,
+    append: bool = False,
+) -> None:
+    """
+    Saves fingerprinted files to an SQLite database in one transaction
+
+    Only differences are written. Files already saved under the same name are kept if
+    they were loaded from this database. Otherwise they're replaced, unless appending.
+    Saved files that aren't in fingerprinted_files are removed, unless appending.
+
+    Args
+    ----
+        filename (str): database to write, made if it doesn't exist
+        fingerprinted_files (list[[str, FileFingerprints]]): files to save
+        config (FingerprintConfig): config the files were fingerprinted with
+        append (bool): only adds files that aren't saved yet
+
+    Raises
+    ------
+        ValueError: if the database uses another hash encoding
+    """
+    store = _open(filename, create=True)
+    store.check_encoding(config)
+    with store.connection:
+        store.connection.execute(
+            "INSERT OR REPLACE INTO info (key, value) VALUES ('hash_encoding', ?)",
+            (config.hash_encoding,),
+        )
+        saved = {file_name: file_id for file_id, file_name, _ in store.files()}
+        names, inserts = set(), []
+        for file_name, fingerprints in fingerprinted_files:
+            if file_name in names:
+                continue
+            names.add(file_name)
+            if file_name in saved:
+                if append or (
+                    isinstance(fingerprints, StoredFingerprints)
+                    and isinstance(fingerprints.store, SQLiteStore)
+                    and fingerprints.store.is_path(filename)
+                    and fingerprints.file_id == saved[file_name]
+                ):
+                    continue
+                fingerprints = FileFingerprints(
+                    fingerprints.hashes,
+                    fingerprints.offsets,
+                    is_sorted=True,
+                    num_hashes=len(fingerprints),
+                )
+                store.delete(saved.pop(file_name))
+            inserts.append((file_name, fingerprints))
+        if not append:
+            for file_name, file_id in saved.items():
+                if file_name not in names:
+                    store.delete(file_id)
+        # building the index once is much faster than updating it for every row
+        rebuild_index = sum(len(x.hashes) for _, x in inserts) > store.num_rows()
+        if rebuild_index:
+            store.connection.execute("DROP INDEX fingerprints_hash")
+        for file_name, fingerprints in inserts:
+            store.insert(file_name, fingerprints)
+        if rebuild_index:
+            store.connection.execute(INDEX)
+    store.connection.close()
+
+
+def read_sqlite(filename: str, config: FingerprintConfig) -> list:
+    """
+    Opens an SQLite database without reading its fingerprints
+
+    Args
+    ----
+        filename (str): database to read
+        config (FingerprintConfig): fingerprints must use config's hash encoding
+
+    Raises
+    ------
+        FileNotFoundError: if filename doesn't exist
+        ValueError: if filename isn't a database or uses another hash encoding
+
+    Returns
+    -------
+        [fingerprinted_files, total_fingerprints, file_names] the same as json and
+        pickle files, with StoredFingerprints
+    """
+    store = _open(filename, create=False)
+    store.check_encoding(config)
+    files = store.files()
+    return [
+        [
+            [file_name, StoredFingerprints(store, file_id, num_hashes)]
+            for file_id, file_name, num_hashes in files
+        ],
+        sum(num_hashes for _, _, num_hashes in files),
+        [file_name for _, file_name, _ in files],
+    ]
+
+
+def _open(filename: str, create: bool) -> SQLiteStore:
+    if not create and not os.path.isfile(filename):
+        raise FileNotFoundError(filename)
+    try:
+        return SQLiteStore(filename)
+    except sqlite3.DatabaseError as e:
+        raise ValueError(f'"{filename}" is not an SQLite database: {e}')
@@ -0,0 +1,702 @@
+import typing
+
+import numpy as np
+
+from audalign.config.fingerprint import FingerprintConfig
+
+
+class FileFingerprints:
+    """
+    Fingerprints of one file stored column wise
+
+    hashes is a sorted uint64 array with one entry per occurrence of a hash, offsets is
+    the parallel uint32 array of where each occurrence happened. Offsets of the same hash
+    keep the order they were generated in.
+
+    len() is the number of distinct hashes, same as the length of the old
+    {hash: [offsets]} dictionaries.
+    """
+
+    __slots__ = ("hashes", "offsets", "num_hashes")
+
+    def __init__(
+        self,
+        hashes=None,
+        offsets=None,
+        is_sorted: bool = False,
+        num_hashes: typing.Optional[int] = None,
+    ):
+        hashes = np.asarray([] if hashes is None else hashes, dtype=np.uint64)
+        offsets = np.asarray([] if offsets is None else offsets, dtype=np.uint32)
+        if not is_sorted:
+            order = np.argsort(hashes, kind="stable")
+            hashes, offsets = hashes[order], offsets[order]
+        self.hashes = hashes
+        self.offsets = offsets
+        if num_hashes is None:
+            num_hashes = int(np.count_nonzero(np.diff(hashes))) + (len(hashes) > 0)
+        self.num_hashes = num_hashes
+
+    def __len__(self) -> int:
+        return self.num_hashes
+
+    def __repr__(self) -> str:
+        return f"FileFingerprints({self.num_hashes} hashes, {len(self.hashes)} offsets)"
+
+    def __getstate__(self):
+        return (self.hashes, self.offsets, self.num_hashes)
+
+    def __setstate__(self, state):
+        self.hashes, self.offsets, self.num_hashes = state
+
+    @property
+    def nbytes(self) -> int:
+        """bytes used by the hash and offset arrays"""
+        return self.hashes.nbytes + self.offsets.nbytes
+
+    @classmethod
+    def from_dict(cls, hash_dict: dict, config: FingerprintConfig):
+        """Builds from a {hash: [offsets]} dictionary, as saved in json and pickle files"""
+        lengths = [len(x) for x in hash_dict.values()]
+        hashes = np.repeat(
+            np.fromiter(
+                (hash_to_int(x, config) for x in hash_dict.keys()),
+                dtype=np.uint64,
+                count=len(hash_dict),
+            ),
+            lengths,
+        )
+        offsets = np.fromiter(
+            (offset for x in hash_dict.values() for offset in x),
+            dtype=np.uint32,
+            count=sum(lengths),
+        )
+        return cls(hashes, offsets)
+
+    @classmethod
+    def concatenate(cls, fingerprints: list):
+        """
+        Joins the fingerprints of consecutive parts of one file, like the blocks
+        of iter_fingerprints. Offsets of the same hash stay in order.
+        """
+        if len(fingerprints) == 0:
+            return cls()
+        return cls(
+            np.concatenate([x.hashes for x in fingerprints]),
+            np.concatenate([x.offsets for x in fingerprints]),
+        )
+
+    def to_dict(self, config: FingerprintConfig) -> dict:
+        """Returns the {hash: [offsets]} dictionary saved in json and pickle files"""
+        unique_hashes, starts, counts = self.unique()
+        offsets = self.offsets.tolist()
+        hash_dict = {}
+        for h, start, count in zip(
+            unique_hashes.tolist(), starts.tolist(), counts.tolist()
+        ):
+            hash_dict[int_to_hash(h, config)] = offsets[start : start + count]
+        return hash_dict
+
+    def unique(self):
+        """
+        Returns
+        -------
+            unique hashes (array[uint64]), start index of each in hashes (array[int]),
+            number of occurrences of each (array[int])
+        """
+        if len(self.hashes) == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return self.hashes, empty, empty
+        starts = np.flatnonzero(np.diff(self.hashes)) + 1
+        starts = np.concatenate(([0], starts))
+        counts = np.diff(np.append(starts, len(self.hashes)))
+        return self.hashes[starts], starts, counts
+
+    def drop_hashes(self, stopped: np.ndarray):
+        """
+        Returns the fingerprints without the stopped hashes
+
+        Args
+            stopped (array[bool]): True for each unique hash to drop, ordered like unique()
+        """
+        _, _, counts = self.unique()
+        keep = np.repeat(~stopped, counts)
+        return FileFingerprints(
+            self.hashes[keep],
+            self.offsets[keep],
+            is_sorted=True,
+            num_hashes=self.num_hashes - int(np.count_nonzero(stopped)),
+        )
+
+    def drop_common(self, max_occurrences: int):
+        """Returns the fingerprints without hashes that occur more than max_occurrences times"""
+        _, _, counts = self.unique()
+        return self.drop_hashes(counts > max_occurrences)
+
+    def lookup(self, hashes: np.ndarray):
+        """
+        Finds where every given hash occurs with np.searchsorted
+
+        Returns
+        -------
+            start index (array[int]), end index (array[int]) of each hash in self.hashes.
+            start == end if the hash isn't here.
+        """
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        return (
+            np.searchsorted(self.hashes, hashes, side="left"),
+            np.searchsorted(self.hashes, hashes, side="right"),
+        )
+
+
+class StoredFingerprints(FileFingerprints):
+    """
+    Fingerprints of a file that stay in a store, like SQLiteStore
+
+    hashes and offsets are loaded from the store each time they're used, FingerprintIndex
+    looks up stored files through store.postings instead. The store must have
+    load(file_id) -> FileFingerprints, postings(hashes) -> (hashes, file_ids, offsets)
+    of every occurrence of the given hashes, ordered by hash then by file order, with a
+    batch_size limit on the number of hashes, and hash_stats(hashes) the same as
+    FingerprintIndex.hash_stats.
+    """
+
+    __slots__ = ("store", "file_id")
+
+    def __init__(self, store, file_id: int, num_hashes: int):
+        self.store = store
+        self.file_id = file_id
+        self.num_hashes = num_hashes
+
+    def __repr__(self) -> str:
+        return f"StoredFingerprints({self.num_hashes} hashes, file {self.file_id} of {self.store})"
+
+    def __reduce__(self):
+        # pickles as the loaded fingerprints, stores hold connections
+        return (FileFingerprints, (self.hashes, self.offsets, True, self.num_hashes))
+
+    @property
+    def hashes(self) -> np.ndarray:
+        return self.store.load(self.file_id).hashes
+
+    @property
+    def offsets(self) -> np.ndarray:
+        return self.store.load(self.file_id).offsets
+
+
+def hash_to_int(h, config: FingerprintConfig) -> int:
+    """
+    Turns a hash key into the integer stored in FileFingerprints
+
+    packed hashes already are integers, sha1 hex digests keep their first 64 bits
+    """
+    if config.hash_encoding == "packed":
+        return int(h)
+    return int(h[0:16], 16)
+
+
+def int_to_hash(h: int, config: FingerprintConfig):
+    """Inverse of hash_to_int"""
+    if config.hash_encoding == "packed":
+        return h
+    return f"{h:0{min(config.FINGERPRINT_REDUCTION, 16)}x}"
+
+
+def expand_postings(
+    target_starts: np.ndarray,
+    target_counts: np.ndarray,
+    against_starts: np.ndarray,
+    against_counts: np.ndarray,
+):
+    """
+    Builds the cross product of target and against occurrences of shared hashes
+
+    Args
+        target_starts, target_counts: where each shared hash's occurrences are in the target
+        against_starts, against_counts: where each shared hash's occurrences are in the against
+
+    Returns
+    -------
+        target indexes (array[int]), against indexes (array[int]) of every matching pair
+    """
+    pair_counts = target_counts * against_counts
+    total = int(pair_counts.sum())
+    if total == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty
+    shared = np.repeat(np.arange(len(pair_counts)), pair_counts)
+    within = np.arange(total) - np.repeat(np.cumsum(pair_counts) - pair_counts, pair_counts)
+    against_counts = against_counts[shared]
+    return (
+        target_starts[shared] + within // against_counts,
+        against_starts[shared] + within % against_counts,
+    )
+
+
+def match_offsets(target: FileFingerprints, against: FileFingerprints):
+    """
+    Finds every pair of occurrences of the same hash in target and against
+
+    Returns
+    -------
+        target offsets (array[int64]), against offsets (array[int64])
+    """
+    target_hashes, target_starts, target_counts = target.unique()
+    against_starts, against_ends = against.lookup(target_hashes)
+    shared = against_ends > against_starts
+    target_index, against_index = expand_postings(
+        target_starts[shared],
+        target_counts[shared],
+        against_starts[shared],
+        (against_ends - against_starts)[shared],
+    )
+    return (
+        target.offsets[target_index].astype(np.int64),
+        against.offsets[against_index].astype(np.int64),
+    )
+
+
+class FingerprintIndex:
+    """
+    Inverted index over every fingerprinted file
+
+    hashes is a sorted uint64 array of every hash occurrence of every file, with
+    file_ids and offsets as parallel arrays. Occurrences of the same hash are ordered
+    by file_id, which increases in the order files are added, then by offset order
+    within the file.
+
+    Added files are kept pending and merged in on the next lookup, removed files are
+    dropped at the same time, so fingerprinting a directory merges once.
+
+    StoredFingerprints aren't merged in, their occurrences are looked up in their store
+    a batch of hashes at a time, so the stored files never have to fit in memory.
+    """
+
+    def __init__(self):
+        self.hashes = np.zeros(0, dtype=np.uint64)
+        self.file_ids = np.zeros(0, dtype=np.uint32)
+        self.offsets = np.zeros(0, dtype=np.uint32)
+        self.file_names = {}  # file_id: file_name
+        self._ids = {}  # file_name: file_id
+        self._fingerprints = {}  # file_id: FileFingerprints
+        self._next_id = 0
+        self._pending = []
+        self._removed = set()
+        self._stored = {}  # store: {store file_id: file_id}
+        self._stats = None
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, file_name: str) -> bool:
+        return file_name in self._ids
+
+    def add(self, file_name: str, fingerprints: FileFingerprints) -> None:
+        """Adds file to the index, replacing an indexed file of the same name"""
+        if file_name in self._ids:
+            if self._fingerprints[self._ids[file_name]] is fingerprints:
+                return
+            self.remove(file_name)
+        file_id = self._next_id
+        self._next_id += 1
+        self._ids[file_name] = file_id
+        self.file_names[file_id] = file_name
+        self._fingerprints[file_id] = fingerprints
+        if isinstance(fingerprints, StoredFingerprints):
+            self._stored.setdefault(fingerprints.store, {})[fingerprints.file_id] = file_id
+        else:
+            self._pending.append(file_id)
+
+    def remove(self, file_name: str) -> None:
+        """Removes file from the index. Raises KeyError if it isn't indexed"""
+        file_id = self._ids.pop(file_name)
+        del self.file_names[file_id]
+        fingerprints = self._fingerprints.pop(file_id)
+        if isinstance(fingerprints, StoredFingerprints):
+            del self._stored[fingerprints.store][fingerprints.file_id]
+        elif file_id in self._pending:
+            self._pending.remove(file_id)
+        else:
+            self._removed.add(file_id)
+
+    def clear(self) -> None:
+        self.__init__()
+
+    def sync(self, fingerprinted_files: list) -> None:
+        """
+        Makes the index match fingerprinted_files, for when the list was changed
+        directly instead of through the recognizer. Only the differences are updated,
+        then merged in.
+        """
+        current = {}
+        for file_name, fingerprints in fingerprinted_files:
+            current.setdefault(file_name, fingerprints)
+        for file_name in [x for x in self._ids if x not in current]:
+            self.remove(file_name)
+        for file_name, fingerprints in current.items():
+            self.add(file_name, fingerprints)
+        self._merge()
+
+    def _merge(self) -> None:
+        if len(self._removed) > 0 or len(self._pending) > 0:
+            self._stats = None
+        if len(self._removed) > 0:
+            keep = ~np.isin(
+                self.file_ids, np.fromiter(self._removed, dtype=np.uint32)
+            )
+            self.hashes = self.hashes[keep]
+            self.file_ids = self.file_ids[keep]
+            self.offsets = self.offsets[keep]
+            self._removed = set()
+        if len(self._pending) > 0:
+            pending = [self._fingerprints[x] for x in self._pending]
+            hashes = np.concatenate([x.hashes for x in pending])
+            offsets = np.concatenate([x.offsets for x in pending])
+            file_ids = np.repeat(
+                np.array(self._pending, dtype=np.uint32),
+                [len(x.hashes) for x in pending],
+            )
+            order = np.argsort(hashes, kind="stable")
+            hashes, file_ids, offsets = hashes[order], file_ids[order], offsets[order]
+            # new file_ids are higher than all indexed ones, so they go after equal hashes
+            positions = np.searchsorted(self.hashes, hashes, side="right")
+            self.hashes = np.insert(self.hashes, positions, hashes)
+            self.file_ids = np.insert(self.file_ids, positions, file_ids)
+            self.offsets = np.insert(self.offsets, positions, offsets)
+            self._pending = []
+
+    def _shared_postings(self, target: FileFingerprints):
+        """where target's hashes that are also indexed are, in target and in the index"""
+        self._merge()
+        target_hashes, target_starts, target_counts = target.unique()
+        starts = np.searchsorted(self.hashes, target_hashes, side="left")
+        ends = np.searchsorted(self.hashes, target_hashes, side="right")
+        shared = ends > starts
+        return (
+            target_starts[shared],
+            target_counts[shared],
+            starts[shared],
+            (ends - starts)[shared],
+        )
+
+    def _memory_stats(self):
+        """hash_stats of the files that aren't stored, kept until the index changes"""
+        self._merge()
+        if self._stats is None and len(self.hashes) == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            self._stats = (self.hashes, empty, empty, empty)
+        elif self._stats is None:
+            new_hash = np.diff(self.hashes) != 0
+            new_file = new_hash | (np.diff(self.file_ids) != 0)
+            # a run is one hash's occurrences in one file
+            run_starts = np.flatnonzero(np.concatenate(([True], new_file)))
+            run_lengths = np.diff(np.append(run_starts, len(self.hashes)))
+            hash_starts = np.flatnonzero(np.concatenate(([True], new_hash)))
+            hash_runs = np.searchsorted(run_starts, hash_starts)
+            self._stats = (
+                self.hashes[hash_starts],
+                np.diff(np.append(hash_runs, len(run_starts))),
+                np.diff(np.append(hash_starts, len(self.hashes))),
+                np.maximum.reduceat(run_lengths, hash_runs),
+            )
+        return self._stats
+
+    def hash_stats(self, hashes: typing.Optional[np.ndarray] = None):
+        """
+        Document frequency and occurrence statistics of indexed hashes. Stored files
+        count every file in their store.
+
+        Args
+            hashes (array[uint64], None): sorted unique hashes to get statistics of.
+                None gets every indexed hash
+
+        Returns
+        -------
+            hashes (array[uint64]), number of files each is in (array[int64]), total
+            occurrences (array[int64]), most occurrences in one file (array[int64]).
+            Zeros for given hashes that aren't indexed.
+        """
+        sources = [self._memory_stats()]
+        for store, ids in self._stored.items():
+            if len(ids) > 0:
+                sources.append(store.hash_stats(hashes))
+        if hashes is None and len(sources) == 1:
+            return sources[0]
+        if hashes is None:
+            # every source is sorted and unique already
+            hashes = np.sort(np.concatenate([x[0] for x in sources]))
+            hashes = hashes[np.append(True, hashes[1:] != hashes[:-1])]
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        document_frequency = np.zeros(len(hashes), dtype=np.int64)
+        occurrences = np.zeros(len(hashes), dtype=np.int64)
+        max_occurrences = np.zeros(len(hashes), dtype=np.int64)
+        for source_hashes, source_frequency, source_occurrences, source_max in sources:
+            if len(source_hashes) == 0:
+                continue
+            positions = np.minimum(
+                np.searchsorted(source_hashes, hashes), len(source_hashes) - 1
+            )
+            found = source_hashes[positions] == hashes
+            positions = positions[found]
+            document_frequency[found] += source_frequency[positions]
+            occurrences[found] += source_occurrences[positions]
+            max_occurrences[found] = np.maximum(
+                max_occurrences[found], source_max[positions]
+            )
+        return hashes, document_frequency, occurrences, max_occurrences
+
+    def stop_list(
+        self,
+        hashes: np.ndarray,
+        max_occurrences: typing.Optional[int] = None,
+        max_files: typing.Optional[float] = None,
+    ) -> np.ndarray:
+        """
+        Which of the given sorted unique hashes are on the stop list
+
+        Args
+            hashes (array[uint64]): sorted unique hashes
+            max_occurrences (int, None): stops hashes with more occurrences in one file
+            max_files (float, None): stops hashes in more files, below 1 a proportion of
+                the indexed files
+
+        Returns
+        -------
+            stopped (array[bool]): True for each stopped hash
+        """
+        _, document_frequency, _, most_occurrences = self.hash_stats(hashes)
+        stopped = np.zeros(len(hashes), dtype=bool)
+        if max_occurrences is not None:
+            stopped |= most_occurrences > max_occurrences
+        if max_files is not None:
+            if max_files < 1:
+                max_files = max_files * len(self)
+            stopped |= document_frequency > max_files
+        return stopped
+
+    def _exclude_ids(self, exclude: typing.Iterable[str]) -> np.ndarray:
+        return np.array(
+            [self._ids[x] for x in exclude if x in self._ids], dtype=np.uint32
+        )
+
+    def match(self, target: FileFingerprints, exclude: typing.Iterable[str] = ()):
+        """
+        Finds every occurrence of the target's hashes in the indexed files
+
+        Args
+            target (FileFingerprints): fingerprints to look up
+            exclude (iterable[str]): file names to leave out of the results
+
+        Returns
+        -------
+            file_ids (array[uint32]), target offsets (array[int64]), against offsets
+            (array[int64]). Grouped by file_id in the order files were added, then
+            ordered by hash.
+        """
+        target_index, index = expand_postings(*self._shared_postings(target))
+        file_ids = self.file_ids[index]
+        exclude_ids = self._exclude_ids(exclude)
+        if len(exclude_ids) > 0:
+            keep = ~np.isin(file_ids, exclude_ids)
+            file_ids, target_index, index = (
+                file_ids[keep],
+                target_index[keep],
+                index[keep],
+            )
+        matches = [
+            (
+                file_ids,
+                target.offsets[target_index].astype(np.int64),
+                self.offsets[index].astype(np.int64),
+            )
+        ]
+        matches.extend(x[:3] for x in self._iter_stored(target, exclude_ids))
+        file_ids, t_offsets, a_offsets = [
+            np.concatenate([x[i] for x in matches]) for i in range(3)
+        ]
+        order = np.argsort(file_ids, kind="stable")
+        return file_ids[order], t_offsets[order], a_offsets[order]
+
+    def iter_match(
+        self,
+        target: FileFingerprints,
+        exclude: typing.Iterable[str] = (),
+        max_matches: int = 2**20,
+    ):
+        """
+        Same as match, but yields the matches in blocks of about max_matches at a time.
+        A hash with more matches than max_matches gets a block to itself.
+
+        Yields
+        ------
+            file_ids (array[uint32]), target offsets (array[int64]), against offsets
+            (array[int64]), match order (array[int64]). Sorting a file's matches by
+            match order gives the order match returns them in.
+        """
+        target_starts, target_counts, starts, counts = self._shared_postings(target)
+        exclude_ids = self._exclude_ids(exclude)
+        block_bounds = _block_bounds(target_counts * counts, max_matches)
+        for start, end in zip(block_bounds[:-1], block_bounds[1:]):
+            target_index, index = expand_postings(
+                target_starts[start:end],
+                target_counts[start:end],
+                starts[start:end],
+                counts[start:end],
+            )
+            file_ids = self.file_ids[index]
+            if len(exclude_ids) > 0:
+                keep = ~np.isin(file_ids, exclude_ids)
+                file_ids, target_index, index = (
+                    file_ids[keep],
+                    target_index[keep],
+                    index[keep],
+                )
+            yield (
+                file_ids,
+                target.offsets[target_index].astype(np.int64),
+                self.offsets[index].astype(np.int64),
+                target_index * len(self.hashes) + index,
+            )
+        yield from self._iter_stored(target, exclude_ids, max_matches)
+
+    def iter_pairs(
+        self,
+        skip: typing.Optional[np.ndarray] = None,
+        max_matches: int = 2**20,
+        part: typing.Optional[tuple] = None,
+    ):
+        """
+        Finds every pair of occurrences of the same hash in two indexed files, once
+        per unordered pair. Stored files aren't in the index arrays and are left out.
+
+        Args
+            skip (array[uint64], None): sorted hashes to leave out
+            max_matches (int): about how many pairs are looked at per block. A hash
+                with more gets a block to itself
+            part ((int, int), None): (i, n) only goes through every nth block from
+                the ith, so n processes can split the pairs
+
+        Yields
+        ------
+            file_ids of the file added first (array[uint32]) and of the file added last
+            (array[uint32]), their offsets (array[int64], array[int64]), and the match
+            order of each pair when recognizing either file (array[int64],
+            array[int64]). Sorting a pair of files' matches by match order gives the
+            order match returns them in for that file.
+        """
+        self._merge()
+        starts = np.flatnonzero(np.diff(self.hashes)) + 1
+        if len(self.hashes) > 0:
+            starts = np.concatenate(([0], starts))
+        counts = np.diff(np.append(starts, len(self.hashes)))
+        several = counts > 1
+        if skip is not None and len(skip) > 0:
+            several &= ~np.isin(self.hashes[starts], skip)
+        starts, counts = starts[several], counts[several]
+        block_bounds = _block_bounds(counts * (counts - 1) // 2, max_matches)
+        blocks = list(zip(block_bounds[:-1], block_bounds[1:]))
+        if part is not None:
+            blocks = blocks[part[0] :: part[1]]
+        for start, end in blocks:
+            first, second = _expand_pairs(starts[start:end], counts[start:end])
+            # a hash's occurrences are ordered by file_id
+            different = self.file_ids[first] < self.file_ids[second]
+            first, second = first[different], second[different]
+            yield (
+                self.file_ids[first],
+                self.file_ids[second],
+                self.offsets[first].astype(np.int64),
+                self.offsets[second].astype(np.int64),
+                first * len(self.hashes) + second,
+                second * len(self.hashes) + first,
+            )
+
+    def _iter_stored(
+        self,
+        target: FileFingerprints,
+        exclude_ids: np.ndarray,
+        max_matches: typing.Optional[int] = None,
+    ):
+        """
+        Same as iter_match for the stored files. Looks up store.batch_size of the
+        target's hashes at a time, yielding one block per batch if max_matches is None
+        """
+        target_hashes, target_starts, target_counts = target.unique()
+        for store, ids in self._stored.items():
+            store_ids = np.fromiter(ids.keys(), dtype=np.int64, count=len(ids))
+            file_ids = np.fromiter(ids.values(), dtype=np.uint32, count=len(ids))
+            keep = ~np.isin(file_ids, exclude_ids)
+            store_ids, file_ids = store_ids[keep], file_ids[keep]
+            if len(store_ids) == 0:
+                continue
+            order = np.argsort(store_ids)
+            store_ids, file_ids = store_ids[order], file_ids[order]
+            match_count = 0
+            for batch_start in range(0, len(target_hashes), store.batch_size):
+                batch = slice(batch_start, batch_start + store.batch_size)
+                hashes, posting_ids, offsets = store.postings(target_hashes[batch])
+                # leaves out stored files that aren't in the index
+                positions = np.minimum(
+                    np.searchsorted(store_ids, posting_ids), len(store_ids) - 1
+                )
+                indexed = store_ids[positions] == posting_ids
+                hashes, posting_ids, offsets = (
+                    hashes[indexed],
+                    file_ids[positions[indexed]],
+                    offsets[indexed],
+                )
+                starts = np.searchsorted(hashes, target_hashes[batch], side="left")
+                ends = np.searchsorted(hashes, target_hashes[batch], side="right")
+                shared = ends > starts
+                batch_starts = target_starts[batch][shared]
+                batch_counts = target_counts[batch][shared]
+                starts, counts = starts[shared], (ends - starts)[shared]
+                block_bounds = (
+                    [0, len(starts)]
+                    if max_matches is None
+                    else _block_bounds(batch_counts * counts, max_matches)
+                )
+                for start, end in zip(block_bounds[:-1], block_bounds[1:]):
+                    target_index, index = expand_postings(
+                        batch_starts[start:end],
+                        batch_counts[start:end],
+                        starts[start:end],
+                        counts[start:end],
+                    )
+                    yield (
+                        posting_ids[index],
+                        target.offsets[target_index].astype(np.int64),
+                        offsets[index].astype(np.int64),
+                        match_count + np.arange(len(index)),
+                    )
+                    match_count += len(index)
+
+
+def _expand_pairs(starts: np.ndarray, counts: np.ndarray):
+    """
+    Every pair of positions i < j within each run of counts positions from starts
+
+    Returns
+    -------
+        first positions (array[int]), second positions (array[int]) ordered by run,
+        then by first position, then by second
+    """
+    # one row per first position, with the positions after it in the run
+    row_counts = counts - 1
+    rows = np.arange(int(row_counts.sum()))
+    row_runs = np.repeat(np.arange(len(counts)), row_counts)
+    within = rows - np.repeat(np.cumsum(row_counts) - row_counts, row_counts)
+    row_firsts = starts[row_runs] + within
+    row_lengths = counts[row_runs] - 1 - within
+    pairs = np.arange(int(row_lengths.sum()))
+    first = np.repeat(row_firsts, row_lengths)
+    second = first + 1 + pairs - np.repeat(np.cumsum(row_lengths) - row_lengths, row_lengths)
+    return first, second
+
+
+def _block_bounds(pair_counts: np.ndarray, max_matches: int) -> list:
+    """bounds of consecutive blocks of about max_matches pairs"""
+    _, block_starts = np.unique(
+        (np.cumsum(pair_counts) - pair_counts) // max_matches, return_index=True
+    )
+    return np.append(block_starts, len(pair_counts)).tolist()
@@ -1,4 +1,3 @@
-import multiprocessing
 import os
 import sys
 import time
@@ -9,6 +8,7 @@ import matplotlib.pyplot as plt
 import numpy as np
 import tqdm
 from audalign.config.visual import VisualConfig
+from audalign.executor import get_pool
 from audalign.filehandler import find_files, get_shifted_file, read
 from PIL import Image
 from pydub.exceptions import CouldntDecodeError
@@ -246,19 +246,10 @@ def visrecognize_directory(
         for file_path in against_files:
             results_list += [_visrecognize_directory_(file_path)]
     else:
-        try:
-            nprocesses = config.num_processors or multiprocessing.cpu_count()
-        except NotImplementedError:
-            nprocesses = 1
-        else:
-            nprocesses = 1 if nprocesses <= 0 else nprocesses
-
-        with multiprocessing.Pool(nprocesses) as pool:
+        with get_pool(config.num_processors) as pool:
             results_list = pool.map(
                 _visrecognize_directory_, tqdm.tqdm(list(against_files))
             )
-            pool.close()
-            pool.join()
 
     file_match = {}
     for i in results_list:
@@ -332,21 +323,14 @@ def _visrecognize(
     # calculate all mse and ssim values
     if use_multiprocessing == True and sys.platform not in ["linux", "darwin"]:
 
-        try:
-            nprocesses = num_processes or multiprocessing.cpu_count()
-        except NotImplementedError:
-            nprocesses = 1
-        else:
-            nprocesses = 1 if nprocesses <= 0 else nprocesses
-
-        index_list = divy_index_list(
-            index_list, transposed_target_arr2d, transposed_against_arr2d, nprocesses
-        )
-
-        with multiprocessing.Pool(nprocesses) as pool:
+        with get_pool(num_processes) as pool:
+            index_list = divy_index_list(
+                index_list,
+                transposed_target_arr2d,
+                transposed_against_arr2d,
+                pool.processes,
+            )
             results_list = pool.map(_calculate_comp_values, tqdm.tqdm(list(index_list)))
-            pool.close()
-            pool.join()
     else:
         index_list = divy_index_list(
             index_list, transposed_target_arr2d, transposed_against_arr2d, 1
@@ -0,0 +1,73 @@
+"""
+Benchmarks aligning every file against every other, one recognize per file
+against recognize_all's single pass over the fingerprint index
+
+Builds libraries of files cut from one long stream of random fingerprints, so
+every pair of overlapping files has a true offset, and checks that both ways
+give the same match_info.
+
+    python benchmarks/bench_all_pairs.py
+    python benchmarks/bench_all_pairs.py --files 10 50 200 --hashes 20000
+"""
+
+import argparse
+import contextlib
+import io
+import time
+
+import numpy as np
+
+import audalign.recognizers.fingerprint.recognize as recognize
+from audalign.recognizers.fingerprint import FingerprintRecognizer
+from audalign.recognizers.fingerprint.store import FileFingerprints
+
+
+def library(num_files: int, num_hashes: int, vocabulary: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    # about 10 hashes per frame, files are cut from anywhere in the stream
+    stream_hashes = rng.integers(0, vocabulary, num_hashes * 4, dtype=np.uint64)
+    stream_offsets = np.sort(rng.integers(0, num_hashes * 4 // 10, num_hashes * 4))
+    recognizer = FingerprintRecognizer()
+    for i in range(num_files):
+        start = int(rng.integers(0, len(stream_hashes) - num_hashes))
+        offsets = stream_offsets[start : start + num_hashes]
+        fingerprints = FileFingerprints(
+            stream_hashes[start : start + num_hashes],
+            (offsets - offsets[0]).astype(np.uint32),
+        )
+        recognizer.add_filename(f"file_{i}.wav", [f"file_{i}.wav", fingerprints])
+    return recognizer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, nargs="+", default=[10, 50, 100])
+    parser.add_argument("--hashes", type=int, default=10000)
+    parser.add_argument("--vocabulary", type=int, default=2**24)
+    parser.add_argument("--max-lags", type=float, default=None)
+    args = parser.parse_args()
+
+    print(f"{'files':>6} {'per file s':>10} {'all pairs s':>11} {'speedup':>8}")
+    for num_files in args.files:
+        recognizer = library(num_files, args.hashes, args.vocabulary)
+        recognizer.config.max_lags = args.max_lags
+        file_paths = list(recognizer.file_names)
+        with contextlib.redirect_stdout(io.StringIO()):
+            t = time.perf_counter()
+            per_file = [
+                recognize.recognize(recognizer, x, recognizer.config) for x in file_paths
+            ]
+            per_file_time = time.perf_counter() - t
+            t = time.perf_counter()
+            all_pairs = recognize.recognize_all(recognizer, file_paths, recognizer.config)
+            all_pairs_time = time.perf_counter() - t
+        for a, b in zip(per_file, all_pairs):
+            assert (a is None and b is None) or a["match_info"] == b["match_info"]
+        print(
+            f"{num_files:>6} {per_file_time:>10.2f} {all_pairs_time:>11.2f} "
+            f"{per_file_time / all_pairs_time:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
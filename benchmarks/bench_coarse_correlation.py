@@ -0,0 +1,92 @@
+"""
+Benchmarks correlating two long recordings at every lag against coarse to fine
+(coarse_find_peaks), energy envelopes first and then only the lags around their
+peaks
+
+The recordings are noise with a slowly changing loudness, so their envelopes
+have peaks to find. The offset is within --max-lags if it's given. Checks both
+find the same best offset.
+
+    python benchmarks/bench_coarse_correlation.py
+    python benchmarks/bench_coarse_correlation.py --minutes 60 --coarse-rates 100 500
+"""
+
+import argparse
+import time
+
+import numpy as np
+import scipy.signal as signal
+
+from audalign.recognizers.correcognize.correcognize import (
+    _find_peaks,
+    coarse_find_peaks,
+    correlate_lags,
+)
+
+
+def recording(length: int, sample_rate: int, rng) -> np.ndarray:
+    # loudness changes about ten times a second
+    loudness = np.abs(rng.normal(size=length // (sample_rate // 10) + 2))
+    loudness = np.interp(
+        np.arange(length), np.arange(len(loudness)) * (sample_rate // 10), loudness
+    )
+    return rng.normal(size=length) * loudness
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--minutes", type=float, default=10)
+    parser.add_argument("--sample-rate", type=int, default=8000)
+    parser.add_argument("--coarse-rates", type=int, nargs="+", default=[100, 500])
+    parser.add_argument("--max-lags", type=float, default=None)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    length = int(args.minutes * 60 * args.sample_rate)
+    source = recording(2 * length, args.sample_rate, rng)
+    max_shift = length
+    if args.max_lags is not None:
+        max_shift = min(length, int(args.max_lags * args.sample_rate))
+    shift = int(rng.integers(0, max_shift))
+    a = source[:length]
+    b = source[shift : shift + length // 2] + rng.normal(size=length // 2)
+    min_lag, max_lag = -(len(b) - 1), len(a) - 1
+    if args.max_lags is not None:
+        max_lags = int(args.max_lags * args.sample_rate)
+        min_lag, max_lag = max(min_lag, -max_lags), min(max_lag, max_lags)
+        first_lag = min_lag
+    print(f"{len(a)} and {len(b)} samples, offset {shift / args.sample_rate:.4f}s")
+
+    t = time.perf_counter()
+    if args.max_lags is None:
+        correlation, first_lag = signal.correlate(a, b), None
+    else:
+        correlation = correlate_lags(a, b, min_lag, max_lag)
+    full = _find_peaks(correlation, (len(a), len(b)), 0, 30, None, 65536, first_lag=first_lag)
+    full_time = time.perf_counter() - t
+    print(f"{'coarse Hz':>9} {'seconds':>8} {'speedup':>8} {'offset s':>9}")
+    print(f"{'every lag':>9} {full_time:>8.2f} {'':>8} {full[0][0][0] / args.sample_rate:>9.4f}")
+    for coarse_rate in args.coarse_rates:
+        t = time.perf_counter()
+        coarse = coarse_find_peaks(
+            a,
+            b,
+            min_lag,
+            max_lag,
+            filter_matches=0,
+            match_len_filter=30,
+            SCALING_16_BIT=65536,
+            factor=args.sample_rate // coarse_rate,
+            num_candidates=10,
+            refine_lags=int(0.05 * args.sample_rate),
+        )
+        coarse_time = time.perf_counter() - t
+        assert coarse[0][0][0] == full[0][0][0]
+        print(
+            f"{coarse_rate:>9} {coarse_time:>8.2f} {full_time / coarse_time:>7.1f}x "
+            f"{coarse[0][0][0] / args.sample_rate:>9.4f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmarks correlation alignments file by file against all pairs (all_pairs)
+
+Writes libraries of wav files cut from one long noise recording, so every
+overlapping pair of files has a true offset, then aligns them with
+CorrelationRecognizer both ways and checks the offsets are the same. File by
+file decodes, filters and correlates both files of every pair in each direction,
+all pairs decodes and FFTs every file once and correlates each pair once.
+
+    python benchmarks/bench_correlation_all_pairs.py
+    python benchmarks/bench_correlation_all_pairs.py --files 10 50 --seconds 30
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+import numpy as np
+from scipy.io import wavfile
+
+import audalign as ad
+
+
+def library(directory: str, num_files: int, seconds: float, sample_rate: int):
+    rng = np.random.default_rng(0)
+    length = int(seconds * sample_rate)
+    recording = rng.normal(0, 3000, length * 4).astype(np.int16)
+    for i in range(num_files):
+        start = int(rng.integers(0, len(recording) - length))
+        wavfile.write(
+            os.path.join(directory, f"file_{i}.wav"),
+            sample_rate,
+            recording[start : start + length],
+        )
+
+
+def align(directory: str, all_pairs: bool, max_lags):
+    recognizer = ad.CorrelationRecognizer()
+    recognizer.config.all_pairs = all_pairs
+    recognizer.config.multiprocessing = False
+    recognizer.config.max_lags = max_lags
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(
+        io.StringIO()
+    ):
+        t = time.perf_counter()
+        result = ad.align(directory, recognizer=recognizer)
+        run_time = time.perf_counter() - t
+    offsets = {
+        (name, against): match["offset_seconds"]
+        for name, alignment in result["match_info"].items()
+        for against, match in alignment["match_info"].items()
+    }
+    return run_time, offsets
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, nargs="+", default=[10, 50, 100])
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--sample-rate", type=int, default=8000)
+    parser.add_argument("--max-lags", type=float, default=None)
+    args = parser.parse_args()
+
+    print(f"{'files':>6} {'per file s':>10} {'all pairs s':>11} {'speedup':>8}")
+    for num_files in args.files:
+        with tempfile.TemporaryDirectory() as directory:
+            library(directory, num_files, args.seconds, args.sample_rate)
+            per_file_time, per_file = align(directory, False, args.max_lags)
+            all_pairs_time, all_pairs = align(directory, True, args.max_lags)
+        assert per_file == all_pairs
+        print(
+            f"{num_files:>6} {per_file_time:>10.2f} {all_pairs_time:>11.2f} "
+            f"{per_file_time / all_pairs_time:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmarks saving and loading fingerprints as json, pickle, afdb and sqlite
+
+Builds a library of random fingerprints, saves it in every format and reports
+the save time, load time and tracemalloc peak of loading. Every format must
+load the same fingerprints. Then adds --new files to the afdb library, by
+rewriting it and by appending a segment, and times compacting the segments.
+
+    python benchmarks/bench_database.py
+    python benchmarks/bench_database.py --files 2000 --hashes 50000 --new 30
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from audalign.recognizers.fingerprint import FingerprintRecognizer, database
+from audalign.recognizers.fingerprint.store import FileFingerprints
+
+
+def library(
+    num_files: int, num_hashes: int, seed: int = 0, first: int = 0
+) -> FingerprintRecognizer:
+    rng = np.random.default_rng(seed)
+    recognizer = FingerprintRecognizer()
+    for i in range(first, first + num_files):
+        # sha1 hashes keep FINGERPRINT_REDUCTION hex digits, 20 by default so 64 bits
+        fingerprints = FileFingerprints(
+            rng.integers(0, 2**64, num_hashes, dtype=np.uint64),
+            rng.integers(0, 2**16, num_hashes, dtype=np.uint32),
+        )
+        recognizer.add_filename(f"file_{i}.wav", [f"file_{i}.wav", fingerprints])
+    return recognizer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--hashes", type=int, default=20000)
+    parser.add_argument("--new", type=int, default=20)
+    parser.add_argument("--formats", nargs="+", default=["json", "pickle", "afdb", "sqlite"])
+    args = parser.parse_args()
+
+    recognizer = library(args.files, args.hashes)
+    print(f"{args.files} files, {recognizer.total_fingerprints} fingerprints")
+    print(f"{'format':>7} {'MB':>7} {'save s':>7} {'load s':>7} {'load MB':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        for extension in args.formats:
+            filename = os.path.join(directory, f"fingerprints.{extension}")
+            t = time.perf_counter()
+            recognizer.save_fingerprinted_files(filename)
+            save_time = time.perf_counter() - t
+
+            tracemalloc.start()
+            t = time.perf_counter()
+            loaded = FingerprintRecognizer(load_fingerprints_file=filename)
+            load_time = time.perf_counter() - t
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            assert loaded.file_names == recognizer.file_names
+            for (_, original), (_, fingerprints) in zip(
+                recognizer.fingerprinted_files, loaded.fingerprinted_files
+            ):
+                assert np.array_equal(original.hashes, fingerprints.hashes)
+                assert np.array_equal(original.offsets, fingerprints.offsets)
+            print(
+                f"{extension:>7} {os.path.getsize(filename) / 2**20:>7.1f} "
+                f"{save_time:>7.2f} {load_time:>7.3f} {peak / 2**20:>8.1f}"
+            )
+
+        filename = os.path.join(directory, "library.afdb")
+        recognizer.save_fingerprinted_files(filename)
+        new_files = library(args.new, args.hashes, seed=1, first=args.files)
+        for file_name, fingerprints in new_files.fingerprinted_files:
+            recognizer.add_filename(file_name, [file_name, fingerprints])
+        t = time.perf_counter()
+        recognizer.save_fingerprinted_files(filename)
+        rewrite_time = time.perf_counter() - t
+
+        appended = os.path.join(directory, "appended.afdb")
+        library(args.files, args.hashes).save_fingerprinted_files(appended)
+        t = time.perf_counter()
+        recognizer.save_fingerprinted_files(appended, append=True)
+        append_time = time.perf_counter() - t
+        t = time.perf_counter()
+        database.compact_database(appended)
+        compact_time = time.perf_counter() - t
+        loaded = FingerprintRecognizer(load_fingerprints_file=appended)
+        assert loaded.file_names == recognizer.file_names
+        print(
+            f"adding {args.new} files: rewrite {rewrite_time:.3f}s, "
+            f"append {append_time:.3f}s, compact {compact_time:.3f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Benchmarks the batched hash generator against the original nested loop hashing
+
+Runs every hash style at every accuracy level on the same peaks, checks both
+produce the exact same fingerprints, and prints the timings. The packed
+hash encoding is timed alongside and must produce the same number of
+distinct hashes.
+
+    python benchmarks/bench_hashes.py
+    python benchmarks/bench_hashes.py --file test_audio/test_shifts/Eigen-20sec.mp3
+"""
+
+import argparse
+import hashlib
+import time
+
+import numpy as np
+
+import audalign.filehandler as filehandler
+import audalign.recognizers.fingerprint.fingerprinter as fingerprinter
+from audalign.config.fingerprint import FingerprintConfig
+
+HASH_STYLES = ["base", "panako_mod", "panako", "base_three"]
+
+
+def loop_hashes(peaks, config: FingerprintConfig):
+    """The original nested loop hashing, kept here as the reference"""
+    hash_dict = {}
+    pairs = config.hash_style == "base"
+    for i in range(len(peaks)):
+        freq1, t1 = peaks[i]
+        for j in range(1, config.default_fan_value - (0 if pairs else 1)):
+            if i + j >= len(peaks):
+                continue
+            freq2, t2 = peaks[i + j]
+            if pairs:
+                t_delta = t2 - t1
+                if config.min_hash_time_delta <= t_delta <= config.max_hash_time_delta:
+                    hash_strings = [f"{freq1}|{freq2}|{t_delta}"]
+                else:
+                    hash_strings = []
+            else:
+                hash_strings = []
+                for k in range(j + 1, config.default_fan_value):
+                    if i + k >= len(peaks):
+                        continue
+                    freq3, t3 = peaks[i + k]
+                    t_delta1, t_delta2 = t3 - t1, t2 - t1
+                    if not (
+                        config.min_hash_time_delta
+                        <= t_delta1
+                        <= config.max_hash_time_delta
+                        and config.min_hash_time_delta
+                        <= t_delta2
+                        <= config.max_hash_time_delta
+                    ):
+                        continue
+                    if config.hash_style == "panako_mod":
+                        hash_strings += [
+                            f"{freq1-freq2}|{freq2-freq3}|{t_delta2/t_delta1:.8f}"
+                        ]
+                    elif config.hash_style == "panako":
+                        hash_strings += [
+                            f"{freq1-freq2}|{freq2-freq3}|{freq1//400}|{freq3//400}|{t_delta2/t_delta1:.8f}"
+                        ]
+                    else:
+                        hash_strings += [
+                            f"{freq1}|{freq2}|{freq3}|{t_delta1}|{t_delta2}"
+                        ]
+            for hash_string in hash_strings:
+                h = hashlib.sha1(hash_string.encode("utf-8")).hexdigest()[
+                    0 : config.FINGERPRINT_REDUCTION
+                ]
+                hash_dict.setdefault(h, []).append(int(t1))
+    return hash_dict
+
+
+def synthetic_peaks(seconds: float, peaks_per_second: float, config: FingerprintConfig):
+    """random peaks with roughly the density of real recordings"""
+    rng = np.random.default_rng(0)
+    frames_per_second = config.sample_rate / (
+        config.fft_window_size * config.DEFAULT_OVERLAP_RATIO
+    )
+    num_peaks = int(seconds * peaks_per_second)
+    times = np.sort(rng.integers(0, int(seconds * frames_per_second), num_peaks))
+    freqs = rng.integers(10, config.fft_window_size // 2, num_peaks)
+    return list(zip(freqs.tolist(), times.tolist()))
+
+
+def file_peaks(file_path: str, config: FingerprintConfig):
+    captured = {}
+    generate_hashes = fingerprinter.generate_hashes
+    fingerprinter.generate_hashes = lambda peaks, config: captured.setdefault(
+        "peaks", list(peaks)
+    )
+    try:
+        channel, _ = filehandler.read(file_path, sample_rate=config.sample_rate)
+        fingerprinter.fingerprint(channel, config=config)
+    finally:
+        fingerprinter.generate_hashes = generate_hashes
+    return captured["peaks"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--file", help="take peaks from this audio file")
+    parser.add_argument("--seconds", type=float, default=30.0)
+    parser.add_argument("--peaks-per-second", type=float, default=12.0)
+    parser.add_argument("--accuracies", type=int, nargs="+", default=[1, 2, 3, 4])
+    args = parser.parse_args()
+
+    print(f"{'accuracy':>8} {'hash_style':>11} {'hashes':>9} {'loop s':>8} {'batched s':>9} {'speedup':>7} {'packed s':>8}")
+    for accuracy in args.accuracies:
+        config = FingerprintConfig()
+        config.set_accuracy(accuracy)
+        if args.file:
+            peaks = file_peaks(args.file, config)
+        else:
+            peaks = synthetic_peaks(args.seconds, args.peaks_per_second, config)
+        sorted_peaks = sorted(peaks, key=lambda x: x[1])
+        for hash_style in HASH_STYLES:
+            config.set_hash_style(hash_style)
+
+            t = time.perf_counter()
+            loop_dict = loop_hashes(sorted_peaks, config)
+            loop_time = time.perf_counter() - t
+
+            t = time.perf_counter()
+            batched = fingerprinter.generate_hashes(peaks, config)
+            batched_time = time.perf_counter() - t
+
+            assert batched.to_dict(config) == {
+                h[0:16]: offsets for h, offsets in loop_dict.items()
+            }
+            num_hashes = len(batched.hashes)
+            num_distinct = len(batched)
+            del loop_dict, batched
+
+            config.set_hash_encoding("packed")
+            t = time.perf_counter()
+            packed = fingerprinter.generate_hashes(peaks, config)
+            packed_time = time.perf_counter() - t
+            config.set_hash_encoding("sha1")
+            assert len(packed) == num_distinct
+            del packed
+
+            print(
+                f"{accuracy:>8} {hash_style:>11} {num_hashes:>9} {loop_time:>8.2f} "
+                f"{batched_time:>9.2f} {loop_time / batched_time:>6.1f}x {packed_time:>8.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Benchmarks recognition against 10, 100 and 1,000 indexed files
+
+Times looking up one target in the global FingerprintIndex against matching it
+file by file, as find_matches used to, and checks both find the same matches.
+Library files are random except one, which contains the target.
+
+    python benchmarks/bench_index.py
+    python benchmarks/bench_index.py --files 10 100 1000 10000 --seconds 60
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+import audalign.recognizers.fingerprint.fingerprinter as fingerprinter
+import audalign.recognizers.fingerprint.recognize as recognize
+from audalign.config.fingerprint import FingerprintConfig
+from audalign.recognizers.fingerprint import FingerprintRecognizer
+from audalign.recognizers.fingerprint.store import match_offsets
+
+sys.path.insert(0, __file__.rsplit("/", 1)[0])
+from bench_hashes import synthetic_peaks  # noqa: E402
+
+
+def random_peaks(rng, seconds, peaks_per_second, config: FingerprintConfig):
+    frames = int(
+        seconds * config.sample_rate / (config.fft_window_size * config.DEFAULT_OVERLAP_RATIO)
+    )
+    num_peaks = int(seconds * peaks_per_second)
+    times = np.sort(rng.integers(0, frames, num_peaks))
+    freqs = rng.integers(10, config.fft_window_size // 2, num_peaks)
+    return list(zip(freqs.tolist(), times.tolist()))
+
+
+def per_file_matches(recognizer, target_name):
+    """find_matches before the global index"""
+    target = recognizer.fingerprinted_files[recognizer.file_names.index(target_name)][1]
+    matches = []
+    for file_name, fingerprints in recognizer.fingerprinted_files:
+        if file_name.lower() != target_name.lower():
+            t_offsets, a_offsets = match_offsets(target, fingerprints)
+            for t_offset, a_offset in zip(t_offsets.tolist(), a_offsets.tolist()):
+                matches.append([file_name, a_offset - t_offset, t_offset, a_offset])
+    return matches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--seconds", type=float, default=30.0)
+    parser.add_argument("--peaks-per-second", type=float, default=12.0)
+    parser.add_argument("--hash-encoding", default="packed")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    config = FingerprintConfig()
+    config.set_hash_encoding(args.hash_encoding)
+    rng = np.random.default_rng(0)
+    target_peaks = synthetic_peaks(args.seconds, args.peaks_per_second, config)
+    shift = 100
+    # the matching file starts shift frames before the target
+    containing_peaks = random_peaks(rng, args.seconds, args.peaks_per_second, config)
+    containing_peaks = [x for x in containing_peaks if x[1] < shift] + [
+        (f, t + shift) for f, t in target_peaks
+    ]
+
+    recognizer = FingerprintRecognizer(config)
+    recognizer.add_filename(
+        "target", ["target", fingerprinter.generate_hashes(target_peaks, config)]
+    )
+    recognizer.add_filename(
+        "contains_target",
+        ["contains_target", fingerprinter.generate_hashes(containing_peaks, config)],
+    )
+
+    print(f"{'files':>6} {'offsets':>10} {'index s':>8} {'per file s':>10} {'speedup':>7} {'add s':>8} {'matches':>8}")
+    for num_files in args.files:
+        t = time.perf_counter()
+        while len(recognizer.file_names) - 1 < num_files:
+            name = f"random_{len(recognizer.file_names)}"
+            peaks = random_peaks(rng, args.seconds, args.peaks_per_second, config)
+            recognizer.add_filename(
+                name, [name, fingerprinter.generate_hashes(peaks, config)]
+            )
+        recognizer.fingerprint_index._merge()
+        add_time = time.perf_counter() - t
+
+        index_time = per_file_time = float("inf")
+        for _ in range(args.repeat):
+            t = time.perf_counter()
+            matches = recognize.find_matches(recognizer, "target")
+            index_time = min(index_time, time.perf_counter() - t)
+
+            t = time.perf_counter()
+            expected = per_file_matches(recognizer, "target")
+            per_file_time = min(per_file_time, time.perf_counter() - t)
+        file_names, file_index, t_offsets, a_offsets = matches
+        assert expected == [
+            [file_names[i], a - t, t, a]
+            for i, t, a in zip(file_index.tolist(), t_offsets.tolist(), a_offsets.tolist())
+        ]
+        print(
+            f"\r{num_files:>6} {len(recognizer.fingerprint_index.hashes):>10} {index_time:>8.4f} "
+            f"{per_file_time:>10.4f} {per_file_time / index_time:>6.1f}x {add_time:>8.2f} {len(t_offsets):>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
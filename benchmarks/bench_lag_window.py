@@ -0,0 +1,71 @@
+"""
+Benchmarks correlating two long recordings within max_lags, the full correlation
+zeroed outside max_lags against only the lags within max_lags (correlate_lags)
+
+Times the correlation and the peak search after it, and checks both find the
+same peak offsets.
+
+    python benchmarks/bench_lag_window.py
+    python benchmarks/bench_lag_window.py --minutes 60 --max-lags 0.01 0.5 2 30
+"""
+
+import argparse
+import time
+
+import numpy as np
+import scipy.signal as signal
+
+from audalign.recognizers.correcognize.correcognize import _find_peaks, correlate_lags
+
+
+def peaks(correlation, lengths, max_lags, first_lag=None):
+    return _find_peaks(
+        correlation,
+        lengths,
+        filter_matches=0,
+        match_len_filter=30,
+        max_lags=max_lags,
+        SCALING_16_BIT=65536,
+        first_lag=first_lag,
+    )[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--minutes", type=float, default=10)
+    parser.add_argument("--sample-rate", type=int, default=8000)
+    parser.add_argument("--max-lags", type=float, nargs="+", default=[0.005, 0.5, 2, 10])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    length = int(args.minutes * 60 * args.sample_rate)
+    recording = rng.normal(size=length + args.sample_rate)
+    # b starts a quarter second into a
+    a = recording[:length]
+    b = recording[args.sample_rate // 4 : args.sample_rate // 4 + length]
+    b = b + rng.normal(size=length)
+
+    print(f"{length} samples each")
+    print(f"{'max lags s':>10} {'full s':>7} {'window s':>8} {'speedup':>8}")
+    for max_lags in args.max_lags:
+        max_lags = int(max_lags * args.sample_rate)
+        t = time.perf_counter()
+        full = peaks(signal.correlate(a, b), (len(a), len(b)), max_lags)
+        full_time = time.perf_counter() - t
+        t = time.perf_counter()
+        window = peaks(
+            correlate_lags(a, b, -max_lags, max_lags),
+            (len(a), len(b)),
+            max_lags,
+            first_lag=max(-max_lags, -(len(b) - 1)),
+        )
+        window_time = time.perf_counter() - t
+        assert full[0][0] == window[0][0]
+        print(
+            f"{max_lags / args.sample_rate:>10} {full_time:>7.3f} {window_time:>8.3f} "
+            f"{full_time / window_time:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
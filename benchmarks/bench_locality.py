@@ -0,0 +1,224 @@
+"""
+Benchmarks locality alignment against the original sliding window loops
+
+Generates matches for one file the way a long field recording would produce
+them: most matches at a few true offsets, the rest random. Checks both give
+the exact same {offset: [confidence, [loc_tups]]} and prints the timings.
+
+    python benchmarks/bench_locality.py
+    python benchmarks/bench_locality.py --matches 1000 10000 50000 --locality 10
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from audalign.config.fingerprint import FingerprintConfig
+from audalign.recognizers.fingerprint.recognize import _locality_align_file
+
+
+def loop_locality_align_file(
+    file_matches: list, locality: int, locality_filter_prop: float
+):
+    """
+    The original locality_align_matches body for one file, kept here as the reference
+
+    Args
+        file_matches (list): [(sample_difference, t_offset, a_offset)]
+
+    Returns
+    -------
+        temp_file_dict (dict): {offset: [confidence, [loc_tups]]}
+    """
+    temp_file_dict = {}
+    start_window = 0
+    end_window = 1
+    last_end = 1
+
+    # sorts by t_offset
+    file_matches = sorted(file_matches, key=lambda x: x[1])
+
+    while (
+        end_window < len(file_matches) - 1
+        and file_matches[end_window][1] - file_matches[start_window][1]
+        <= locality
+    ):
+        end_window += 1
+        last_end = end_window
+
+    # moves end while there's room and locality is
+    while True:  # end_window <= len(file_matches):
+
+        # {(toff, aoff): {samp_diff : confidence}}
+        toff_dict = loop_find_loc_matches(
+            file_matches[start_window:end_window], locality
+        )
+
+        # combines and turns into {offset: [confidence, [loc_tups]]}
+        for tup, samp_dict in toff_dict.items():
+            for samp_diff, confidence in samp_dict.items():
+                if temp_file_dict.get(samp_diff) is None:
+                    temp_file_dict[samp_diff] = [confidence, []]
+                elif temp_file_dict[samp_diff][0] < confidence:
+                    temp_file_dict[samp_diff][0] = confidence
+                temp_file_dict[samp_diff][1] += [(*tup, confidence)]
+
+        # breaks out of while if at end of file and within locality
+        if end_window >= len(file_matches):
+            break
+
+        while True:
+            start_window += 1
+            while (
+                end_window <= len(file_matches) - 1
+                and file_matches[end_window][1]
+                - file_matches[start_window][1]
+                <= locality
+            ):
+                end_window += 1
+            if end_window >= len(file_matches):
+                break
+            if end_window > last_end:
+                last_end = end_window
+                break
+
+    # # filter to top 30
+    if len(temp_file_dict.keys()) > 30:
+        temp_file_list = [
+            (samp_diff, conf_loc) for samp_diff, conf_loc in temp_file_dict.items()
+        ]
+        temp_file_list = sorted(
+            temp_file_list, key=lambda x: x[1][0], reverse=True
+        )  # sort by confidence
+        temp_file_dict = {}
+        for i in range(30):
+            temp_file_dict[temp_file_list[i][0]] = temp_file_list[i][1]
+
+    # locality_filter_prop
+    for _, matches in temp_file_dict.items():
+        index = 0
+        while index < len(matches[1]):
+            if matches[1][index][2] < matches[0] * locality_filter_prop:
+                matches[1].pop(index)
+                continue
+            index += 1
+
+    return temp_file_dict
+
+
+def loop_find_loc_matches(matches_list: list, locality: int):
+    """receives from align matches locality,
+        matcheslist = [(sample_difference, t_offset, a_offset)]
+
+    Args:
+        matches_list (list): [(sample_difference, t_offset, a_offset)]
+        locality (int): [description]
+
+    Returns:
+        [dict]: {(toff, aoff): {samp_diff : confidence}}
+    """
+    # matches_list = list(set(matches_list))
+
+    a_matches = sorted(matches_list, key=lambda x: x[2])
+    temp_file_dict = {}
+    start_window = 0
+    end_window = 0
+    last_end = 0
+
+    while (
+        end_window < len(a_matches) - 1
+        and a_matches[end_window + 1][2] - a_matches[start_window][2] <= locality
+    ):
+        end_window += 1
+        last_end = end_window
+
+    while True:  # end_window <= len(a_matches):
+
+        loc_tup = (
+            ((matches_list[-1][1] - matches_list[0][1]) // 2) + matches_list[0][1],
+            ((a_matches[end_window][2] - a_matches[start_window][2]) // 2)
+            + a_matches[start_window][2],
+        )
+        # loc_tup = ( # Old version
+        #     (matches_list[-1][1] - matches_list[0][1]) // 2,
+        #     (a_matches[end_window][2] - a_matches[start_window][2]) // 2,
+        # )
+        temp_file_dict[loc_tup] = {}
+        for sample_difference, t_offset, a_offset in a_matches[start_window:end_window]:
+            if sample_difference not in temp_file_dict[loc_tup].keys():
+                temp_file_dict[loc_tup][sample_difference] = 0
+            temp_file_dict[loc_tup][sample_difference] += 1
+        # gives us temp_file_dict--- {(toff, aoff): {samp_diff : confidence}}
+
+        # breaks out of while if at end of file and within locality
+
+        if end_window >= len(a_matches) - 1:
+            break
+
+        while True:
+            start_window += 1
+            while (
+                end_window < len(a_matches) - 1
+                and a_matches[end_window + 1][2] - a_matches[start_window][2]
+                <= locality
+            ):
+                end_window += 1
+            if end_window >= len(a_matches) - 1:
+                break
+            if end_window > last_end:
+                last_end = end_window
+                break
+
+    return temp_file_dict
+
+
+def synthetic_matches(rng, num_matches: int, frames: int):
+    true_offsets = rng.integers(-frames // 2, frames // 2, 3)
+    t_offsets = rng.integers(0, frames, num_matches)
+    a_offsets = t_offsets + rng.choice(true_offsets, num_matches)
+    noise = rng.random(num_matches) < 0.5
+    a_offsets[noise] = rng.integers(0, frames, np.count_nonzero(noise))
+    a_offsets = np.abs(a_offsets)
+    return a_offsets - t_offsets, t_offsets, a_offsets
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--matches", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--minutes", type=float, default=30.0, help="length of the recording")
+    parser.add_argument("--locality", type=float, default=10.0, help="in seconds")
+    parser.add_argument("--locality-filter-prop", type=float, default=0.6)
+    args = parser.parse_args()
+
+    config = FingerprintConfig()
+    frame_seconds = config.fft_window_size / config.sample_rate * config.DEFAULT_OVERLAP_RATIO
+    frames = int(args.minutes * 60 / frame_seconds)
+    locality = max(int(args.locality // frame_seconds), 1)
+    rng = np.random.default_rng(0)
+
+    print(f"{'matches':>8} {'loop s':>8} {'sweep s':>8} {'speedup':>7}")
+    for num_matches in args.matches:
+        sample_differences, t_offsets, a_offsets = synthetic_matches(
+            rng, num_matches, frames
+        )
+        t = time.perf_counter()
+        expected = loop_locality_align_file(
+            list(zip(sample_differences.tolist(), t_offsets.tolist(), a_offsets.tolist())),
+            locality,
+            args.locality_filter_prop,
+        )
+        loop_time = time.perf_counter() - t
+
+        t = time.perf_counter()
+        result = _locality_align_file(
+            sample_differences, t_offsets, a_offsets, locality, args.locality_filter_prop
+        )
+        sweep_time = time.perf_counter() - t
+
+        assert list(result.items()) == list(expected.items())
+        print(f"{num_matches:>8} {loop_time:>8.2f} {sweep_time:>8.2f} {loop_time / sweep_time:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Benchmarks correlating every pair of locality windows of two long recordings,
+signal.correlate pair by pair against calc_corrs' batched rFFTs (_locality_corrs)
+
+Only the correlations are timed, not the peak search after them, and the first
+pairs are checked to be the same both ways.
+
+    python benchmarks/bench_locality_correlation.py
+    python benchmarks/bench_locality_correlation.py --minutes 60 --locality 30 --max-lags 60
+"""
+
+import argparse
+import itertools
+import time
+
+import numpy as np
+import scipy.signal as signal
+
+from audalign.recognizers.correcognize.correcognize import calc_corrs, find_index_arr
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--minutes", type=float, default=2)
+    parser.add_argument("--sample-rate", type=int, default=8000)
+    parser.add_argument("--locality", type=float, nargs="+", default=[2, 5, 30])
+    parser.add_argument("--max-lags", type=float, default=None)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    length = int(args.minutes * 60 * args.sample_rate)
+    a, b = rng.normal(size=length), rng.normal(size=length)
+    max_lags = None
+    if args.max_lags is not None:
+        max_lags = int(args.max_lags * args.sample_rate)
+
+    print(f"{length} samples each")
+    print(f"{'locality s':>10} {'pairs':>7} {'per pair s':>10} {'batched s':>9} {'speedup':>8}")
+    for locality in args.locality:
+        locality = int(locality * args.sample_rate)
+        indexes = find_index_arr(a, b, locality, max_lags, 0.5)
+        t = time.perf_counter()
+        for i, j in indexes:
+            signal.correlate(a[i : i + locality], b[j : j + locality])
+        per_pair_time = time.perf_counter() - t
+        t = time.perf_counter()
+        for _ in calc_corrs(a, b, locality, indexes, max_lags):
+            pass
+        batched_time = time.perf_counter() - t
+        for (correlation, _), (i, j) in itertools.islice(
+            calc_corrs(a, b, locality, indexes, max_lags), 20
+        ):
+            expected = signal.correlate(a[i : i + locality], b[j : j + locality])
+            assert np.allclose(correlation, expected)
+        print(
+            f"{locality / args.sample_rate:>10g} {len(indexes):>7} {per_pair_time:>10.2f} "
+            f"{batched_time:>9.2f} {per_pair_time / batched_time:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
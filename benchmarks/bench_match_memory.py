@@ -0,0 +1,74 @@
+"""
+Benchmarks peak memory of recognition with and without FingerprintConfig.stream_matches
+
+Builds a library of random fingerprints drawn from few distinct hashes, so a
+recognition finds many matches, and reports the tracemalloc peak and time of
+recognizing one file against it both ways. Both must give the same results.
+
+    python benchmarks/bench_match_memory.py
+    python benchmarks/bench_match_memory.py --files 50 --offsets 500000 --locality 10
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+import audalign.recognizers.fingerprint.recognize as recognize
+from audalign.recognizers.fingerprint import FingerprintRecognizer
+from audalign.recognizers.fingerprint.store import FileFingerprints
+
+
+def measure(recognizer, config):
+    tracemalloc.start()
+    t = time.perf_counter()
+    result = recognize.recognize(recognizer, "file_0", config)
+    run_time = time.perf_counter() - t
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    result.pop("match_time")
+    return result, peak, run_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--offsets", type=int, default=200000, help="hash occurrences per file")
+    parser.add_argument("--distinct", type=int, default=100000, help="distinct hashes overall")
+    parser.add_argument("--frames", type=int, default=20000, help="length of each file in frames")
+    parser.add_argument("--locality", type=float, default=None)
+    parser.add_argument("--match-block", type=int, default=2**20)
+    parser.add_argument("--match-len-filter", type=int, default=30)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    recognizer = FingerprintRecognizer()
+    for i in range(args.files):
+        name = f"file_{i}"
+        fingerprints = FileFingerprints(
+            rng.integers(0, args.distinct, args.offsets).astype(np.uint64),
+            rng.integers(0, args.frames, args.offsets),
+        )
+        recognizer.add_filename(name, [name, fingerprints])
+    config = recognizer.config
+    config.locality = args.locality
+    config.MATCH_BLOCK = args.match_block
+    config.match_len_filter = args.match_len_filter
+    num_matches = len(recognize.find_matches(recognizer, "file_0")[2])
+
+    config.stream_matches = False
+    result, peak, run_time = measure(recognizer, config)
+    config.stream_matches = True
+    stream_result, stream_peak, stream_time = measure(recognizer, config)
+    assert result == stream_result
+
+    print()
+    print(f"matches: {num_matches}")
+    print(f"{'':>10} {'peak MB':>9} {'time s':>7}")
+    print(f"{'collected':>10} {peak / 2**20:>9.1f} {run_time:>7.2f}")
+    print(f"{'streamed':>10} {stream_peak / 2**20:>9.1f} {stream_time:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
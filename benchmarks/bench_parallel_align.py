@@ -0,0 +1,76 @@
+"""
+Benchmarks the recognition phase of fingerprint alignments over worker counts
+
+Builds a library of files cut from one long stream of random fingerprints and
+times the recognition of every file the way align does it (align_all_hook), for
+every num_processors. Without locality the index's pairs are split over the
+workers, with --locality every worker recognizes some of the files. Workers are
+forked and share the fingerprint index copy-on-write.
+
+    python benchmarks/bench_parallel_align.py
+    python benchmarks/bench_parallel_align.py --files 200 --workers 1 2 4 8 16 32
+    python benchmarks/bench_parallel_align.py --locality 5
+"""
+
+import argparse
+import contextlib
+import io
+import multiprocessing
+import time
+
+import numpy as np
+
+from audalign.recognizers.fingerprint import FingerprintRecognizer
+from audalign.recognizers.fingerprint.store import FileFingerprints
+
+
+def library(num_files: int, num_hashes: int, vocabulary: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    # about 10 hashes per frame, files are cut from anywhere in the stream
+    stream_hashes = rng.integers(0, vocabulary, num_hashes * 4, dtype=np.uint64)
+    stream_offsets = np.sort(rng.integers(0, num_hashes * 4 // 10, num_hashes * 4))
+    recognizer = FingerprintRecognizer()
+    for i in range(num_files):
+        start = int(rng.integers(0, len(stream_hashes) - num_hashes))
+        offsets = stream_offsets[start : start + num_hashes]
+        fingerprints = FileFingerprints(
+            stream_hashes[start : start + num_hashes],
+            (offsets - offsets[0]).astype(np.uint32),
+        )
+        recognizer.add_filename(f"file_{i}.wav", [f"file_{i}.wav", fingerprints])
+    return recognizer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=100)
+    parser.add_argument("--hashes", type=int, default=10000)
+    parser.add_argument("--vocabulary", type=int, default=2**24)
+    parser.add_argument("--locality", type=float, default=None)
+    parser.add_argument("--match-block", type=int, default=2**18)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    recognizer = library(args.files, args.hashes, args.vocabulary)
+    recognizer.config.locality = args.locality
+    recognizer.config.MATCH_BLOCK = args.match_block
+    file_paths = list(recognizer.file_names)
+    print(f"{args.files} files, {recognizer.total_fingerprints} fingerprints, ", end="")
+    print(f"{multiprocessing.cpu_count()} cpus")
+    print(f"{'workers':>7} {'seconds':>8} {'speedup':>8}")
+    expected, base_time = None, None
+    for workers in args.workers:
+        recognizer.config.num_processors = workers
+        with contextlib.redirect_stdout(io.StringIO()):
+            t = time.perf_counter()
+            results = recognizer.align_all_hook(file_paths, file_paths, False, None)
+            run_time = time.perf_counter() - t
+        results = [None if x is None else x["match_info"] for x in results]
+        if expected is None:
+            expected, base_time = results, run_time
+        assert results == expected
+        print(f"{workers:>7} {run_time:>8.2f} {base_time / run_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
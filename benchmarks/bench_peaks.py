@@ -0,0 +1,96 @@
+"""
+Benchmarks get_2D_peaks against the original filter/zip peak extraction
+
+Takes the spectrogram of an audio file at every accuracy level, checks the
+"sparse", "iterated" and "footprint" peak filters all find the exact same
+peaks as the original, and prints the timings.
+
+    python benchmarks/bench_peaks.py
+    python benchmarks/bench_peaks.py --file test_audio/test_shifts/Eigen-song-base.mp3
+"""
+
+import argparse
+import time
+
+import numpy as np
+from scipy.ndimage import (
+    binary_erosion,
+    generate_binary_structure,
+    iterate_structure,
+    maximum_filter,
+)
+
+import audalign.filehandler as filehandler
+import audalign.recognizers.fingerprint.fingerprinter as fingerprinter
+from audalign.config.fingerprint import FingerprintConfig
+
+
+def loop_peaks(arr2D, config: FingerprintConfig):
+    """The original peak extraction, kept here as the reference"""
+    struct = generate_binary_structure(2, 1)
+    neighborhood = iterate_structure(struct, config.peak_neighborhood_size)
+    local_max = maximum_filter(arr2D, footprint=neighborhood) == arr2D
+    background = arr2D == 0
+    eroded_background = binary_erosion(
+        background, structure=neighborhood, border_value=1
+    )
+    detected_peaks = local_max ^ eroded_background
+    amps = arr2D[detected_peaks]
+    j, i = np.where(detected_peaks)
+    peaks_filtered = filter(
+        lambda x: x[2] > config.default_amp_min, zip(i, j, amps.flatten())
+    )
+    frequency_idx = []
+    time_idx = []
+    for x in peaks_filtered:
+        frequency_idx.append(x[1])
+        time_idx.append(x[0])
+    return list(zip(frequency_idx, time_idx))
+
+
+def spectrogram(file_path: str, config: FingerprintConfig):
+    channel, _ = filehandler.read(file_path, sample_rate=config.sample_rate)
+    arr2D = fingerprinter.fingerprint(channel, config=config, retspec=True)
+    freq_start = int(np.argmax(np.any(arr2D != 0, axis=1)))
+    return arr2D, freq_start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--file", default="test_audio/test_shifts/Eigen-song-base.mp3"
+    )
+    parser.add_argument("--accuracies", type=int, nargs="+", default=[1, 2, 3, 4])
+    args = parser.parse_args()
+
+    config = FingerprintConfig()
+    arr2D, freq_start = spectrogram(args.file, config)
+    print(f"spectrogram {arr2D.shape}, bins below {freq_start} zeroed")
+    print(
+        f"{'accuracy':>8} {'peaks':>7} {'loop s':>8} {'footprint s':>11} "
+        f"{'iterated s':>10} {'sparse s':>8} {'speedup':>7}"
+    )
+    for accuracy in args.accuracies:
+        config.set_accuracy(accuracy)
+
+        t = time.perf_counter()
+        reference = loop_peaks(arr2D, config)
+        loop_time = time.perf_counter() - t
+
+        timings = {}
+        for peak_filter in ["footprint", "iterated", "sparse"]:
+            config.peak_filter = peak_filter
+            t = time.perf_counter()
+            peaks = fingerprinter.get_2D_peaks(arr2D, config, freq_start=freq_start)
+            timings[peak_filter] = time.perf_counter() - t
+            assert [tuple(peak) for peak in peaks.tolist()] == reference
+
+        print(
+            f"{accuracy:>8} {len(reference):>7} {loop_time:>8.2f} "
+            f"{timings['footprint']:>11.2f} {timings['iterated']:>10.2f} "
+            f"{timings['sparse']:>8.2f} {loop_time / timings['sparse']:>6.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
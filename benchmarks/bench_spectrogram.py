@@ -0,0 +1,103 @@
+"""
+Benchmarks the "mlab" and "scipy" spectrogram engines for every recognizer that uses them
+
+Runs the spectrogram step of the fingerprint, correlation spectrogram and
+visual recognizers on the same file with both engines and reports the time
+and tracemalloc peak of each. The fingerprint peaks must be the same and
+the spectrograms must agree within MAX_DIFF wherever they're louder than
+QUIET.
+
+    python benchmarks/bench_spectrogram.py
+    python benchmarks/bench_spectrogram.py --file test_audio/test_shifts/Eigen-20sec.mp3 --fft-workers -1
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+import audalign.filehandler as filehandler
+import audalign.recognizers.fingerprint.fingerprinter as fingerprinter
+from audalign.config.correlation_spectrogram import CorrelationSpectrogramConfig
+from audalign.config.fingerprint import FingerprintConfig
+from audalign.config.visual import VisualConfig
+from audalign.recognizers.correcognizeSpectrogram.correcognize_spectrogram import (
+    get_array,
+)
+from audalign.recognizers.visrecognize.visrecognize import get_arrays
+
+# float32 FFT noise swamps the quietest cells, they're left out of the comparison
+QUIET = -50
+MAX_DIFF = 0.05
+
+
+def fingerprint_peaks(file_path: str, config: FingerprintConfig):
+    channel, _ = filehandler.read(file_path, sample_rate=config.sample_rate)
+    arr2D = fingerprinter.fingerprint(channel, config, retspec=True)
+    return arr2D, fingerprinter.get_2D_peaks(arr2D, config)
+
+
+RECOGNIZERS = {
+    "fingerprint": (FingerprintConfig, fingerprint_peaks),
+    "correlation_spectrogram": (
+        CorrelationSpectrogramConfig,
+        lambda file_path, config: (get_array(file_path, None, config, None, None),),
+    ),
+    "visual": (
+        VisualConfig,
+        lambda file_path, config: get_arrays(file_path, config=config),
+    ),
+}
+
+
+def measure(function, file_path: str, config):
+    tracemalloc.start()
+    t = time.perf_counter()
+    result = function(file_path, config)
+    run_time = time.perf_counter() - t
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, peak, run_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--file", default="test_audio/test_shifts/Eigen-song-base.mp3"
+    )
+    parser.add_argument("--fft-workers", type=int, default=None)
+    parser.add_argument(
+        "--recognizers", nargs="+", default=list(RECOGNIZERS), choices=list(RECOGNIZERS)
+    )
+    args = parser.parse_args()
+
+    print(
+        f"{'recognizer':>23} {'mlab s':>7} {'scipy s':>7} {'speedup':>7} "
+        f"{'mlab MB':>8} {'scipy MB':>8} {'max diff':>8}"
+    )
+    for name in args.recognizers:
+        config_class, function = RECOGNIZERS[name]
+        results = {}
+        for engine in ["mlab", "scipy"]:
+            config = config_class()
+            config.spectrogram_engine = engine
+            config.fft_workers = args.fft_workers
+            results[engine] = measure(function, args.file, config)
+
+        (mlab_result, mlab_peak, mlab_time) = results["mlab"]
+        (scipy_result, scipy_peak, scipy_time) = results["scipy"]
+        loud = mlab_result[0] > QUIET
+        max_diff = np.max(np.abs(mlab_result[0][loud] - scipy_result[0][loud]))
+        assert max_diff < MAX_DIFF
+        if name == "fingerprint":
+            assert np.array_equal(mlab_result[1], scipy_result[1])
+
+        print(
+            f"{name:>23} {mlab_time:>7.2f} {scipy_time:>7.2f} {mlab_time / scipy_time:>6.1f}x "
+            f"{mlab_peak / 2**20:>8.1f} {scipy_peak / 2**20:>8.1f} {max_diff:>8.4f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Benchmarks the hash stop list on the test_audio fixtures
+
+Fingerprints every test_audio file once, then recognizes each file against the
+rest for every stop_max_occurrences setting. Reports the number of matches
+found, the recognition time, and whether the best offset of each recognized
+file stays the same as without a stop list, with its confidence.
+
+--hum mixes a steady tone into every file first, like mains hum or a fan, whose
+repeated hashes are what the stop list is for.
+
+    python benchmarks/bench_stop_list.py
+    python benchmarks/bench_stop_list.py --accuracy 3 --max-occurrences 1 2 4 8
+    python benchmarks/bench_stop_list.py --hum 1000
+"""
+
+import argparse
+import os
+import subprocess
+import tempfile
+import time
+
+import audalign as ad
+import audalign.recognizers.fingerprint.recognize as recognize
+
+
+def recognize_all(recognizer, files: list, config):
+    """recognition time, total matches and {(target, against): (offset, confidence)}"""
+    recognizer.config = config
+    num_matches, run_time = 0, 0
+    best = {}
+    for file_path in files:
+        num_matches += len(recognize.find_matches(recognizer, file_path)[1])
+        t = time.perf_counter()
+        result = recognizer.recognize(file_path)
+        run_time += time.perf_counter() - t
+        if result is None:
+            continue
+        for name, match in result["match_info"].items():
+            best[(os.path.basename(file_path), name)] = (
+                match[config.OFFSET_SECS][0],
+                match[config.CONFIDENCE][0],
+            )
+    return run_time, num_matches, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--directory", default="test_audio")
+    parser.add_argument("--accuracy", type=int, default=2)
+    parser.add_argument(
+        "--max-occurrences", type=int, nargs="+", default=[1, 2, 3, 5, 10]
+    )
+    parser.add_argument("--stop-list-at", default="query")
+    parser.add_argument("--hum", type=float, default=None, help="tone frequency in Hz")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        files = [
+            os.path.join(root, name)
+            for root, _, names in os.walk(args.directory)
+            for name in sorted(names)
+        ]
+        if args.hum is not None:
+            files = [add_hum(x, args.hum, directory) for x in files]
+        benchmark(files, args)
+
+
+def add_hum(file_path: str, frequency: float, directory: str) -> str:
+    hum_file = os.path.join(directory, os.path.basename(file_path))
+    subprocess.run(
+        ["ffmpeg", "-loglevel", "error", "-y", "-i", file_path, "-f", "lavfi"]
+        + ["-i", f"sine=frequency={frequency}", "-filter_complex"]
+        + ["amix=inputs=2:duration=first", hum_file],
+        check=True,
+    )
+    return hum_file
+
+
+def benchmark(files: list, args):
+    recognizer = ad.FingerprintRecognizer()
+    recognizer.config.set_accuracy(args.accuracy)
+    recognizer.fingerprint_directory(files)
+
+    def config(max_occurrences):
+        config = ad.FingerprintConfig()
+        config.set_accuracy(args.accuracy)
+        config.stop_max_occurrences = max_occurrences
+        config.stop_list_at = args.stop_list_at
+        return config
+
+    base_time, base_matches, base_best = recognize_all(recognizer, files, config(None))
+    print()
+    print(f"{'max occ':>7} {'matches':>9} {'time s':>7} {'same best':>9}  confidences")
+    print(f"{'None':>7} {base_matches:>9} {base_time:>7.3f} {'':>9}  ", end="")
+    print(" ".join(str(x[1]) for x in base_best.values()))
+    for max_occurrences in args.max_occurrences:
+        run_time, num_matches, best = recognize_all(
+            recognizer, files, config(max_occurrences)
+        )
+        same = sum(
+            key in best and best[key][0] == offset
+            for key, (offset, _) in base_best.items()
+        )
+        print(
+            f"{max_occurrences:>7} {num_matches:>9} {run_time:>7.3f} "
+            f"{same:>4}/{len(base_best):<4}  ",
+            end="",
+        )
+        print(" ".join(str(best.get(key, (0, 0))[1]) for key in base_best))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Reports the memory used per fingerprint by the {hash: [offsets]} dictionaries
+fingerprints used to be kept in, against the sorted hash/offset arrays of
+FileFingerprints, and times find_matches style matching on both
+
+    python benchmarks/bench_store_memory.py
+    python benchmarks/bench_store_memory.py --hash-encoding packed --accuracy 3
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+import audalign.recognizers.fingerprint.fingerprinter as fingerprinter
+from audalign.config.fingerprint import FingerprintConfig
+from audalign.recognizers.fingerprint.store import match_offsets
+
+sys.path.insert(0, __file__.rsplit("/", 1)[0])
+from bench_hashes import synthetic_peaks  # noqa: E402
+
+
+def dict_bytes(hash_dict: dict) -> int:
+    """deep size of a {hash: [offsets]} dictionary"""
+    total = sys.getsizeof(hash_dict)
+    seen = set()
+    for key, offsets in hash_dict.items():
+        total += sys.getsizeof(key) + sys.getsizeof(offsets)
+        for offset in offsets:
+            # small ints are cached and shared, count them once
+            if id(offset) not in seen:
+                seen.add(id(offset))
+                total += sys.getsizeof(offset)
+    return total
+
+
+def dict_matches(target: dict, against: dict):
+    """the original find_matches inner loop"""
+    matches = []
+    for h, t_offsets in target.items():
+        if h in against:
+            for t in t_offsets:
+                for a in against[h]:
+                    matches.append((a - t, t, a))
+    return matches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seconds", type=float, nargs="+", default=[30.0, 120.0, 600.0])
+    parser.add_argument("--peaks-per-second", type=float, default=12.0)
+    parser.add_argument("--accuracy", type=int, default=2)
+    parser.add_argument("--hash-encoding", default="sha1")
+    args = parser.parse_args()
+
+    config = FingerprintConfig()
+    config.set_accuracy(args.accuracy)
+    config.set_hash_encoding(args.hash_encoding)
+
+    print(f"{'seconds':>7} {'offsets':>9} {'dict B/fp':>9} {'array B/fp':>10} {'dict match s':>12} {'array match s':>13}")
+    for seconds in args.seconds:
+        fingerprints = fingerprinter.generate_hashes(
+            synthetic_peaks(seconds, args.peaks_per_second, config), config
+        )
+        hash_dict = fingerprints.to_dict(config)
+        num_offsets = len(fingerprints.hashes)
+
+        t = time.perf_counter()
+        loop_matches = dict_matches(hash_dict, hash_dict)
+        dict_time = time.perf_counter() - t
+
+        t = time.perf_counter()
+        t_offsets, a_offsets = match_offsets(fingerprints, fingerprints)
+        array_time = time.perf_counter() - t
+
+        assert len(loop_matches) == len(t_offsets)
+        assert np.array_equal(
+            np.sort(a_offsets - t_offsets), np.sort([x[0] for x in loop_matches])
+        )
+        print(
+            f"{seconds:>7.0f} {num_offsets:>9} {dict_bytes(hash_dict) / num_offsets:>9.1f} "
+            f"{fingerprints.nbytes / num_offsets:>10.1f} {dict_time:>12.3f} {array_time:>13.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Benchmarks correlating two long recordings in memory against streamed
+(stream_find_peaks) with a few memory budgets
+
+Times the correlation and peak search and measures the memory each allocates
+with tracemalloc, and checks every budget finds the same peak offsets.
+
+    python benchmarks/bench_stream_correlation.py
+    python benchmarks/bench_stream_correlation.py --minutes 30 --memory-mb 4 64 256
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+import scipy.signal as signal
+
+from audalign.recognizers.correcognize.correcognize import _find_peaks, stream_find_peaks
+
+
+def in_memory(a, b):
+    return _find_peaks(
+        signal.correlate(a, b),
+        (len(a), len(b)),
+        filter_matches=0,
+        match_len_filter=30,
+        max_lags=None,
+        SCALING_16_BIT=65536,
+    )[0]
+
+
+def streamed(a, b, memory_bytes):
+    return stream_find_peaks(
+        a, b, -(len(b) - 1), len(a) - 1, 0, 30, 65536, memory_bytes=memory_bytes
+    )[0]
+
+
+def measure(function, *args):
+    tracemalloc.start()
+    t = time.perf_counter()
+    result = function(*args)
+    run_time = time.perf_counter() - t
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, run_time, peak / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--minutes", type=float, default=10)
+    parser.add_argument("--sample-rate", type=int, default=8000)
+    parser.add_argument("--memory-mb", type=float, nargs="+", default=[16, 64, 256])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    length = int(args.minutes * 60 * args.sample_rate)
+    recording = rng.normal(size=length + args.sample_rate)
+    # b starts a quarter second into a
+    a = recording[:length]
+    b = recording[args.sample_rate // 4 : args.sample_rate // 4 + length]
+    b = b + rng.normal(size=length)
+
+    print(f"{length} samples each, {a.nbytes / 2**20:.0f} MB")
+    print(f"{'budget MB':>9} {'seconds':>8} {'peak MB':>8}")
+    expected, run_time, peak = measure(in_memory, a, b)
+    print(f"{'in memory':>9} {run_time:>8.2f} {peak:>8.0f}")
+    for memory_mb in args.memory_mb:
+        peaks, run_time, peak = measure(streamed, a, b, int(memory_mb * 2**20))
+        assert [x[0] for x in peaks] == [x[0] for x in expected]
+        print(f"{memory_mb:>9g} {run_time:>8.2f} {peak:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
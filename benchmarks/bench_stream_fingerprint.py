@@ -0,0 +1,77 @@
+"""
+Benchmarks peak memory of fingerprinting a long file with and without FingerprintConfig.stream_fingerprints
+
+Loops an audio file into a long recording with ffmpeg, fingerprints it both
+ways and reports the tracemalloc peak and time of each. Both must give the
+same fingerprints. The streaming peak should stay flat as --loops grows.
+
+    python benchmarks/bench_stream_fingerprint.py
+    python benchmarks/bench_stream_fingerprint.py --loops 20 --block 1048576
+"""
+
+import argparse
+import os
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+import audalign.recognizers.fingerprint.fingerprinter as fingerprinter
+from audalign.config.fingerprint import FingerprintConfig
+
+
+def measure(file_path: str, config: FingerprintConfig):
+    tracemalloc.start()
+    t = time.perf_counter()
+    _, hashes = fingerprinter._fingerprint_worker(file_path, config)
+    run_time = time.perf_counter() - t
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return hashes, peak, run_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--file", default="test_audio/test_shifts/Eigen-song-base.mp3")
+    parser.add_argument("--loops", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--block", type=int, default=FingerprintConfig.FINGERPRINT_BLOCK)
+    parser.add_argument("--engine", default="mlab", choices=["mlab", "scipy"])
+    args = parser.parse_args()
+
+    print(
+        f"{'minutes':>7} {'hashes':>9} {'whole s':>8} {'stream s':>8} "
+        f"{'whole MB':>8} {'stream MB':>9}"
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        for loops in args.loops:
+            long_file = os.path.join(directory, f"loops_{loops}.mp3")
+            subprocess.run(
+                ["ffmpeg", "-loglevel", "error", "-y", "-stream_loop", str(loops - 1)]
+                + ["-i", args.file, "-c", "copy", long_file],
+                check=True,
+            )
+            results = {}
+            for stream in [False, True]:
+                config = FingerprintConfig()
+                config.spectrogram_engine = args.engine
+                config.stream_fingerprints = stream
+                config.FINGERPRINT_BLOCK = args.block
+                results[stream] = measure(long_file, config)
+
+            (whole, whole_peak, whole_time) = results[False]
+            (streamed, stream_peak, stream_time) = results[True]
+            assert np.array_equal(whole.hashes, streamed.hashes)
+            assert np.array_equal(whole.offsets, streamed.offsets)
+            minutes = streamed.offsets.max() * (
+                config.fft_window_size * config.DEFAULT_OVERLAP_RATIO
+            ) / config.sample_rate / 60
+            print(
+                f"{minutes:>7.1f} {len(whole.hashes):>9} {whole_time:>8.2f} {stream_time:>8.2f} "
+                f"{whole_peak / 2**20:>8.1f} {stream_peak / 2**20:>9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
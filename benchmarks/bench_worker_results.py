@@ -0,0 +1,81 @@
+"""
+Benchmarks sending fingerprints from pool processes back to the parent, pickled
+against written to fingerprinter.RESULT_DIR (_write_result) and mapped
+(_adopt_result)
+
+Workers make random fingerprints of the given size instead of fingerprinting
+audio, so only the transfer is timed.
+
+    python benchmarks/bench_worker_results.py
+    python benchmarks/bench_worker_results.py --files 8 --hashes 1000000 10000000
+"""
+
+import argparse
+import multiprocessing
+import shutil
+import tempfile
+import time
+from functools import partial
+
+import numpy as np
+
+import audalign.recognizers.fingerprint.fingerprinter as fingerprinter
+from audalign.recognizers.fingerprint.store import FileFingerprints
+
+
+def make_fingerprints(seed: int, num_hashes: int) -> FileFingerprints:
+    rng = np.random.default_rng(seed)
+    return FileFingerprints(
+        np.sort(rng.integers(0, 2**40, num_hashes, dtype=np.uint64)),
+        rng.integers(0, 2**20, num_hashes, dtype=np.uint32),
+        is_sorted=True,
+        num_hashes=num_hashes,
+    )
+
+
+def pickled_worker(seed: int, num_hashes: int):
+    return make_fingerprints(seed, num_hashes)
+
+
+def directory_worker(seed: int, num_hashes: int, directory: str):
+    return fingerprinter._write_result(make_fingerprints(seed, num_hashes), directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=4)
+    parser.add_argument("--hashes", type=int, nargs="+", default=[10**5, 10**6, 10**7])
+    parser.add_argument("--processes", type=int, default=2)
+    args = parser.parse_args()
+
+    print(f"results in {fingerprinter.RESULT_DIR or tempfile.gettempdir()}")
+    print(f"{'hashes':>9} {'MB/file':>8} {'pickled s':>9} {'mapped s':>9}")
+    with multiprocessing.Pool(args.processes) as pool:
+        for num_hashes in args.hashes:
+            seeds = range(args.files)
+            t = time.perf_counter()
+            pickled = pool.map(partial(pickled_worker, num_hashes=num_hashes), seeds)
+            pickled_time = time.perf_counter() - t
+
+            directory = tempfile.mkdtemp(dir=fingerprinter.RESULT_DIR)
+            try:
+                t = time.perf_counter()
+                results = pool.map(
+                    partial(directory_worker, num_hashes=num_hashes, directory=directory),
+                    seeds,
+                )
+                mapped = [fingerprinter._adopt_result(x) for x in results]
+                mapped_time = time.perf_counter() - t
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+            for a, b in zip(pickled, mapped):
+                assert np.array_equal(a.hashes, b.hashes)
+                assert np.array_equal(a.offsets, b.offsets)
+            print(
+                f"{num_hashes:>9} {pickled[0].nbytes / 2**20:>8.1f} "
+                f"{pickled_time:>9.3f} {mapped_time:>9.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
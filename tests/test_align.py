@@ -73,6 +73,29 @@ class TestAlign:
         assert result
         ad.pretty_print_alignment(result, match_keys="match_info")
 
+    @pytest.mark.parametrize("max_lags", [None, 2])
+    def test_align_cor_all_pairs(self, max_lags):
+        recognizer = ad.CorrelationRecognizer()
+        recognizer.config.sample_rate = 4000
+        recognizer.config.max_lags = max_lags
+        recognizer.config.all_pairs = False
+        recognizer.config.multiprocessing = False
+        expected = ad.align("test_audio/test_shifts", recognizer=recognizer)
+        recognizer.config.all_pairs = True
+        result = ad.align("test_audio/test_shifts", recognizer=recognizer)
+        assert result["match_info"].keys() == expected["match_info"].keys()
+        for name, alignment in expected["match_info"].items():
+            against = result["match_info"][name]["match_info"]
+            assert against.keys() == alignment["match_info"].keys()
+            for against_name, match in alignment["match_info"].items():
+                assert against[against_name]["offset_seconds"] == match["offset_seconds"]
+                assert against[against_name]["confidence"] == pytest.approx(
+                    match["confidence"]
+                )
+                assert against[against_name]["scaling_factor"] == pytest.approx(
+                    match["scaling_factor"]
+                )
+
     def test_align_cor_spec(self, tmpdir):
         result = ad.align(
             "test_audio/test_shifts",
@@ -1,7 +1,9 @@
 import os
 import pickle
+from functools import partial
 
 import audalign as ad
+import numpy as np
 import pytest
 
 try:
@@ -76,6 +78,178 @@ class TestFingerprinter:
             pass
         assert config.get_accuracy() == 1
 
+    def test_set_hash_encoding(self):
+        config = ad.config.fingerprint.FingerprintConfig()
+        assert config.get_hash_encoding() == "sha1"
+        config.set_hash_encoding("packed")
+        assert config.get_hash_encoding() == "packed"
+        with pytest.raises(ValueError):
+            config.set_hash_encoding("md5")
+        assert config.get_hash_encoding() == "packed"
+
+    def test_write_and_load_packed(self, tmpdir):
+        ada = ad.FingerprintRecognizer()
+        ada.config.set_accuracy(1)
+        ada.config.set_hash_encoding("packed")
+        ada.fingerprint_file(self.test_file)
+        fingerprints = ada.fingerprinted_files[0][1].to_dict(ada.config)
+        for extension in ["json", "pickle"]:
+            save_file = os.path.join(tmpdir, f"packed_fingerprints.{extension}")
+            ada.save_fingerprinted_files(save_file)
+            loaded = ad.FingerprintRecognizer(ada.config)
+            loaded.load_fingerprinted_files(save_file)
+            assert loaded.fingerprinted_files[0][1].to_dict(ada.config) == fingerprints
+            assert loaded.total_fingerprints == ada.total_fingerprints
+
+    def test_write_and_load_database(self, tmpdir):
+        from audalign.recognizers.fingerprint import database
+
+        ada = ad.FingerprintRecognizer()
+        ada.config.set_accuracy(1)
+        ada.fingerprint_file(self.test_file)
+        ada.fingerprint_file("test_audio/testers/pink_noise.mp3")
+        save_file = os.path.join(tmpdir, "fingerprints.afdb")
+        ada.save_fingerprinted_files(save_file)
+
+        loaded = ad.FingerprintRecognizer(ada.config, load_fingerprints_file=save_file)
+        assert loaded.file_names == ada.file_names
+        assert loaded.total_fingerprints == ada.total_fingerprints
+        for (name, fingerprints), (loaded_name, loaded_fingerprints) in zip(
+            ada.fingerprinted_files, loaded.fingerprinted_files
+        ):
+            assert name == loaded_name
+            assert len(fingerprints) == len(loaded_fingerprints)
+            assert np.array_equal(fingerprints.hashes, loaded_fingerprints.hashes)
+            assert np.array_equal(fingerprints.offsets, loaded_fingerprints.offsets)
+
+        # saving over a mapped database leaves the loaded fingerprints intact
+        loaded.pop_filename("pink_noise.mp3")
+        loaded.save_fingerprinted_files(save_file)
+        assert np.array_equal(
+            loaded.fingerprinted_files[0][1].hashes, ada.fingerprinted_files[0][1].hashes
+        )
+        assert ad.FingerprintRecognizer(
+            ada.config, load_fingerprints_file=save_file
+        ).file_names == ["test.mp3"]
+
+        json_file = os.path.join(tmpdir, "fingerprints.json")
+        converted_file = os.path.join(tmpdir, "converted.afdb")
+        ada.save_fingerprinted_files(json_file)
+        database.convert_to_database(json_file, converted_file, ada.config)
+        converted = ad.FingerprintRecognizer(
+            ada.config, load_fingerprints_file=converted_file
+        )
+        assert converted.file_names == ada.file_names
+        assert np.array_equal(
+            converted.fingerprinted_files[1][1].hashes,
+            ada.fingerprinted_files[1][1].hashes,
+        )
+
+        packed = ad.FingerprintRecognizer()
+        packed.config.set_hash_encoding("packed")
+        with pytest.raises(ValueError):
+            packed.load_fingerprinted_files(save_file)
+        not_database = os.path.join(tmpdir, "not_database.afdb")
+        with open(self.test_file, "rb") as f, open(not_database, "wb") as g:
+            g.write(f.read())
+        with pytest.raises(ValueError):
+            ada.load_fingerprinted_files(not_database)
+
+    def test_append_database(self, tmpdir):
+        from audalign.recognizers.fingerprint import database
+
+        ada = ad.FingerprintRecognizer()
+        ada.config.set_accuracy(1)
+        ada.fingerprint_file(self.test_file)
+        save_file = os.path.join(tmpdir, "fingerprints.afdb")
+        ada.save_fingerprinted_files(save_file, append=True)
+        with open(save_file, "rb") as f:
+            first_segment = f.read()
+        with pytest.raises(ValueError):
+            ada.save_fingerprinted_files(
+                os.path.join(tmpdir, "fingerprints.json"), append=True
+            )
+
+        loaded = ad.FingerprintRecognizer(ada.config, load_fingerprints_file=save_file)
+        loaded.fingerprint_file("test_audio/testers/pink_noise.mp3")
+        loaded.save_fingerprinted_files(save_file, append=True)
+        loaded.save_fingerprinted_files(save_file, append=True)  # nothing new
+        assert len(database._read_segments(save_file)) == 2
+        with open(save_file, "rb") as f:
+            assert f.read(len(first_segment)) == first_segment
+
+        # a segment cut off part way through is ignored, then written over
+        with open(save_file, "ab") as f:
+            f.write(b"\0" * 100)
+        appended = ad.FingerprintRecognizer(ada.config, load_fingerprints_file=save_file)
+        assert appended.file_names == ["test.mp3", "pink_noise.mp3"]
+        assert appended.total_fingerprints == loaded.total_fingerprints
+        for (_, fingerprints), (_, appended_fingerprints) in zip(
+            loaded.fingerprinted_files, appended.fingerprinted_files
+        ):
+            assert np.array_equal(fingerprints.hashes, appended_fingerprints.hashes)
+            assert np.array_equal(fingerprints.offsets, appended_fingerprints.offsets)
+
+        ada.fingerprinted_files[0][0] = ada.file_names[0] = "copy.mp3"
+        ada.save_fingerprinted_files(save_file, append=True)
+        assert len(database._read_segments(save_file)) == 3
+        assert database.compact_database(save_file) == 3
+        assert len(database._read_segments(save_file)) == 1
+        compacted = ad.FingerprintRecognizer(ada.config, load_fingerprints_file=save_file)
+        assert compacted.file_names == ["test.mp3", "pink_noise.mp3", "copy.mp3"]
+        assert np.array_equal(
+            compacted.fingerprinted_files[2][1].hashes,
+            appended.fingerprinted_files[0][1].hashes,
+        )
+
+    def test_sqlite_store(self, tmpdir):
+        from audalign.recognizers.fingerprint.store import StoredFingerprints
+
+        ada = ad.FingerprintRecognizer()
+        ada.config.set_accuracy(1)
+        ada.fingerprint_directory("test_audio/test_shifts")
+        target = "test_audio/test_shifts/Eigen-song-base.mp3"
+        save_file = os.path.join(tmpdir, "fingerprints.sqlite")
+        ada.save_fingerprinted_files(save_file)
+
+        loaded = ad.FingerprintRecognizer(ada.config, load_fingerprints_file=save_file)
+        assert loaded.file_names == ada.file_names
+        assert loaded.total_fingerprints == ada.total_fingerprints
+        for (_, fingerprints), (_, stored) in zip(
+            ada.fingerprinted_files, loaded.fingerprinted_files
+        ):
+            assert isinstance(stored, StoredFingerprints)
+            assert np.array_equal(fingerprints.hashes, stored.hashes)
+            assert np.array_equal(fingerprints.offsets, stored.offsets)
+        for stream_matches in [False, True]:
+            ada.config.stream_matches = stream_matches
+            assert (
+                loaded.recognize(target)["match_info"]
+                == ada.recognize(target)["match_info"]
+            )
+
+        # saving only writes the differences
+        loaded.pop_filename("Eigen-20sec.mp3")
+        loaded.save_fingerprinted_files(save_file)
+        assert ad.FingerprintRecognizer(
+            ada.config, load_fingerprints_file=save_file
+        ).file_names == ["Eigen-song-base.mp3"]
+        ada.save_fingerprinted_files(save_file, append=True)
+        reloaded = ad.FingerprintRecognizer(ada.config, load_fingerprints_file=save_file)
+        assert sorted(reloaded.file_names) == sorted(ada.file_names)
+        assert reloaded.total_fingerprints == ada.total_fingerprints
+
+        packed = ad.FingerprintRecognizer()
+        packed.config.set_hash_encoding("packed")
+        with pytest.raises(ValueError):
+            packed.load_fingerprinted_files(save_file)
+        not_database = os.path.join(tmpdir, "not_database.sqlite")
+        with open(self.test_file, "rb") as f, open(not_database, "wb") as g:
+            g.write(f.read())
+        with pytest.raises(ValueError):
+            ada.load_fingerprinted_files(not_database)
+        ada.load_fingerprinted_files(os.path.join(tmpdir, "not_there.sqlite"))
+
     def test_write_and_load(self):
         ada = ad.FingerprintRecognizer(
             load_fingerprints_file="tests/test_fingerprints.json"
@@ -115,6 +289,17 @@ class TestFilehandler:
         array, _ = ad.filehandler.read(self.test_file, sample_rate=None)
         assert len(array) > 0
 
+    @pytest.mark.parametrize("normalize", [True, False])
+    def test_read_blocks(self, normalize):
+        array, _ = ad.filehandler.read(self.test_file, normalize=normalize)
+        blocks = list(
+            ad.filehandler.read_blocks(self.test_file, 100000, normalize=normalize)
+        )
+        assert len(blocks) > 1
+        assert np.array_equal(np.concatenate(blocks), array)
+        with pytest.raises(FileNotFoundError):
+            ad.filehandler.read_blocks("not_a_file.mp3", 100000)
+
     def test_get_aud_dir(self):
         file_list = ad.filehandler.get_audio_files_directory("tests")
         assert len(file_list) == 0
@@ -209,6 +394,43 @@ class TestRemoveNoise:
         )
 
 
+class TestExecutor:
+    def test_executor(self, tmpdir):
+        recognizer = ad.CorrelationRecognizer()
+        recognizer.config.multiprocessing = False
+        expected = ad.align("test_audio/testers", recognizer=recognizer)
+
+        recognizer.config.multiprocessing = True
+        with ad.Executor(2, config=recognizer.config) as executor:
+            assert ad.executor.get_executor() is executor
+            pool = executor._pool
+            results = ad.align("test_audio/testers", recognizer=recognizer)
+            ad.uniform_level_directory("test_audio/testers", tmpdir)
+            fingerprint_recognizer = ad.FingerprintRecognizer()
+            fingerprint_recognizer.fingerprint_directory("test_audio/testers")
+            assert executor._pool is pool
+        assert ad.executor.get_executor() is None
+        assert executor._pool is None
+        for name, alignment in expected["match_info"].items():
+            assert results["match_info"][name]["match_info"] == alignment["match_info"]
+        assert len(os.listdir(tmpdir)) == 2
+        assert len(fingerprint_recognizer.fingerprinted_files) == 2
+
+        # tasks with the executor's config use the processes' copy
+        config = ad.FingerprintConfig()
+        executor = ad.Executor(1, config=config)
+        assert ad.set_executor(executor) is None
+        shared = executor._shared_config(partial(str.format, config=config))
+        assert shared.func is ad.executor._call_with_config
+        assert executor.map(shared, ["{config.sample_rate}"]) == ["44100"]
+        other_config = ad.FingerprintConfig()
+        other_config.sample_rate = 8000
+        other = partial(str.format, config=other_config)
+        assert executor._shared_config(other) is other
+        assert ad.set_executor(None) is executor
+        executor.close()
+
+
 class TestStartEnd:
     test_file = "test_audio/testers/test.mp3"
 
@@ -1,10 +1,24 @@
+import hashlib
+import numpy as np
+from pydub import AudioSegment
 from pydub.exceptions import CouldntDecodeError
 import audalign as ad
+import audalign.recognizers.fingerprint.fingerprinter as fingerprinter
+import audalign.recognizers.fingerprint.recognize as fingerprint_recognize
 import os
 import pytest
 from audalign.config.correlation import CorrelationConfig
 
 from audalign.config.fingerprint import FingerprintConfig
+from audalign.recognizers.correcognize.correcognize import (
+    _find_peaks,
+    calc_corrs,
+    coarse_find_peaks,
+    correlate_lags,
+    find_index_arr,
+    stream_find_peaks,
+)
+from audalign.recognizers.fingerprint.store import FileFingerprints, match_offsets
 
 try:
     import skimage
@@ -99,6 +113,437 @@ class TestFingerprinting:
         fingerprint_recognizer.load_fingerprinted_files("tests/test_fingerprints.json")
         fingerprint_recognizer.fingerprint_directory("test_audio/test_shifts")
 
+    def test_generate_hashes_batched(self):
+        config = FingerprintConfig()
+        config.set_accuracy(3)
+        config.set_hash_style("panako_mod")
+        config.HASH_CANDIDATE_BLOCK = 100
+        peaks = [(f * 37 % 1000, t // 3) for t, f in enumerate(range(200, 400))]
+        expected = {}
+        for i, (f1, t1) in enumerate(peaks):
+            for j in range(1, config.default_fan_value - 1):
+                for k in range(j + 1, config.default_fan_value):
+                    if i + k >= len(peaks):
+                        continue
+                    (f2, t2), (f3, t3) = peaks[i + j], peaks[i + k]
+                    deltas = [t2 - t1, t3 - t1]
+                    if all(
+                        config.min_hash_time_delta <= x <= config.max_hash_time_delta
+                        for x in deltas
+                    ):
+                        h = hashlib.sha1(
+                            f"{f1-f2}|{f2-f3}|{deltas[0]/deltas[1]:.8f}".encode("utf-8")
+                        ).hexdigest()[0 : config.FINGERPRINT_REDUCTION]
+                        expected.setdefault(h, []).append(t1)
+        fingerprints = fingerprinter.generate_hashes(
+            sorted(peaks, key=lambda x: -x[1]), config
+        )
+        assert len(expected) > 0
+        assert len(fingerprints) == len(expected)
+        assert fingerprints.to_dict(config) == {
+            h[0:16]: offsets for h, offsets in expected.items()
+        }
+
+    @pytest.mark.parametrize("default_amp_min", [-2, 1])
+    def test_get_2D_peaks(self, default_amp_min):
+        from scipy.ndimage import (
+            binary_erosion,
+            generate_binary_structure,
+            iterate_structure,
+            maximum_filter,
+        )
+
+        config = FingerprintConfig()
+        config.peak_neighborhood_size = 3
+        config.default_amp_min = default_amp_min
+        rng = np.random.default_rng(1)
+        arr2D = np.round(rng.normal(2, 3, (40, 60)))
+        arr2D[rng.random(arr2D.shape) < 0.3] = 0
+        arr2D[:5] = 0
+        neighborhood = iterate_structure(
+            generate_binary_structure(2, 1), config.peak_neighborhood_size
+        )
+        detected_peaks = (
+            maximum_filter(arr2D, footprint=neighborhood) == arr2D
+        ) ^ binary_erosion(arr2D == 0, structure=neighborhood, border_value=1)
+        expected = np.argwhere(detected_peaks & (arr2D > default_amp_min))
+        assert len(expected) > 0
+        for peak_filter in ["sparse", "iterated", "footprint"]:
+            config.peak_filter = peak_filter
+            peaks = fingerprinter.get_2D_peaks(arr2D, config, freq_start=5)
+            assert peaks.dtype == np.int32
+            assert np.array_equal(peaks, expected)
+
+    def test_density_control(self):
+        config = FingerprintConfig()
+        config.peak_neighborhood_size = 1
+        config.default_amp_min = 0
+        rng = np.random.default_rng(2)
+        arr2D = rng.random((200, 400)) * 100
+        peaks = fingerprinter.get_2D_peaks(arr2D, config)
+
+        config.peaks_per_frame = 2
+        capped = fingerprinter.get_2D_peaks(arr2D, config)
+        times = peaks[:, config._IDX_TIME_J]
+        assert np.bincount(capped[:, config._IDX_TIME_J]).max() == 2
+        for time in range(arr2D.shape[1]):
+            amps = np.sort(arr2D[peaks[times == time, 0], time])[::-1][:2]
+            assert np.array_equal(
+                np.sort(arr2D[capped[capped[:, 1] == time, 0], time])[::-1], amps
+            )
+        assert np.array_equal(capped, capped[np.lexsort((capped[:, 1], capped[:, 0]))])
+
+        for hash_style in ["base", "panako_mod"]:
+            config.hash_style = hash_style
+            for peak_sort in [True, False]:
+                config.peak_sort = peak_sort
+                assert fingerprinter._count_hashes(capped, config) == len(
+                    fingerprinter.generate_hashes(capped, config).hashes
+                )
+
+        config = FingerprintConfig()
+        config.peak_neighborhood_size = 10
+        config.default_amp_min = 0
+        config.hash_style = "base"
+        arr2D = rng.random((200, 1000)) * 100
+        peaks = fingerprinter.get_2D_peaks(arr2D, config)
+        step = config.fft_window_size - int(
+            config.fft_window_size * config.DEFAULT_OVERLAP_RATIO
+        )
+        seconds = arr2D.shape[1] * step / config.sample_rate
+        assert len(fingerprinter.generate_hashes(peaks, config).hashes) > 60 * seconds
+        config.target_hashes_per_second = 50
+        tuned = fingerprinter.get_2D_peaks(arr2D, config)
+        num_hashes = len(fingerprinter.generate_hashes(tuned, config).hashes)
+        assert 0.9 * 50 * seconds < num_hashes <= 50 * seconds
+        # the loudest peaks are kept
+        assert arr2D[tuple(tuned.T)].min() >= np.sort(arr2D[tuple(peaks.T)])[-len(tuned)]
+
+        config.peaks_per_frame = 0
+        with pytest.raises(ValueError):
+            fingerprinter.get_2D_peaks(arr2D, config)
+
+    @pytest.mark.parametrize("fft_window_size", [4096, 1023])
+    def test_scipy_spectrogram(self, fft_window_size):
+        config = FingerprintConfig()
+        config.fft_window_size = fft_window_size
+        channel, _ = ad.filehandler.read(test_file_eig, sample_rate=config.sample_rate)
+        mlab_spec, mlab_freqs = fingerprinter.spectrogram(channel, config)
+        config.spectrogram_engine = "scipy"
+        scipy_spec, scipy_freqs = fingerprinter.spectrogram(channel, config)
+        assert scipy_spec.dtype == np.float32
+        assert scipy_spec.shape == mlab_spec.shape
+        assert np.allclose(scipy_freqs, mlab_freqs)
+        loud = mlab_spec > -50
+        assert np.allclose(scipy_spec[loud], mlab_spec[loud], rtol=0, atol=0.05)
+        assert np.array_equal(
+            fingerprinter.get_2D_peaks(scipy_spec, config),
+            fingerprinter.get_2D_peaks(mlab_spec, config),
+        )
+
+        config.spectrogram_engine = "bad_engine"
+        with pytest.raises(ValueError):
+            fingerprinter.spectrogram(channel, config)
+
+    def test_stream_fingerprints(self):
+        config = FingerprintConfig()
+        config.set_accuracy(3)
+        _, hashes = fingerprinter._fingerprint_worker(self.test_file, config)
+        assert len(hashes) > 0
+        blocks = list(
+            fingerprinter.iter_fingerprints(
+                ad.filehandler.read_blocks(self.test_file, 50000), config
+            )
+        )
+        assert len(blocks) > 1
+        streamed = FileFingerprints.concatenate(blocks)
+        assert np.array_equal(streamed.hashes, hashes.hashes)
+        assert np.array_equal(streamed.offsets, hashes.offsets)
+
+        config.stream_fingerprints = True
+        _, streamed = fingerprinter._fingerprint_worker(self.test_file, config)
+        assert np.array_equal(streamed.hashes, hashes.hashes)
+        assert np.array_equal(streamed.offsets, hashes.offsets)
+
+    def test_stream_fingerprints_decode_error(self, monkeypatch):
+        config = FingerprintConfig()
+        config.set_accuracy(1)
+        config.stream_fingerprints = True
+        config.normalize = False
+        config.fail_on_decode_error = False
+        # ffmpeg failing partway is only found while the blocks are read
+        monkeypatch.setattr(AudioSegment, "converter", "false")
+        assert fingerprinter._fingerprint_worker(self.test_file, config) == (None, None)
+        config.fail_on_decode_error = True
+        with pytest.raises(CouldntDecodeError):
+            fingerprinter._fingerprint_worker(self.test_file, config)
+
+    def test_fingerprint_worker_to_directory(self, tmpdir):
+        config = FingerprintConfig()
+        config.set_accuracy(1)
+        _, hashes = fingerprinter._fingerprint_worker(self.test_file, config)
+        file_name, result = fingerprinter._fingerprint_worker_to_directory(
+            self.test_file, config, str(tmpdir)
+        )
+        assert file_name == "test.mp3"
+        assert len(os.listdir(str(tmpdir))) == 2
+        adopted = fingerprinter._adopt_result(result)
+        assert os.listdir(str(tmpdir)) == []
+        assert len(adopted) == len(hashes)
+        assert np.array_equal(adopted.hashes, hashes.hashes)
+        assert np.array_equal(adopted.offsets, hashes.offsets)
+
+        # unwritable directories send the fingerprints back pickled
+        _, result = fingerprinter._fingerprint_worker_to_directory(
+            self.test_file, config, os.path.join(str(tmpdir), "missing")
+        )
+        assert isinstance(result, FileFingerprints)
+        assert fingerprinter._adopt_result(result) is result
+
+    def test_fingerprint_cache(self, tmpdir, monkeypatch):
+        from audalign.recognizers.fingerprint.cache import FingerprintCache
+
+        fingerprint_recognizer = ad.FingerprintRecognizer()
+        fingerprint_recognizer.config.multiprocessing = False
+        fingerprint_recognizer.config.cache_dir = str(tmpdir)
+        fingerprint_recognizer.fingerprint_directory("test_audio/testers")
+        assert len(fingerprint_recognizer.fingerprinted_files) == 2
+
+        def fingerprint_worker(*args, **kwargs):
+            raise AssertionError("cached files shouldn't be fingerprinted")
+
+        monkeypatch.setattr(fingerprinter, "_fingerprint_worker", fingerprint_worker)
+        cached_recognizer = ad.FingerprintRecognizer()
+        cached_recognizer.config.multiprocessing = True
+        cached_recognizer.config.cache_dir = str(tmpdir)
+        cached_recognizer.fingerprint_directory("test_audio/testers")
+        assert sorted(cached_recognizer.file_names) == ["pink_noise.mp3", "test.mp3"]
+        for name, fingerprints in fingerprint_recognizer.fingerprinted_files:
+            cached = cached_recognizer.fingerprinted_files[
+                cached_recognizer.file_names.index(name)
+            ][1]
+            assert np.array_equal(cached.hashes, fingerprints.hashes)
+            assert np.array_equal(cached.offsets, fingerprints.offsets)
+
+        cached_recognizer.clear_fingerprints()
+        cached_recognizer.fingerprint_file(self.test_file, set_file_name="Sup")
+        assert cached_recognizer.file_names == ["Sup"]
+
+        cache = FingerprintCache(str(tmpdir))
+        cached_recognizer.config.set_accuracy(3)
+        assert cache.get(self.test_file, cached_recognizer.config) is None
+        cached_recognizer.config.set_accuracy(2)
+        assert cache.get(self.test_file, cached_recognizer.config) is not None
+        entry_name = cache.key(self.test_file, cached_recognizer.config) + ".npz"
+        cache.max_bytes = os.path.getsize(os.path.join(str(tmpdir), entry_name))
+        cache.evict()
+        assert cache.get(self.test_file, cached_recognizer.config) is not None
+        assert cache.get(test_file2, cached_recognizer.config) is None
+
+    def test_file_fingerprints_match_offsets(self):
+        config = FingerprintConfig()
+        target = FileFingerprints.from_dict({"a": [1, 4], "b": [2], "c": [3]}, config)
+        against = FileFingerprints.from_dict({"a": [10], "c": [7, 8], "d": [9]}, config)
+        assert len(target) == 3
+        assert target.to_dict(config) == {
+            f"{0xa:016x}": [1, 4],
+            f"{0xb:016x}": [2],
+            f"{0xc:016x}": [3],
+        }
+        t_offsets, a_offsets = match_offsets(target, against)
+        assert sorted(zip(t_offsets.tolist(), a_offsets.tolist())) == [
+            (1, 10),
+            (3, 7),
+            (3, 8),
+            (4, 10),
+        ]
+
+    def test_fingerprint_index(self):
+        recognizer = ad.FingerprintRecognizer()
+        files = {
+            "a.wav": FileFingerprints([1, 2, 2, 5], [0, 1, 3, 4]),
+            "b.wav": FileFingerprints([2, 5, 7], [10, 11, 12]),
+            "c.wav": FileFingerprints([1, 7], [20, 21]),
+        }
+        for name, fingerprints in files.items():
+            recognizer.add_filename(name, [name, fingerprints])
+        file_ids, t_offsets, a_offsets = recognizer.fingerprint_index.match(
+            files["a.wav"], exclude=["a.wav"]
+        )
+        names = [recognizer.fingerprint_index.file_names[x] for x in file_ids]
+        assert list(zip(names, t_offsets.tolist(), a_offsets.tolist())) == [
+            ("b.wav", 1, 10),
+            ("b.wav", 3, 10),
+            ("b.wav", 4, 11),
+            ("c.wav", 0, 20),
+        ]
+
+        recognizer.pop_filename("b.wav")
+        recognizer.fingerprinted_files.append(["d.wav", files["b.wav"]])
+        recognizer.file_names.append("d.wav")
+        file_names, file_index, t_offsets, a_offsets = fingerprint_recognize.find_matches(
+            recognizer, "c.wav"
+        )
+        assert file_names == ["a.wav", "d.wav"]
+        assert file_index.tolist() == [0, 1]
+        assert t_offsets.tolist() == [20, 21]
+        assert a_offsets.tolist() == [0, 12]
+
+    def test_stop_list(self):
+        recognizer = ad.FingerprintRecognizer()
+        files = {
+            "a.wav": FileFingerprints([1, 2, 2, 5], [0, 1, 3, 4]),
+            "b.wav": FileFingerprints([2, 5, 7, 7, 7], [10, 11, 12, 13, 14]),
+            "c.wav": FileFingerprints([1, 5, 7], [20, 21, 22]),
+        }
+        for name, fingerprints in files.items():
+            recognizer.add_filename(name, [name, fingerprints])
+        index = recognizer.fingerprint_index
+        hashes, document_frequency, occurrences, max_occurrences = index.hash_stats()
+        assert hashes.tolist() == [1, 2, 5, 7]
+        assert document_frequency.tolist() == [2, 2, 3, 2]
+        assert occurrences.tolist() == [2, 3, 3, 4]
+        assert max_occurrences.tolist() == [1, 2, 1, 3]
+        assert index.hash_stats([2, 3])[1].tolist() == [2, 0]
+        assert index.stop_list(hashes, max_occurrences=2).tolist() == [
+            False,
+            False,
+            False,
+            True,
+        ]
+        assert index.stop_list(hashes, max_files=0.9).tolist() == [
+            False,
+            False,
+            True,
+            False,
+        ]
+
+        # hash 7 occurs 3 times in b.wav
+        recognizer.config.stop_max_occurrences = 1
+        assert fingerprint_recognize.find_matches(recognizer, "c.wav")[2].tolist() == [
+            20,
+            21,
+            21,
+        ]
+        # hash 5 is in all 3 files
+        recognizer.config.stop_max_occurrences = None
+        recognizer.config.stop_max_files = 2
+        assert fingerprint_recognize.find_matches(recognizer, "a.wav")[2].tolist() == [
+            1,
+            3,
+            0,
+        ]
+        recognizer.config.stop_list_at = "never"
+        with pytest.raises(ValueError):
+            fingerprint_recognize.find_matches(recognizer, "a.wav")
+
+        assert files["b.wav"].drop_common(2).hashes.tolist() == [2, 5]
+        assert len(files["b.wav"].drop_common(2)) == 2
+
+    def test_align_matches(self):
+        file_names = ["a.wav", "b.wav"]
+        file_index = np.array([0, 0, 0, 0, 0, 1, 1])
+        t_offsets = np.array([0, 1, 2, 5, 3, 0, 0])
+        a_offsets = np.array([5, 6, 2, 5, 8, 9, 9])
+        matches = (file_names, file_index, t_offsets, a_offsets)
+        assert fingerprint_recognize.align_matches(matches) == {
+            "a.wav": {5: [3, None], 0: [2, None]},
+            "b.wav": {9: [2, None]},
+        }
+        assert fingerprint_recognize.align_matches(matches, max_offsets=1) == {
+            "a.wav": {5: [3, None]},
+            "b.wav": {9: [2, None]},
+        }
+        assert fingerprint_recognize.align_matches(matches, max_lags=4) == {
+            "a.wav": {0: [2, None]},
+        }
+
+    def test_locality_align_matches(self):
+        t_offsets = np.array([3, 3, 1, 1, 0, 0])
+        a_offsets = np.array([0, 1, 4, 3, 5, 3])
+        matches = (["a.wav"], np.zeros(6, dtype=np.int64), t_offsets, a_offsets)
+        assert fingerprint_recognize.locality_align_matches(matches, 2, 0.0) == {
+            "a.wav": {
+                3: [2, [(0, 4, 2)]],
+                2: [1, [(0, 4, 1), (2, 3, 1)]],
+                -3: [1, [(2, 0, 1)]],
+                -2: [1, [(2, 2, 1)]],
+            }
+        }
+
+    @pytest.mark.parametrize("locality", [None, 0.5])
+    def test_stream_matches(self, locality):
+        recognizer = ad.FingerprintRecognizer()
+        rng = np.random.default_rng(0)
+        for i in range(5):
+            fingerprints = FileFingerprints(
+                rng.integers(0, 200, 800).astype(np.uint64), rng.integers(0, 300, 800)
+            )
+            recognizer.add_filename(f"{i}.wav", [f"{i}.wav", fingerprints])
+        recognizer.config.locality = locality
+        recognizer.config.match_len_filter = 5
+        result = fingerprint_recognize.recognize(recognizer, "0.wav", recognizer.config)
+        recognizer.config.stream_matches = True
+        recognizer.config.MATCH_BLOCK = 50
+        stream_result = fingerprint_recognize.recognize(
+            recognizer, "0.wav", recognizer.config
+        )
+        assert len(result["match_info"]) == 4
+        assert result["match_info"] == stream_result["match_info"]
+
+    @pytest.mark.parametrize("max_lags", [None, 0.5])
+    def test_recognize_all(self, max_lags):
+        recognizer = ad.FingerprintRecognizer()
+        rng = np.random.default_rng(0)
+        for name in ["0.wav", "1.wav", "2.wav", "3.wav", "1.WAV"]:
+            fingerprints = FileFingerprints(
+                rng.integers(0, 200, 800).astype(np.uint64), rng.integers(0, 300, 800)
+            )
+            recognizer.add_filename(name, [name, fingerprints])
+        recognizer.config.max_lags = max_lags
+        recognizer.config.match_len_filter = 5
+        recognizer.config.MATCH_BLOCK = 500
+        file_paths = ["0.wav", "1.wav", "1.WAV", "3.wav"]
+        results = fingerprint_recognize.recognize_all(
+            recognizer, file_paths, recognizer.config
+        )
+        # split over forked processes
+        parallel_results = fingerprint_recognize.recognize_all(
+            recognizer, file_paths, recognizer.config, processes=3
+        )
+        each_results = fingerprint_recognize.recognize_each(
+            recognizer, file_paths, recognizer.config, processes=2
+        )
+        for file_path, result, parallel, each in zip(
+            file_paths, results, parallel_results, each_results
+        ):
+            expected = fingerprint_recognize.recognize(
+                recognizer, file_path, recognizer.config
+            )
+            # files named the same but for case don't match each other
+            assert len(result["match_info"]) == (3 if file_path.lower() == "1.wav" else 4)
+            assert result["match_info"] == expected["match_info"]
+            assert parallel["match_info"] == expected["match_info"]
+            assert each["match_info"] == expected["match_info"]
+
+    def test_recognize_all_max_pair_files(self, monkeypatch):
+        recognizer = ad.FingerprintRecognizer()
+        rng = np.random.default_rng(0)
+        for name in ["0.wav", "1.wav", "2.wav"]:
+            fingerprints = FileFingerprints(
+                rng.integers(0, 200, 100).astype(np.uint64), rng.integers(0, 300, 100)
+            )
+            recognizer.add_filename(name, [name, fingerprints])
+        recognizer.fingerprint_index.sync(recognizer.fingerprinted_files)
+        assert recognizer._all_pairs()
+        # pair keys of more indexed files would overflow
+        monkeypatch.setattr(fingerprint_recognize, "MAX_PAIR_FILES", 2)
+        assert not recognizer._all_pairs()
+        with pytest.raises(ValueError):
+            fingerprint_recognize.recognize_all(
+                recognizer, ["0.wav", "1.wav"], recognizer.config
+            )
+
     def test_fingerprint_bad_file_should_fail(self):
         fingerprint_recognizer = ad.FingerprintRecognizer()
         assert len(fingerprint_recognizer.fingerprinted_files) == 0
@@ -156,6 +601,28 @@ class TestRecognize:
         result = ada2.recognize(test_file_eig2)
         assert result
 
+    def test_recognize_fingerprint_packed(self):
+        ada2 = ad.FingerprintRecognizer()
+        ada2.config.set_accuracy(1)
+        ada2.config.set_hash_encoding("packed")
+
+        ada2.fingerprint_file(test_file_eig)
+        result = ada2.recognize(test_file_eig2)
+        assert result
+        offset_seconds = result["match_info"][os.path.basename(test_file_eig)][
+            "offset_seconds"
+        ]
+        ada2.config.set_hash_encoding("sha1")
+        ada2.clear_fingerprints()
+        ada2.fingerprint_file(test_file_eig)
+        sha1_result = ada2.recognize(test_file_eig2)
+        assert (
+            offset_seconds[0]
+            == sha1_result["match_info"][os.path.basename(test_file_eig)][
+                "offset_seconds"
+            ][0]
+        )
+
     def test_recognize_max_lags(self):
         _max_lags = 4
         self.fingerprint_recognizer.config.max_lags = 4
@@ -328,6 +795,125 @@ class TestRecognize:
         assert min(offset_seconds) < _max_lags
         assert max(offset_seconds) < _max_lags
 
+    @pytest.mark.parametrize("fft_batch", [2**22, 1000])
+    def test_correlate_lags(self, fft_batch, monkeypatch):
+        import scipy.signal as signal
+        import sys
+
+        module = sys.modules[correlate_lags.__module__]
+        monkeypatch.setattr(module, "FFT_BATCH", fft_batch)
+        rng = np.random.default_rng(0)
+        for len_a, len_b in [(5000, 300), (300, 5000), (20000, 17000), (7, 3)]:
+            a, b = rng.normal(size=len_a), rng.normal(size=len_b)
+            full = signal.correlate(a, b)
+            lags = signal.correlation_lags(len_a, len_b)
+            # direct, overlap-save, sliced from the full correlation, out of range
+            for min_lag, max_lag in [(-10, 10), (-3000, 200), (-10**6, 10**6), (50, 40)]:
+                in_window = (lags >= min_lag) & (lags <= max_lag)
+                assert correlate_lags(a, b, min_lag, max_lag) == pytest.approx(
+                    full[in_window], abs=1e-9
+                )
+
+    @pytest.mark.parametrize("fft_batch", [2**22, 1000])
+    def test_calc_corrs_locality(self, fft_batch, monkeypatch):
+        import scipy.signal as signal
+        import sys
+
+        module = sys.modules[calc_corrs.__module__]
+        monkeypatch.setattr(module, "FFT_BATCH", fft_batch)
+        rng = np.random.default_rng(0)
+        for len_a, len_b, locality in [(5000, 3000, 400), (300, 5000, 1000)]:
+            a, b = rng.normal(size=len_a), rng.normal(size=len_b)
+            for max_lags in [None, 500]:
+                indexes = find_index_arr(a, b, locality, max_lags, 0.5)
+                correlations = list(calc_corrs(a, b, locality, indexes, max_lags))
+                assert [x[1] for x in correlations] == indexes
+                for (correlation, lengths), (i, j) in correlations:
+                    window_a, window_b = a[i : i + locality], b[j : j + locality]
+                    assert lengths == (len(window_a), len(window_b))
+                    assert correlation == pytest.approx(
+                        signal.correlate(window_a, window_b), abs=1e-9
+                    )
+
+    def test_stream_find_peaks(self):
+        rng = np.random.default_rng(0)
+        for len_a, len_b in [(5000, 300), (300, 5000), (20000, 17000)]:
+            a, b = rng.normal(size=len_a), rng.normal(size=len_b)
+            for min_lag, max_lag in [(-10, 10), (-3000, 200), (-(10**6), 10**6)]:
+                first_lag = max(min_lag, -(len_b - 1))
+                expected = _find_peaks(
+                    correlate_lags(a, b, min_lag, max_lag),
+                    (len_a, len_b),
+                    filter_matches=0.2,
+                    match_len_filter=30,
+                    max_lags=None,
+                    SCALING_16_BIT=65536,
+                    first_lag=first_lag,
+                )
+                # chunks of 512 lags
+                peaks = stream_find_peaks(
+                    a, b, min_lag, max_lag, 0.2, 30, 65536, memory_bytes=2**16
+                )
+                assert [x[0] for x in peaks[0]] == [x[0] for x in expected[0]]
+                assert [x[1] for x in peaks[0]] == pytest.approx(
+                    [x[1] for x in expected[0]]
+                )
+                assert peaks[1] == pytest.approx(expected[1])
+
+    @pytest.mark.parametrize("max_lags", [None, 2])
+    def test_correcognize_stream(self, max_lags):
+        results = []
+        for stream_correlation in [False, True]:
+            recognizer = ad.CorrelationRecognizer()
+            recognizer.config.max_lags = max_lags
+            recognizer.config.stream_correlation = stream_correlation
+            recognizer.config.stream_memory_bytes = 2**22
+            results += [
+                ad.recognize(test_file_eig, test_file_eig2, recognizer=recognizer)[
+                    "match_info"
+                ][os.path.basename(test_file_eig2)]
+            ]
+        assert results[0]["offset_samples"] == results[1]["offset_samples"]
+        assert results[0]["confidence"] == pytest.approx(results[1]["confidence"])
+
+    def test_coarse_find_peaks(self):
+        rng = np.random.default_rng(0)
+        # noise getting louder and quieter about ten times a second
+        loudness = np.repeat(np.abs(rng.normal(size=400)), 800)
+        source = rng.normal(size=len(loudness)) * loudness
+        a, b = source[:200000], source[123456:223456] + rng.normal(size=100000)
+        for min_lag, max_lag in [(-(10**6), 10**6), (100000, 150000)]:
+            expected = _find_peaks(
+                correlate_lags(a, b, min_lag, max_lag),
+                (len(a), len(b)),
+                filter_matches=0,
+                match_len_filter=30,
+                max_lags=None,
+                SCALING_16_BIT=65536,
+                first_lag=max(min_lag, -(len(b) - 1)),
+            )
+            peaks = coarse_find_peaks(
+                a, b, min_lag, max_lag, 0, 30, 65536, 16, 10, 400
+            )
+            assert peaks[0][0][0] == expected[0][0][0] == 123456
+            assert peaks[0][0][1] == pytest.approx(expected[0][0][1])
+            assert peaks[1] == pytest.approx(expected[1])
+
+    def test_correcognize_coarse(self):
+        results = []
+        for coarse_sample_rate in [None, 500]:
+            recognizer = ad.CorrelationRecognizer()
+            recognizer.config.coarse_sample_rate = coarse_sample_rate
+            results += [
+                ad.recognize(test_file_eig, test_file_eig2, recognizer=recognizer)[
+                    "match_info"
+                ][os.path.basename(test_file_eig2)]
+            ]
+        assert results[0]["offset_samples"][0] == results[1]["offset_samples"][0]
+        assert results[0]["scaling_factor"] == pytest.approx(
+            results[1]["scaling_factor"]
+        )
+
     def test_correcognize_locality_max_lags(self):
         _max_lags = 4
         recognizer = ad.CorrelationRecognizer()